@@ -1,11 +1,11 @@
 # pylint: disable=undefined-loop-variable
 import datetime
-import itertools
 from collections import defaultdict
-from operator import attrgetter, itemgetter  # pylint: disable=E0611
+from operator import itemgetter  # pylint: disable=E0611
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -97,20 +97,25 @@ class ACMContestController(ProgrammingContestController):
                 submission.status = "?"
         submission.save()
 
-    def get_submission_relative_time(self, submission):
-        # FIXME: SIO-1387 RoundTimes shouldn't require request
-        # Workaround by mock Request object
-        class DummyRequest:
-            def __init__(self, user):
-                self.user = user or AnonymousUser()
-
-        rtimes = rounds_times(DummyRequest(submission.user or AnonymousUser()), self.contest)
-        round_start = rtimes[submission.problem_instance.round].get_start()
-        submission_time = submission.date - round_start
+    def get_user_rounds_times(self, user):
+        """Returns times of the rounds of the contest for ``user``,
+        as :func:`~oioioi.contests.utils.rounds_times` does.
+        """
+        return rounds_times(_DummyRequest(user), self.contest)
+
+    def get_relative_time(self, round_times, date):
+        """Returns the number of seconds between the start of the round
+        and ``date``.
+        """
+        submission_time = date - round_times.get_start()
         # Python2.6 does not support submission_time.total_seconds()
         seconds = submission_time.days * 24 * 3600 + submission_time.seconds
         return max(0, seconds)
 
+    def get_submission_relative_time(self, submission):
+        rtimes = self.get_user_rounds_times(submission.user)
+        return self.get_relative_time(rtimes[submission.problem_instance.round], submission.date)
+
     def _fill_user_result_for_problem(self, result, pi_submissions):
         if pi_submissions:
             for penalties_count, submission in enumerate(pi_submissions, 1):  # noqa: B007
@@ -148,7 +153,7 @@ class ACMContestController(ProgrammingContestController):
                 kind="NORMAL",
             )
             .exclude(status__in=IGNORED_STATUSES)
-            .order_by("date")
+            .order_by("date", "id")
         )
 
         last_submission = self._fill_user_result_for_problem(result, submissions)
@@ -218,6 +223,13 @@ class ACMOpenContestController(ACMContestController):
         return super().can_submit(request, problem_instance, check_round_times)
 
 
+# FIXME: SIO-1387 RoundTimes shouldn't require request
+# Workaround by mock Request object
+class _DummyRequest:
+    def __init__(self, user):
+        self.user = user or AnonymousUser()
+
+
 class _FakeUserResultForProblem:
     def __init__(self, user, problem_instance):
         self.problem_instance = problem_instance
@@ -279,26 +291,86 @@ class ACMRankingController(DefaultRankingController):
         return self.contest.controller.registration_controller().filter_participants(queryset)
 
     def _get_old_results(self, freeze_time, pis, users):
+        """Computes the results from before ``freeze_time``.
+
+        The solved flag, penalties and the time of the deciding submission
+        are aggregated by the database for every (user, problem instance)
+        pair, so no submissions are loaded. Only the pairs with ignored
+        submissions before the first accepted one, which must be rescored
+        first, are processed submission by submission.
+
+        Submissions are ordered by date and then by id, in both cases.
+        """
         controller = self.contest.controller
-        submissions = (
-            Submission.objects.filter(
-                problem_instance__in=pis,
-                user__in=users,
-                kind="NORMAL",
-                date__lt=freeze_time,
+        submissions = Submission.objects.filter(
+            problem_instance__in=pis,
+            user__in=users,
+            kind="NORMAL",
+            date__lt=freeze_time,
+        ).exclude(status__in=IGNORED_STATUSES)
+        same_pair = submissions.filter(user=OuterRef("user"), problem_instance=OuterRef("problem_instance"))
+        first_ok = same_pair.filter(status="OK").order_by("date", "id")
+        first_ok_date = first_ok.values("date")[:1]
+        before_first_ok = Q(date__lt=Subquery(first_ok_date)) | Q(date=Subquery(first_ok_date), id__lt=Subquery(first_ok.values("id")[:1]))
+        stats = list(
+            submissions.values("user", "problem_instance")
+            .annotate(
+                count=Count("id"),
+                penalties=Count("id", filter=before_first_ok),
+                first_ok_date=Min("date", filter=Q(status="OK")),
+                first_ignored_date=Min("date", filter=Q(status="IGN")),
+                last_date=Max("date"),
+                last_status=Subquery(same_pair.order_by("-date", "-id").values("status")[:1]),
             )
-            .exclude(status__in=IGNORED_STATUSES)
-            .select_related("user", "problem_instance")
-            .order_by("user", "problem_instance", "date")
+            .order_by("user", "problem_instance")
         )
+
+        pis_by_id = {pi.id: pi for pi in pis}
+        users_by_id = {user.id: user for user in users.filter(id__in={row["user"] for row in stats})}
+        user_rounds_times = {}
         results = []
-        for user, user_submissions in itertools.groupby(submissions, attrgetter("user")):
-            for pi, user_pi_submissions in itertools.groupby(user_submissions, attrgetter("problem_instance")):
-                result = _FakeUserResultForProblem(user, pi)
-                controller._fill_user_result_for_problem(result, user_pi_submissions)
-                results.append(result)
+        for row in stats:
+            user_id = row["user"]
+            user = users_by_id[user_id]
+            pi = pis_by_id[row["problem_instance"]]
+            result = _FakeUserResultForProblem(user, pi)
+            results.append(result)
+
+            first_ok_date = row["first_ok_date"]
+            first_ignored_date = row["first_ignored_date"]
+            # An ignored submission with the same date as the accepted one
+            # may come first, so it is rescored too.
+            if first_ignored_date is not None and (first_ok_date is None or first_ignored_date <= first_ok_date):
+                controller._fill_user_result_for_problem(
+                    result,
+                    submissions.filter(user=user, problem_instance=pi).select_related("user", "problem_instance").order_by("date", "id"),
+                )
+                continue
+
+            if user_id not in user_rounds_times:
+                user_rounds_times[user_id] = controller.get_user_rounds_times(user)
+            round_times = user_rounds_times[user_id][pi.round]
+            solved = first_ok_date is not None
+            if solved:
+                penalties_count = row["penalties"]
+                date = first_ok_date
+                result.status = "OK"
+            else:
+                penalties_count = row["count"]
+                date = row["last_date"]
+                result.status = row["last_status"]
+            result.score = ACMScore(
+                problems_solved=int(solved),
+                penalties_count=penalties_count,
+                time_passed=controller.get_relative_time(round_times, date),
+                penalty_time=controller.get_penalty_time(),
+            )
         return results
 
+    def update_serialized_ranking(self, key, data, user_ids):
+        # Results of the frozen rounds are not stored in UserResultForProblem.
+        return None
+
     def serialize_ranking(self, key):
         controller = self.contest.controller
         rounds = list(self._rounds_for_key(key))
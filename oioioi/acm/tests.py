@@ -2,10 +2,12 @@ import re
 from datetime import UTC, datetime  # pylint: disable=E0611
 
 import bs4
+from django.contrib.auth.models import User
 from django.urls import reverse
 
+from oioioi.acm.controllers import IGNORED_STATUSES, _FakeUserResultForProblem
 from oioioi.base.tests import TestCase, fake_timezone_now
-from oioioi.contests.models import Contest
+from oioioi.contests.models import Contest, ProblemInstance, Round, Submission
 
 # The following tests use full-contest fixture, which may be changed this way:
 # 1. Create new database, do migrate
@@ -145,6 +147,39 @@ class TestACMRanking(TestCase):
         contest = Contest.objects.get()
         self.assertEqual(contest.controller.get_safe_exec_mode(), "cpu")
 
+    def test_frozen_results_with_same_dates(self):
+        contest = Contest.objects.get()
+        # A rejected and an accepted submission, and two rejected ones,
+        # sent at the same time.
+        Submission.objects.filter(id=7).update(date=Submission.objects.get(id=10).date)
+        Submission.objects.filter(id=22).update(date=Submission.objects.get(id=23).date, status="TLE")
+
+        round = Round.objects.get(id=1)
+        pis = list(ProblemInstance.objects.filter(round=round))
+        freeze_time = round.end_date
+        results = contest.controller.ranking_controller()._get_old_results(freeze_time, pis, User.objects.all())
+        self.assertEqual(len(results), 8)
+        for result in results:
+            # Results computed submission by submission.
+            expected = _FakeUserResultForProblem(result.user, result.problem_instance)
+            contest.controller._fill_user_result_for_problem(
+                expected,
+                Submission.objects.filter(
+                    user=result.user,
+                    problem_instance=result.problem_instance,
+                    kind="NORMAL",
+                    date__lt=freeze_time,
+                )
+                .exclude(status__in=IGNORED_STATUSES)
+                .order_by("date", "id"),
+            )
+            self.assertEqual(result.status, expected.status)
+            self.assertEqual(result.score._to_repr(), expected.score._to_repr())
+
+        scores = {(result.user.username, result.problem_instance.id): result.score for result in results}
+        self.assertEqual(scores["test_user", 2].penalties_count, 1)
+        self.assertEqual(scores["test_user", 3].penalties_count, 2)
+
 
 class TestACMScores(TestCase):
     fixtures = ["acm_test_full_contest"]
@@ -816,6 +816,26 @@ class TestArchive(TestCase):
             filename = os.path.join(self.base_dir, good_file)
             self.assertEqual(archive.Archive(filename).extracted_size(), expected_size)
 
+    def test_open_members(self):
+        for good_file, seekable in zip(self.good_files, (False, True), strict=True):
+            a = archive.Archive(os.path.join(self.base_dir, good_file))
+            self.assertEqual(a.seekable, seekable)
+            with a.open("b") as f:
+                self.assertEqual(f.read().strip(), b"bar")
+            with a.open("a") as f:
+                self.assertEqual(f.read(1), b"f")
+            with self.assertRaises(KeyError):
+                a.open("c")
+
+    def test_extract_members(self):
+        for good_file in self.good_files:
+            tmpdir = tempfile.mkdtemp()
+            try:
+                archive.extract(os.path.join(self.base_dir, good_file), tmpdir, members=["b"])
+                self.assertEqual(os.listdir(tmpdir), ["b"])
+            finally:
+                shutil.rmtree(tmpdir)
+
 
 class TestAdmin(TestCase):
     fixtures = ["test_users"]
@@ -21,9 +21,13 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import bz2
+import gzip
+import lzma
 import os
 import tarfile
 import tempfile
+import threading
 import zipfile
 
 from oioioi.filetracker.utils import stream_file
@@ -110,6 +114,22 @@ class Archive:
     def extract(self, *args, **kwargs):
         self._archive.extract(*args, **kwargs)
 
+    def open(self, name):
+        """Returns a binary file-like object reading the member ``name``
+        of the archive, without extracting it.
+
+        Members may be read by many threads at once, but reading them
+        in place is efficient only if the archive is :attr:`seekable`.
+        """
+        return self._archive.open(name)
+
+    @property
+    def seekable(self):
+        """Whether members of the archive can be read in any order without
+        decompressing the preceding ones.
+        """
+        return self._archive.seekable
+
     def filenames(self):
         return self._archive.filenames()
 
@@ -125,6 +145,10 @@ class BaseArchive:
     Base Archive class.  Implementations should inherit this class.
     """
 
+    # Whether members can be read in any order without decompressing
+    # the preceding ones.
+    seekable = True
+
     def __del__(self):
         if hasattr(self, "_archive"):
             self._archive.close()
@@ -147,7 +171,13 @@ class BaseArchive:
         """
         raise NotImplementedError()
 
-    def _extract(self, to_path):
+    def open(self, name):
+        """
+        Return a binary file-like object reading the member 'name'.
+        """
+        raise NotImplementedError()
+
+    def _extract(self, to_path, members=None):
         """
         Performs the actual extraction.  Separate from 'extract' method so that
         we don't recurse when subclasses don't declare their own 'extract'
@@ -161,16 +191,20 @@ class BaseArchive:
         if isinstance(self._archive, tarfile.TarFile):
             kwargs["filter"] = "data"
 
-        self._archive.extractall(to_path, **kwargs)
+        self._archive.extractall(to_path, members=members, **kwargs)
 
-    def extract(self, to_path="", method="safe"):
+    def extract(self, to_path="", method="safe", members=None):
+        """
+        Extract the archive, or only the members named 'members', to the
+        directory 'to_path'.
+        """
         if method == "safe":
             self.check_files(to_path)
         elif method == "insecure":
             pass
         else:
             raise ValueError("Invalid method option")
-        self._extract(to_path)
+        self._extract(to_path, members)
 
     def check_files(self, to_path=None):
         """
@@ -188,6 +222,36 @@ class BaseArchive:
                 raise UnsafeArchive(f"Archive member destination is outside the target directory.  member: {filename}")
 
 
+class _LockedReader:
+    """A file-like object reading from ``reader`` with ``lock`` held, so
+    that readers sharing the underlying file can be used by many threads.
+    """
+
+    def __init__(self, reader, lock):
+        self.reader = reader
+        self.lock = lock
+
+    def read(self, size=-1):
+        with self.lock:
+            return self.reader.read(size)
+
+    def readinto(self, buffer):
+        with self.lock:
+            return self.reader.readinto(buffer)
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 class TarArchive(BaseArchive):
     def __init__(self, file):
         # tarfile's open uses different parameters for file path vs. file obj.
@@ -195,6 +259,27 @@ class TarArchive(BaseArchive):
             self._archive = tarfile.open(name=file)
         else:
             self._archive = tarfile.open(fileobj=file)
+        # Reads all the headers, in one pass over the archive.
+        self._members = {member.name: member for member in self._archive.getmembers()}
+        self._lock = threading.Lock()
+
+    @property
+    def seekable(self):
+        # Seeking backwards in a compressed stream decompresses it again
+        # from the beginning.
+        return not isinstance(self._archive.fileobj, (gzip.GzipFile, bz2.BZ2File, lzma.LZMAFile))
+
+    def open(self, name):
+        member = self._members[name]
+        if not member.isfile():
+            raise KeyError(name)
+        with self._lock:
+            return _LockedReader(self._archive.extractfile(member), self._lock)
+
+    def _extract(self, to_path, members=None):
+        if members is not None:
+            members = [self._members[name] for name in members]
+        super()._extract(to_path, members)
 
     def filenames(self):
         return [tarinfo.name for tarinfo in self._archive.getmembers() if tarinfo.isfile()]
@@ -229,6 +314,11 @@ class ZipArchive(BaseArchive):
             total += member.file_size
         return total
 
+    def open(self, name):
+        # Members are found through the central directory. ZipFile
+        # serializes reads of the underlying file itself.
+        return self._archive.open(name)
+
     def filenames(self):
         return [zipinfo.filename for zipinfo in self._archive.infolist() if not zipinfo.is_dir()]
 
@@ -1,4 +1,5 @@
 import logging
+from collections import defaultdict
 from datetime import timedelta  # pylint: disable=E0611
 
 from django.conf import settings
@@ -31,6 +32,7 @@ from oioioi.contests.models import (
     UserResultForContest,
     UserResultForProblem,
     UserResultForRound,
+    get_or_create_user_results_for_update,
 )
 from oioioi.contests.utils import (
     generic_rounds_times,
@@ -842,6 +844,58 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
             self.update_user_result_for_contest(result)
             result.save()
 
+    def bulk_update_user_results(self, user_problem_instance_pairs):
+        """Bulk version of :meth:`update_user_results`, taking an iterable of
+        ``(user, problem_instance)`` pairs of this contest, e.g. all the
+        pairs affected by a rejudge.
+
+        Every kind of results is updated in a single transaction. Unless
+        :meth:`update_user_result_for_round` or
+        :meth:`update_user_result_for_contest` are overridden, the scores
+        are aggregated with one query for all the results.
+        """
+        pairs = list({(user.id, pi.id): (user, pi) for user, pi in user_problem_instance_pairs}.values())
+
+        # Same three transactions as in update_user_results.
+        pairs_by_problem = defaultdict(list)
+        for user, pi in pairs:
+            pairs_by_problem[pi.problem_id].append((user, pi))
+        for problem_pairs in pairs_by_problem.values():
+            problem_pairs[0][1].problem.controller.bulk_update_user_results(problem_pairs)
+
+        with transaction.atomic():
+            results = get_or_create_user_results_for_update(UserResultForRound, "round", [(user, pi.round) for user, pi in pairs])
+            if type(self).update_user_result_for_round is ContestController.update_user_result_for_round:
+                scores = defaultdict(list)
+                for user_id, round_id, score in UserResultForProblem.objects.filter(
+                    user__in={result.user_id for result in results},
+                    problem_instance__round__in={result.round_id for result in results},
+                ).values_list("user_id", "problem_instance__round_id", "score"):
+                    scores[user_id, round_id].append(score)
+                for result in results:
+                    result.score = self._sum_scores(scores[result.user_id, result.round_id])
+            else:
+                for result in results:
+                    self.update_user_result_for_round(result)
+            UserResultForRound.objects.bulk_update(results, ["score"])
+
+        with transaction.atomic():
+            results = get_or_create_user_results_for_update(UserResultForContest, "contest", [(user, self.contest) for user, _pi in pairs])
+            if type(self).update_user_result_for_contest is ContestController.update_user_result_for_contest:
+                scores = defaultdict(list)
+                for user_id, score in UserResultForRound.objects.filter(
+                    user__in={result.user_id for result in results},
+                    round__contest=self.contest,
+                    round__is_trial=False,
+                ).values_list("user_id", "score"):
+                    scores[user_id].append(score)
+                for result in results:
+                    result.score = self._sum_scores(scores[result.user_id])
+            else:
+                for result in results:
+                    self.update_user_result_for_contest(result)
+            UserResultForContest.objects.bulk_update(results, ["score"])
+
     def filter_my_visible_submissions(self, request, queryset, filter_user=True):
         """Returns the submissions which the user should see in the
         "My submissions" view.
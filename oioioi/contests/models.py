@@ -1,5 +1,6 @@
 import itertools
 import os.path
+from collections import defaultdict
 from enum import Enum
 
 from django.conf import settings
@@ -7,7 +8,7 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import Max
+from django.db.models import Max, Q
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
@@ -651,6 +652,41 @@ class UserResultForContest(models.Model):
         unique_together = ("user", "contest")
 
 
+def get_or_create_user_results_for_update(model, field, pairs):
+    """Bulk counterpart of ``select_for_update().get_or_create()`` for
+    user results.
+
+    ``model`` is one of :class:`UserResultForProblem`,
+    :class:`UserResultForRound` and :class:`UserResultForContest`, ``field``
+    is the name of its foreign key other than ``user`` and ``pairs`` is
+    an iterable of ``(user, object)`` tuples. Returns the locked results,
+    with ``user`` and ``field`` set to the given objects.
+
+    Must be called in a transaction.
+    """
+    objects = {(user.id, obj.id): (user, obj) for user, obj in pairs}
+    if not objects:
+        return []
+    users_by_obj = defaultdict(list)
+    for user_id, obj_id in objects:
+        users_by_obj[obj_id].append(user_id)
+    condition = Q()
+    for obj_id, user_ids in users_by_obj.items():
+        condition |= Q(**{field + "_id": obj_id, "user_id__in": user_ids})
+
+    queryset = model.objects.filter(condition)
+    existing = set(queryset.values_list("user_id", field + "_id"))
+    model.objects.bulk_create(
+        [model(user=user, **{field: obj}) for key, (user, obj) in objects.items() if key not in existing],
+        ignore_conflicts=True,
+    )
+    results = list(queryset.select_for_update().order_by("id"))
+    for result in results:
+        result.user, obj = objects[result.user_id, getattr(result, field + "_id")]
+        setattr(result, field, obj)
+    return results
+
+
 class RoundTimeExtension(models.Model):
     """Represents the time the round has been extended by for a certain user.
 
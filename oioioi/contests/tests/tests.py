@@ -64,6 +64,7 @@ from oioioi.contests.utils import (
     stringify_problems_limits,
 )
 from oioioi.dashboard.contest_dashboard import unregister_contest_dashboard_view
+from oioioi.evalmgr.models import RejudgeBatch
 from oioioi.filetracker.tests import TestStreamingMixin
 from oioioi.participants.models import TermsAcceptedPhrase
 from oioioi.problems.models import (
@@ -1237,6 +1238,10 @@ class TestRejudgeView(TestCase):
         self.pi.refresh_from_db()
         self.assertFalse(self.pi.needs_rejudge)
 
+        batch = RejudgeBatch.objects.get(problem_instance=self.pi)
+        self.assertEqual(batch.state, "FINISHED")
+        self.assertEqual(batch.items.filter(state="DONE").count(), self.pi.submission_set.count())
+
     def test_rejudge_post_partial_keeps_flag(self):
         """Rejudging a subset should NOT clear the needs_rejudge flag."""
         self.pi.needs_rejudge = True
@@ -70,6 +70,7 @@ from oioioi.contests.utils import (
     visible_problem_instances,
     visible_rounds,
 )
+from oioioi.evalmgr.rejudge import create_rejudge_batch
 from oioioi.filetracker.utils import stream_file
 from oioioi.problems.models import ProblemAttachment, ProblemStatement
 from oioioi.problems.utils import (
@@ -318,7 +319,7 @@ def problem_statement_zip_view(request, problem_instance, statement_id, path):
     if not controller.can_see_problem(request, pi) or not controller.can_see_statement(request, pi):
         raise PermissionDenied
 
-    return query_zip(statement, path)
+    return query_zip(statement, path, request)
 
 
 @menu_registry.register_decorator(_("Submit"), lambda request: reverse("submit"), order=300)
@@ -745,8 +746,7 @@ def rejudge_all_submissions_for_problem_view(request, problem_instance_id):
     selected_count = submissions.count()
 
     if request.POST:
-        for submission in submissions:
-            problem_instance.controller.judge(submission, {}, is_rejudge=True)
+        create_rejudge_batch(problem_instance, submissions, creator=request.user)
         messages.info(
             request,
             ngettext_lazy(
@@ -387,6 +387,18 @@ FILETRACKER_URL = os.getenv('FILETRACKER_URL', 'http://127.0.0.1:9999')
 # FILETRACKER_CACHE_CLEANER_CLEAN_LEVEL = '50'
 # FILETRACKER_CACHE_SIZE = '8G'
 
+# Read-through cache of Filetracker files opened by web processes (e.g.
+# statements and test files), see oioioi.filetracker.cache. Files up to
+# FILETRACKER_READ_CACHE_MEMORY_MAX_FILE_SIZE bytes are kept in memory of
+# every process, FILETRACKER_READ_CACHE_MEMORY_SIZE bytes in total. All
+# cached files are also kept in FILETRACKER_READ_CACHE_DIR, shared by the
+# processes, at most FILETRACKER_READ_CACHE_DISK_SIZE bytes of them.
+# Setting a size to 0 disables the corresponding tier.
+FILETRACKER_READ_CACHE_MEMORY_SIZE = 0
+FILETRACKER_READ_CACHE_MEMORY_MAX_FILE_SIZE = 1024 * 1024
+FILETRACKER_READ_CACHE_DIR = None
+FILETRACKER_READ_CACHE_DISK_SIZE = 0
+
 SUPERVISOR_AUTORELOAD_PATTERNS = [".py", ".pyc", ".pyo"]
 
 # For dj_pagination
@@ -421,9 +433,29 @@ PROBLEM_PACKAGE_BACKENDS = (
     'oioioi.sinolpack.package.SinolPackageBackend',
 )
 
+# Files of HTML statements are served with an ETag and may be cached by
+# browsers for this many seconds.
+STATEMENT_ZIP_CACHE_MAX_AGE = 3600
+
 SIOWORKERSD_URL = 'http://localhost:7889/'
 SIOWORKERS_BACKEND = 'oioioi.sioworkers.backends.SioworkersdBackend'
 
+# Sioworkersd is called through a pool of kept-alive connections, at most
+# SIOWORKERSD_POOL_SIZE of which are kept idle. Failed read-only calls,
+# and calls which could not connect, are retried SIOWORKERSD_RETRIES
+# times, waiting SIOWORKERSD_RETRY_BACKOFF seconds, doubled after every
+# attempt.
+# Timeouts are in seconds, None meaning no timeout; sync_run_group waits
+# for the jobs, so it has a separate one. Requests larger than
+# SIOWORKERSD_COMPRESS_THRESHOLD bytes are sent gzip-compressed; don't
+# set it unless your sioworkersd accepts gzip-encoded requests.
+SIOWORKERSD_POOL_SIZE = 8
+SIOWORKERSD_TIMEOUT = 60
+SIOWORKERSD_SYNC_TIMEOUT = None
+SIOWORKERSD_RETRIES = 3
+SIOWORKERSD_RETRY_BACKOFF = 0.5
+SIOWORKERSD_COMPRESS_THRESHOLD = None
+
 # Set this to false if you don't need sioworkersd instance (e. g.
 # because you use instance started by another instance of OIOIOI)
 RUN_SIOWORKERSD = True
@@ -439,6 +471,21 @@ SIOWORKERS_LISTEN_PORT = 7890
 # http://$SIOWORKERS_LISTEN_ADDR:$SIOWORKERS_LISTEN_PORT
 SIOWORKERS_LISTEN_URL = None
 
+# Number of threads of the sioworkers receiver. Results received while
+# a transaction queueing earlier ones is in progress are queued together,
+# at most SIOWORKERS_RECEIVER_BATCH_SIZE in a single transaction.
+# Throughput and latency of the receiver are logged every
+# SIOWORKERS_RECEIVER_METRICS_INTERVAL seconds.
+SIOWORKERS_RECEIVER_THREADS = 16
+SIOWORKERS_RECEIVER_BATCH_SIZE = 50
+SIOWORKERS_RECEIVER_METRICS_INTERVAL = 300
+
+# Number of jobs run at the same time by
+# oioioi.sioworkers.backends.LocalBackend, each in a separate process of
+# a pool, jobs with higher priority first. 1 means running the jobs one
+# by one in the process which requested them.
+LOCAL_BACKEND_CONCURRENCY = 1
+
 # Set to false to disable workers running on the server machine.
 RUN_LOCAL_WORKERS = False
 
@@ -573,6 +620,14 @@ USE_SINOLPACK_MAKEFILES = True
 # We suggest enabling it when using oioioi.usercontests app.
 SINOLPACK_RESTRICT_HTML = False
 
+# Number of threads uploading test files of a sinolpack package to
+# Filetracker.
+SINOLPACK_UPLOAD_THREADS = 8
+
+# Inwer and the model solution are run on batches of this many tests, as soon
+# as their inputs are uploaded, while the rest of the tests is being uploaded.
+SINOLPACK_JOBS_BATCH_SIZE = 20
+
 # Scorers below are used for judging submissions without contests,
 # eg. submitting to problems from problemset.
 DEFAULT_TEST_SCORER = \
@@ -586,6 +641,31 @@ DEFAULT_SCORE_AGGREGATOR = \
 MAX_TEST_TIME_LIMIT_PER_PROBLEM = 1000 * 60 * 60 * 30
 MAX_MEMORY_LIMIT_FOR_TEST = 256 * 1024
 
+# On rejudges, reuse results of tests which were already run with the same
+# compiled binary, input, output, checker and limits, instead of sending
+# them to sioworkers again. When enabled, every judged program is hashed
+# and its results are stored, so it pays off mostly for instances which
+# rejudge a lot. Timing-dependent verdicts (e.g. TLE) are never reused.
+# Results older than TEST_RESULT_CACHE_MAX_AGE seconds are removed.
+TEST_RESULT_CACHE_ENABLED = False
+TEST_RESULT_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+
+# Compiled model solutions, checkers, input verifiers and output generators
+# are kept in Filetracker and reused when the same sources are compiled
+# again, e.g. after uploading a new version of a package. The least
+# recently used ones are removed when their total size exceeds this many
+# bytes, e.g. 512 * 1024 * 1024. Set to 0 to disable the cache.
+COMPILATION_CACHE_MAX_SIZE = 0
+# Programs compiled with a different COMPILATION_CACHE_VERSION are not
+# reused. Change it after upgrading the compilers on sioworkers.
+COMPILATION_CACHE_VERSION = 1
+
+# If True, example and final tests of a submission are sent to sioworkers
+# together, right after compilation, saving one round-trip (and the
+# environ save, Celery task and resume that come with it) per submission.
+# The initial report then appears only when all the tests are done.
+PIPELINED_TESTS = False
+
 # Memory limit for input generator job.
 # This is a legacy option for szkopul backwards compatibility.
 # Shouldn't be changed unless you know what you are doing.
@@ -723,6 +803,11 @@ CELERY_ROUTES = {
 # Number of concurrently evaluated submissions
 EVALMGR_CONCURRENCY = 1
 
+# If True, evalmgr records wall time, number of database queries and environ
+# size of every evaluation phase. See them in the admin or with
+# manage.py evalmgr_phase_stats. Adds a few queries to every phase.
+EVALMGR_PROFILE_PHASES = False
+
 # Number of concurrently processed problem packages
 UNPACKMGR_CONCURRENCY = 1
 
@@ -788,12 +873,35 @@ CACHES = {
 }
 
 # Ranking
-RANKINGSD_CONCURRENCY = 1 # Number of rankingsd instances to start.
+# Number of rankings recalculated concurrently, passed by supervisord to
+# rankingsd as the number of its worker processes (--workers).
+RANKINGSD_CONCURRENCY = 1
 RANKINGSD_POLLING_INTERVAL = 0.5  # seconds
+# How invalidated rankings wake up rankingsd. Without a wakeup channel
+# (PollingWakeupChannel) rankingsd polls the database every
+# RANKINGSD_POLLING_INTERVAL, otherwise every RANKINGSD_FALLBACK_POLLING_INTERVAL.
+# Other channels are in oioioi.rankings.wakeup: PostgresWakeupChannel
+# (recommended with PostgreSQL) and LocalSocketWakeupChannel (only if rankingsd
+# runs on the same machine as the web and judging processes).
+RANKINGSD_WAKEUP_CHANNEL = 'oioioi.rankings.wakeup.PollingWakeupChannel'
+RANKINGSD_FALLBACK_POLLING_INTERVAL = 30  # seconds
+RANKINGSD_WAKEUP_SOCKET_DIR = os.path.join(tempfile.gettempdir(), 'oioioi-rankingsd')
+RANKINGSD_METRICS_INTERVAL = 60  # seconds; How often workers log their statistics.
 RANKING_COOLDOWN_FACTOR = 2  # seconds
 RANKING_ERROR_COOLDOWN = 300  # seconds; Don't overwhelm the admins' mailbox :).
 RANKING_MIN_COOLDOWN = 5  # seconds
 RANKING_MAX_COOLDOWN = 100  # seconds
+# Rankings in which results of at most that many users changed since the last
+# recalculation are updated incrementally. Set to 0 to always rebuild them.
+RANKING_MAX_INCREMENTAL_CHANGES = 500
+# If True, rankingsd doesn't render ranking pages, they are rendered on first
+# access and kept in the cache for RANKING_PAGE_CACHE_TIMEOUT. How many of them
+# are kept depends on the cache backend (see MAX_ENTRIES in CACHES).
+RANKING_LAZY_RENDERING = False
+RANKING_PAGE_CACHE_TIMEOUT = 3600  # seconds
+# If True, rankingsd also stores every ranking as CSV (in LANGUAGE_CODE), so
+# CSV exports of up-to-date rankings are streamed as they are.
+RANKING_PRECOMPUTE_CSV = False
 
 # Notifications configuration (client)
 # This one is for JavaScript WebSocket client.
@@ -848,6 +956,18 @@ OIOIOI_INSTANCE_WEIGHT_BONUS = 0
 NON_CONTEST_PRIORITY = 0
 NON_CONTEST_WEIGHT = 1000
 
+# Rejudges of all the submissions of a problem are judged in the background,
+# at most REJUDGE_BATCH_MAX_IN_FLIGHT submissions at a time, with judging
+# priority at most REJUDGE_BATCH_PRIORITY (and always below the contest's
+# own priority), so they don't starve live submissions. Run the
+# reconcile_rejudge_batches command periodically to continue rejudges whose
+# submissions were lost by the judging machines.
+REJUDGE_BATCH_MAX_IN_FLIGHT = 20
+REJUDGE_BATCH_PRIORITY = -10
+# User results of the rejudged submissions are updated together, after that
+# many submissions are judged (or when the batch stops).
+REJUDGE_BATCH_USER_RESULTS_CHUNK = 100
+
 # Interval [in seconds] for mailnotifyd to wait before scanning the database
 # for new messages to notify about
 MAILNOTIFYD_INTERVAL = 60
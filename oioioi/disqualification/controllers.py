@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.template.loader import render_to_string
+from django.utils.encoding import force_str
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
@@ -244,7 +245,7 @@ class WithDisqualificationRankingControllerMixin:
     def _get_csv_row(self, key, row):
         line = super()._get_csv_row(key, row)
         if self._show_disqualified(key):
-            line.append(_("Yes") if row.get("disqualified") else _("No"))
+            line.append(force_str(_("Yes") if row.get("disqualified") else _("No")))
         return line
 
     def serialize_ranking(self, key):
@@ -253,6 +254,12 @@ class WithDisqualificationRankingControllerMixin:
             return data
         return self._annotate_disqualified(key, data)
 
+    def update_serialized_ranking(self, key, data, user_ids):
+        data = super().update_serialized_ranking(key, data, user_ids)
+        if data is None or not self._show_disqualified(key):
+            return data
+        return self._annotate_disqualified(key, data)
+
     def _annotate_disqualified(self, key, data):
         users_ids = [row["user"].id for row in data["rows"]]
         not_disqualified = self.contest.controller.exclude_disqualified_users(User.objects.filter(id__in=users_ids))
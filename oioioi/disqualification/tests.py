@@ -230,10 +230,12 @@ class TestViewsProgramSubmissions(TestCase, TestViewsMixin):
         self.assertTrue(self.client.login(username="test_admin"))
         with fake_time(datetime(2015, 1, 1, tzinfo=utc)):
             response = self.client.get(url)
-            self.assertContains(response, "Test")
-            self.assertContains(response, "Disqualified")
-            self.assertContains(response, "Yes")
-            self.assertContains(response, str(Submission.objects.get(id=1).score))
+            self.assertEqual(response.status_code, 200)
+            content = b"".join(response.streaming_content).decode("utf-8")
+            self.assertIn("Test", content)
+            self.assertIn("Disqualified", content)
+            self.assertIn("Yes", content)
+            self.assertIn(str(Submission.objects.get(id=1).score), content)
 
     def test_submission(self):
         self._assert_submission(1, True)
@@ -2,7 +2,7 @@ import functools
 
 from django.contrib.admin import SimpleListFilter
 from django.db import transaction
-from django.db.models import F, OuterRef
+from django.db.models import Count, F, OuterRef, Q
 from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
@@ -14,7 +14,13 @@ from oioioi.base.utils.filters import ProblemNameListFilter
 from oioioi.contests.admin import contest_site
 from oioioi.contests.menu import contest_admin_menu_registry
 from oioioi.contests.utils import is_contest_admin
-from oioioi.evalmgr.models import QueuedJob
+from oioioi.evalmgr.models import PhaseProfile, QueuedJob, RejudgeBatch
+from oioioi.evalmgr.rejudge import (
+    cancel_rejudge_batch,
+    dispatch_rejudge_batch,
+    pause_rejudge_batch,
+    resume_rejudge_batch,
+)
 
 
 class UserListFilter(SimpleListFilter):
@@ -267,3 +273,140 @@ contest_admin_menu_registry.register(
     condition=(lambda request: not request.user.is_superuser and is_contest_admin(request)),
     order=60,
 )
+
+
+class RejudgeBatchAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "problem_instance",
+        "creator",
+        "creation_date",
+        "state",
+        "progress",
+        "in_flight",
+        "max_in_flight",
+    ]
+    list_filter = ["state"]
+    fields = ["problem_instance", "creator", "creation_date", "state", "max_in_flight"]
+    readonly_fields = ["problem_instance", "creator", "creation_date", "state"]
+    actions = ["pause_batches", "resume_batches", "cancel_batches"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.select_related("problem_instance", "creator").annotate(
+            num_items=Count("items"),
+            num_judged=Count("items", filter=Q(items__state="DONE")),
+            num_in_flight=Count("items", filter=Q(items__state="QUEUED")),
+        )
+
+    def progress(self, instance):
+        return f"{instance.num_judged} / {instance.num_items}"
+
+    progress.short_description = _("Judged")
+
+    def in_flight(self, instance):
+        return instance.num_in_flight
+
+    in_flight.short_description = _("In flight")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # The limit of submissions in flight might have been raised.
+        dispatch_rejudge_batch(obj.id)
+
+    def pause_batches(self, request, queryset):
+        for batch in queryset:
+            pause_rejudge_batch(batch)
+
+    pause_batches.short_description = _("Pause selected rejudges")
+
+    def resume_batches(self, request, queryset):
+        for batch in queryset:
+            resume_rejudge_batch(batch)
+
+    resume_batches.short_description = _("Resume selected rejudges")
+
+    def cancel_batches(self, request, queryset):
+        for batch in queryset:
+            cancel_rejudge_batch(batch)
+
+    cancel_batches.short_description = _("Cancel selected rejudges")
+
+
+admin.site.register(RejudgeBatch, RejudgeBatchAdmin)
+system_admin_menu_registry.register(
+    "rejudgebatch_admin",
+    _("Rejudges"),
+    lambda request: reverse("oioioiadmin:evalmgr_rejudgebatch_changelist"),
+    order=61,
+)
+
+
+class ContestRejudgeBatch(RejudgeBatch):
+    class Meta:
+        proxy = True
+        verbose_name = _("Contest rejudge batch")
+        verbose_name_plural = _("Contest rejudge batches")
+
+
+class ContestRejudgeBatchAdmin(RejudgeBatchAdmin):
+    def has_change_permission(self, request, obj=None):
+        return is_contest_admin(request)
+
+    def has_delete_permission(self, request, obj=None):
+        return is_contest_admin(request)
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.filter(problem_instance__contest=request.contest)
+
+
+contest_site.contest_register(ContestRejudgeBatch, ContestRejudgeBatchAdmin)
+contest_admin_menu_registry.register(
+    "rejudgebatch_admin",
+    _("Rejudges"),
+    lambda request: reverse("oioioiadmin:evalmgr_contestrejudgebatch_changelist"),
+    condition=(lambda request: not request.user.is_superuser and is_contest_admin(request)),
+    order=61,
+)
+
+
+class PhaseProfileAdmin(admin.ModelAdmin):
+    list_display = [
+        "phase",
+        "controller",
+        "time_bucket",
+        "count",
+        "avg_time",
+        "avg_queries",
+        "avg_environ_size",
+    ]
+    list_filter = ["phase", "controller"]
+    search_fields = ["phase", "handler"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def avg_time(self, instance):
+        return f"{instance.total_time / instance.count * 1000:.1f} ms" if instance.count else "-"
+
+    avg_time.short_description = _("Average wall time")
+
+    def avg_queries(self, instance):
+        return f"{instance.total_queries / instance.count:.1f}" if instance.count else "-"
+
+    avg_queries.short_description = _("Average DB queries")
+
+    def avg_environ_size(self, instance):
+        return f"{instance.total_environ_size // instance.count}" if instance.count else "-"
+
+    avg_environ_size.short_description = _("Average environ size (bytes)")
+
+
+admin.site.register(PhaseProfile, PhaseProfileAdmin)
@@ -4,6 +4,7 @@ import pprint
 from django.db import transaction
 
 from oioioi.evalmgr.models import QueuedJob
+from oioioi.evalmgr.rejudge import mark_rejudge_batch_item_judged
 
 logger = logging.getLogger(__name__)
 
@@ -22,3 +23,8 @@ def dump_env(env, message, **kwargs):
 def remove_queuedjob_on_error(environ, **kwargs):
     QueuedJob.objects.filter(job_id=environ["job_id"]).delete()
     return environ
+
+
+def rejudge_batch_item_judged(environ, **kwargs):
+    mark_rejudge_batch_item_judged(environ["extra_args"]["rejudge_batch_id"], environ["submission_id"])
+    return environ
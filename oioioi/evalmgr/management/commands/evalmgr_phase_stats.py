@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.utils.translation import gettext as _
+
+from oioioi.evalmgr.models import PhaseProfile
+from oioioi.evalmgr.profiling import phase_stats
+
+
+class Command(BaseCommand):
+    help = _("Show how long evaluation phases take, as recorded with EVALMGR_PROFILE_PHASES enabled, sorted by the total wall time.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-c",
+            "--controller",
+            action="store",
+            dest="controller",
+            help=_("Show only phases run by the given problem controller"),
+        )
+        parser.add_argument(
+            "--histograms",
+            action="store_true",
+            dest="histograms",
+            help=_("Show the histograms of wall times"),
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            dest="reset",
+            help=_("Delete the recorded measurements"),
+        )
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            PhaseProfile.objects.all().delete()
+            return
+
+        filters = {}
+        if options["controller"]:
+            filters["controller"] = options["controller"]
+        self.stdout.write(
+            "{:<30} {:>8} {:>10} {:>10} {:>8} {:>8} {:>8} {:>8} {:>10}  {}".format(
+                "phase", "count", "total [s]", "avg [ms]", "p50", "p90", "p99", "queries", "environ", "controller"
+            )
+        )
+        for row in phase_stats(**filters):
+            self.stdout.write(
+                "{:<30} {:>8} {:>10.2f} {:>10.1f} {:>8} {:>8} {:>8} {:>8.1f} {:>10.0f}  {}".format(
+                    row["phase"][:30],
+                    row["count"],
+                    row["total_time"],
+                    row["avg_time"] * 1000,
+                    row["p50_ms"],
+                    row["p90_ms"],
+                    row["p99_ms"],
+                    row["avg_queries"],
+                    row["avg_environ_size"],
+                    row["controller"],
+                )
+            )
+            if options["histograms"]:
+                for bucket, count in row["histogram"].items():
+                    self.stdout.write(f"    <= {bucket:>8} ms: {count}")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils.translation import gettext as _
+
+from oioioi.evalmgr.rejudge import reconcile_rejudge_batches
+
+
+class Command(BaseCommand):
+    help = _(
+        "Continue background rejudges waiting for submissions which disappeared from the evaluation queue without being judged. "
+        "Meant to be run periodically, e.g. from cron."
+    )
+
+    def handle(self, *args, **options):
+        count = reconcile_rejudge_batches()
+        if int(options["verbosity"]) > 0:
+            self.stdout.write(_("Reconciled %d rejudge batch(es).") % count)
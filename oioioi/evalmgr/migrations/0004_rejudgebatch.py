@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:23
+
+import django.db.models.deletion
+import django.utils.timezone
+import oioioi.base.fields
+import oioioi.evalmgr.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contests', '0025_merge_0017_submission_max_score_0024_roundstartdelay'),
+        ('evalmgr', '0003_alter_contestqueuedjob_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RejudgeBatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation_date', models.DateTimeField(default=django.utils.timezone.now, verbose_name='creation date')),
+                ('state', oioioi.base.fields.EnumField(default='RUNNING', max_length=64, verbose_name='state')),
+                ('max_in_flight', models.PositiveIntegerField(default=oioioi.evalmgr.models._default_max_in_flight, help_text='How many submissions of the batch may be judged at the same time', verbose_name='max in flight')),
+                ('creator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='creator')),
+                ('problem_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contests.probleminstance', verbose_name='problem instance')),
+            ],
+            options={
+                'verbose_name': 'rejudge batch',
+                'verbose_name_plural': 'rejudge batches',
+                'ordering': ['-creation_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ContestRejudgeBatch',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'Contest rejudge batch',
+                'verbose_name_plural': 'Contest rejudge batches',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('evalmgr.rejudgebatch',),
+        ),
+        migrations.CreateModel(
+            name='RejudgeBatchItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', oioioi.base.fields.EnumField(default='PENDING', max_length=64)),
+                ('results_updated', models.BooleanField(default=False)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='evalmgr.rejudgebatch')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contests.submission')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['batch', 'state'], name='evalmgr_rej_batch_i_78a4ac_idx')],
+            },
+        ),
+    ]
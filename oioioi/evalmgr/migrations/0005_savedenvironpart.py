@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:31
+# encode_environs added by hand.
+
+import json
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def encode_environs(apps, _schema_editor):
+    SavedEnviron = apps.get_model('evalmgr', 'SavedEnviron')
+    for saved_environ in SavedEnviron.objects.all():
+        environ = json.loads(saved_environ.environ)
+        saved_environ.data = zlib.compress(json.dumps({'environ': environ, 'parts': {}}).encode('utf-8'))
+        saved_environ.save(update_fields=['data'])
+
+
+def decode_environs(apps, _schema_editor):
+    SavedEnviron = apps.get_model('evalmgr', 'SavedEnviron')
+    SavedEnvironPart = apps.get_model('evalmgr', 'SavedEnvironPart')
+    for saved_environ in SavedEnviron.objects.all():
+        saved = json.loads(zlib.decompress(saved_environ.data))
+        environ = saved['environ']
+        for key, digest in saved['parts'].items():
+            part = SavedEnvironPart.objects.get(queued_job_id=saved_environ.queued_job_id, digest=digest)
+            environ[key] = json.loads(zlib.decompress(part.data))
+        saved_environ.environ = json.dumps(environ)
+        saved_environ.save(update_fields=['environ'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evalmgr', '0004_rejudgebatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedEnvironPart',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64)),
+                ('data', models.BinaryField()),
+                ('queued_job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='evalmgr.queuedjob')),
+            ],
+            options={
+                'unique_together': {('queued_job', 'digest')},
+            },
+        ),
+        migrations.AddField(
+            model_name='savedenviron',
+            name='data',
+            field=models.BinaryField(default=b'', help_text='Compressed, JSON-encoded evaluation environ'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='savedenviron',
+            name='environ',
+            field=models.TextField(default='', help_text='JSON-encoded evaluation environ'),
+        ),
+        migrations.RunPython(encode_environs, reverse_code=decode_environs),
+        migrations.RemoveField(
+            model_name='savedenviron',
+            name='environ',
+        ),
+    ]
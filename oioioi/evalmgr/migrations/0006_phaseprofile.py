@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evalmgr', '0005_savedenvironpart'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhaseProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phase', models.CharField(max_length=100, verbose_name='phase')),
+                ('handler', models.CharField(max_length=255, verbose_name='handler')),
+                ('controller', models.CharField(blank=True, max_length=255, verbose_name='problem controller')),
+                ('time_bucket', models.IntegerField(verbose_name='wall time up to (ms)')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+                ('total_time', models.FloatField(default=0.0, verbose_name='total wall time (s)')),
+                ('total_queries', models.BigIntegerField(default=0, verbose_name='total DB queries')),
+                ('total_environ_size', models.BigIntegerField(default=0, verbose_name='total environ size (bytes)')),
+            ],
+            options={
+                'verbose_name': 'evaluation phase profile',
+                'verbose_name_plural': 'evaluation phase profiles',
+                'ordering': ['phase', 'controller', 'time_bucket'],
+                'unique_together': {('phase', 'handler', 'controller', 'time_bucket')},
+            },
+        ),
+    ]
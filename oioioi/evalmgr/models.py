@@ -1,11 +1,15 @@
+import hashlib
 import json
+import zlib
 
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from oioioi.base.fields import EnumField, EnumRegistry
-from oioioi.contests.models import Submission
+from oioioi.contests.models import ProblemInstance, Submission
 
 job_states = EnumRegistry()
 job_states.register("QUEUED", _("Queued"))
@@ -29,20 +33,160 @@ class QueuedJob(models.Model):
         ordering = ["pk"]
 
 
+# Values of environs at least this long (when JSON-encoded) are stored
+# separately, as SavedEnvironParts.
+_MIN_PART_SIZE = 4096
+
+
+def _encode(value):
+    return zlib.compress(json.dumps(value).encode("utf-8"))
+
+
+def _decode(data):
+    return json.loads(zlib.decompress(data))
+
+
 class SavedEnviron(models.Model):
+    """An evaluation environ saved while its job is transferred to
+    an external evaluation system.
+
+    Large values, like ``tests`` or ``test_results``, are stored as
+    :class:`SavedEnvironPart` objects shared by all environs saved during
+    the evaluation of the job, so a value which doesn't change between
+    transfers is written only once.
+    """
+
     # A queued_job field can't be a primary key for this model, as it would
     # cause evalmgr to 'resume' job with results from previous asynchronous
     # call.
     queued_job = models.OneToOneField(QueuedJob, on_delete=models.CASCADE)
-    environ = models.TextField(help_text=_("JSON-encoded evaluation environ"))
+    data = models.BinaryField(help_text=_("Compressed, JSON-encoded evaluation environ"))
     save_time = models.DateTimeField(auto_now=True, help_text=_("Time and date when the environ was saved"))
 
     def load_environ(self):
-        return json.loads(self.environ)
+        saved = _decode(self.data)
+        environ = saved["environ"]
+        parts = saved["parts"]
+        if parts:
+            data = dict(SavedEnvironPart.objects.filter(queued_job_id=self.queued_job_id, digest__in=set(parts.values())).values_list("digest", "data"))
+            for key, digest in parts.items():
+                environ[key] = _decode(data[digest])
+        return environ
 
     @classmethod
     def save_environ(cls, environ):
-        return cls.objects.create(
-            queued_job=QueuedJob.objects.get(job_id=environ["job_id"]),
-            environ=json.dumps(environ),
+        queued_job = QueuedJob.objects.get(job_id=environ["job_id"])
+        small_values = {}
+        parts = {}
+        part_data = {}
+        for key, value in environ.items():
+            encoded = json.dumps(value).encode("utf-8")
+            if len(encoded) < _MIN_PART_SIZE:
+                small_values[key] = value
+                continue
+            digest = hashlib.sha256(encoded).hexdigest()
+            parts[key] = digest
+            part_data[digest] = encoded
+
+        job_parts = SavedEnvironPart.objects.filter(queued_job=queued_job)
+        # Parts of the previously saved environs which are no longer used.
+        job_parts.exclude(digest__in=part_data.keys()).delete()
+        existing = set(job_parts.values_list("digest", flat=True))
+        SavedEnvironPart.objects.bulk_create(
+            [
+                SavedEnvironPart(queued_job=queued_job, digest=digest, data=zlib.compress(encoded))
+                for digest, encoded in part_data.items()
+                if digest not in existing
+            ]
         )
+        return cls.objects.create(queued_job=queued_job, data=_encode({"environ": small_values, "parts": parts}))
+
+
+class SavedEnvironPart(models.Model):
+    """A large value of a :class:`SavedEnviron`, identified by the hash of
+    its JSON encoding.
+    """
+
+    queued_job = models.ForeignKey(QueuedJob, on_delete=models.CASCADE)
+    digest = models.CharField(max_length=64)
+    data = models.BinaryField()
+
+    class Meta:
+        unique_together = ("queued_job", "digest")
+
+
+rejudge_batch_states = EnumRegistry()
+rejudge_batch_states.register("RUNNING", _("Running"))
+rejudge_batch_states.register("PAUSED", _("Paused"))
+rejudge_batch_states.register("CANCELLED", _("Cancelled"))
+rejudge_batch_states.register("FINISHED", _("Finished"))
+
+
+def _default_max_in_flight():
+    return settings.REJUDGE_BATCH_MAX_IN_FLIGHT
+
+
+class RejudgeBatch(models.Model):
+    """Submissions of a problem instance rejudged in the background,
+    at most ``max_in_flight`` at a time.
+
+    See :mod:`oioioi.evalmgr.rejudge`.
+    """
+
+    problem_instance = models.ForeignKey(ProblemInstance, on_delete=models.CASCADE, verbose_name=_("problem instance"))
+    creator = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, verbose_name=_("creator"))
+    creation_date = models.DateTimeField(default=timezone.now, verbose_name=_("creation date"))
+    state = EnumField(rejudge_batch_states, default="RUNNING", verbose_name=_("state"))
+    max_in_flight = models.PositiveIntegerField(
+        default=_default_max_in_flight,
+        verbose_name=_("max in flight"),
+        help_text=_("How many submissions of the batch may be judged at the same time"),
+    )
+
+    class Meta:
+        verbose_name = _("rejudge batch")
+        verbose_name_plural = _("rejudge batches")
+        ordering = ["-creation_date"]
+
+
+rejudge_item_states = EnumRegistry()
+rejudge_item_states.register("PENDING", _("Pending"))
+rejudge_item_states.register("QUEUED", _("Queued"))
+rejudge_item_states.register("DONE", _("Done"))
+rejudge_item_states.register("CANCELLED", _("Cancelled"))
+
+
+class RejudgeBatchItem(models.Model):
+    batch = models.ForeignKey(RejudgeBatch, related_name="items", on_delete=models.CASCADE)
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE)
+    state = EnumField(rejudge_item_states, default="PENDING")
+    # User results of judged submissions are updated in bulk, see
+    # oioioi.evalmgr.rejudge.
+    results_updated = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [models.Index(fields=["batch", "state"])]
+
+
+class PhaseProfile(models.Model):
+    """Measurements of an evaluation phase run by a problem controller,
+    for the runs whose wall time fell into one bucket of a histogram.
+
+    Gathered when ``EVALMGR_PROFILE_PHASES`` is set, see
+    :mod:`oioioi.evalmgr.profiling`.
+    """
+
+    phase = models.CharField(max_length=100, verbose_name=_("phase"))
+    handler = models.CharField(max_length=255, verbose_name=_("handler"))
+    controller = models.CharField(max_length=255, blank=True, verbose_name=_("problem controller"))
+    time_bucket = models.IntegerField(verbose_name=_("wall time up to (ms)"))
+    count = models.IntegerField(default=0, verbose_name=_("count"))
+    total_time = models.FloatField(default=0.0, verbose_name=_("total wall time (s)"))
+    total_queries = models.BigIntegerField(default=0, verbose_name=_("total DB queries"))
+    total_environ_size = models.BigIntegerField(default=0, verbose_name=_("total environ size (bytes)"))
+
+    class Meta:
+        verbose_name = _("evaluation phase profile")
+        verbose_name_plural = _("evaluation phase profiles")
+        unique_together = ("phase", "handler", "controller", "time_bucket")
+        ordering = ["phase", "controller", "time_bucket"]
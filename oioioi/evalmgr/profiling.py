@@ -0,0 +1,110 @@
+"""Profiling of evaluation phases.
+
+When ``EVALMGR_PROFILE_PHASES`` is set, evalmgr measures the wall time,
+the number of database queries and the size of the resulting environ of
+every phase it runs. Measurements are aggregated in
+:class:`~oioioi.evalmgr.models.PhaseProfile` objects, by phase, handler
+and problem controller, into histograms of wall times with power of two
+buckets (in milliseconds).
+
+The results can be browsed in the admin or printed by the
+``evalmgr_phase_stats`` management command.
+"""
+
+import json
+import math
+import time
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from oioioi.evalmgr.models import PhaseProfile
+
+
+def _time_bucket(wall_time):
+    milliseconds = max(math.ceil(wall_time * 1000), 1)
+    return 1 << (milliseconds - 1).bit_length()
+
+
+def record_phase(phase, handler, controller, wall_time, queries, environ_size):
+    key = {
+        "phase": phase,
+        "handler": handler,
+        "controller": controller,
+        "time_bucket": _time_bucket(wall_time),
+    }
+    increments = {
+        "count": F("count") + 1,
+        "total_time": F("total_time") + wall_time,
+        "total_queries": F("total_queries") + queries,
+        "total_environ_size": F("total_environ_size") + environ_size,
+    }
+    with transaction.atomic():
+        if not PhaseProfile.objects.filter(**key).update(**increments):
+            PhaseProfile.objects.bulk_create([PhaseProfile(**key)], ignore_conflicts=True)
+            PhaseProfile.objects.filter(**key).update(**increments)
+
+
+def profile_phase(phase, handler, handler_func, env, kwargs):
+    """Runs ``handler_func(env, **kwargs)`` and records its measurements."""
+    controller = env.get("problem_controller", "")
+    queries = 0
+
+    def count_query(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    start = time.monotonic()
+    with connection.execute_wrapper(count_query):
+        result = handler_func(env, **kwargs)
+    wall_time = time.monotonic() - start
+    environ_size = len(json.dumps(result, default=repr)) if result is not None else 0
+    record_phase(phase, handler, controller, wall_time, queries, environ_size)
+    return result
+
+
+def phase_stats(**filters):
+    """Returns a list of dicts with the aggregated measurements of every
+    (phase, handler, problem controller), sorted by the total wall time,
+    descending.
+
+    Percentiles are upper bounds of the histogram buckets they fall into.
+    """
+    groups = defaultdict(list)
+    for profile in PhaseProfile.objects.filter(**filters).order_by("time_bucket"):
+        groups[(profile.phase, profile.handler, profile.controller)].append(profile)
+
+    stats = []
+    for (phase, handler, controller), profiles in groups.items():
+        count = sum(profile.count for profile in profiles)
+        if not count:
+            continue
+        total_time = sum(profile.total_time for profile in profiles)
+
+        def percentile(fraction, profiles=profiles, count=count):
+            seen = 0
+            for profile in profiles:
+                seen += profile.count
+                if seen >= fraction * count:
+                    return profile.time_bucket
+
+        stats.append(
+            {
+                "phase": phase,
+                "handler": handler,
+                "controller": controller,
+                "count": count,
+                "total_time": total_time,
+                "avg_time": total_time / count,
+                "p50_ms": percentile(0.5),
+                "p90_ms": percentile(0.9),
+                "p99_ms": percentile(0.99),
+                "avg_queries": sum(profile.total_queries for profile in profiles) / count,
+                "avg_environ_size": sum(profile.total_environ_size for profile in profiles) / count,
+                "histogram": {profile.time_bucket: profile.count for profile in profiles},
+            }
+        )
+    stats.sort(key=lambda row: row["total_time"], reverse=True)
+    return stats
@@ -0,0 +1,174 @@
+"""Background rejudges of many submissions.
+
+Submissions of a :class:`~oioioi.evalmgr.models.RejudgeBatch` are judged
+with judging priority at most ``REJUDGE_BATCH_PRIORITY`` (and lower than
+live submissions of their contest) and at most ``max_in_flight`` of them
+are in the evaluation queue at a time. Whenever one of them is judged,
+the next ones are queued.
+
+Submissions whose jobs disappear from the evaluation queue without being
+judged (e.g. cancelled, or lost by a worker) are skipped, when the batch is
+dispatched again. This happens when a cancelled job is dropped and in
+:func:`reconcile_rejudge_batches`, run by the ``reconcile_rejudge_batches``
+management command.
+
+User results are not updated after every judged submission, but in bulk,
+every ``REJUDGE_BATCH_USER_RESULTS_CHUNK`` submissions and when no
+submissions of the batch are being judged.
+"""
+
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from oioioi.evalmgr.models import QueuedJob, RejudgeBatch, RejudgeBatchItem
+from oioioi.evalmgr.tasks import batch_delay_environ
+
+_dispatching = threading.local()
+
+
+def create_rejudge_batch(problem_instance, submissions, creator=None):
+    """Creates a batch rejudging the ``submissions`` queryset of
+    ``problem_instance`` and queues its first submissions.
+    """
+    with transaction.atomic():
+        batch = RejudgeBatch.objects.create(problem_instance=problem_instance, creator=creator)
+        RejudgeBatchItem.objects.bulk_create(
+            [RejudgeBatchItem(batch=batch, submission_id=submission_id) for submission_id in submissions.order_by("id").values_list("id", flat=True)]
+        )
+    dispatch_rejudge_batch(batch.id)
+    return batch
+
+
+def prepare_rejudge_batch_environ(environ):
+    """Adjusts the evaluation environ of a submission judged as a part of
+    the batch with id ``environ['extra_args']['rejudge_batch_id']``.
+    """
+    if "contest_priority" in environ:
+        # Never above live submissions of the contest.
+        environ["contest_priority"] = min(
+            environ["contest_priority"] - 1,
+            settings.REJUDGE_BATCH_PRIORITY + settings.OIOIOI_INSTANCE_PRIORITY_BONUS,
+        )
+    handler = ("rejudge_batch_item_judged", "oioioi.evalmgr.handlers.rejudge_batch_item_judged")
+    for key in ("recipe", "error_handlers"):
+        environ[key] = [entry for entry in environ.get(key, []) if entry[0] != "update_user_results"]
+        environ[key].append(handler)
+
+
+def dispatch_rejudge_batch(batch_id):
+    """Queues as many submissions of the batch as its ``max_in_flight``
+    allows, and finishes the batch once all of them are judged.
+    """
+    # With CELERY_ALWAYS_EAGER submissions are judged (and dispatch
+    # the batch again) before judge() returns.
+    if getattr(_dispatching, "batch_ids", None) is not None:
+        _dispatching.batch_ids.add(batch_id)
+        return
+    _dispatching.batch_ids = {batch_id}
+    try:
+        while _dispatching.batch_ids:
+            _dispatch(_dispatching.batch_ids.pop())
+    finally:
+        _dispatching.batch_ids = None
+
+
+def _dispatch(batch_id):
+    with transaction.atomic():
+        try:
+            batch = RejudgeBatch.objects.select_for_update().get(id=batch_id)
+        except RejudgeBatch.DoesNotExist:
+            return
+        if batch.state in ("RUNNING", "PAUSED"):
+            _queue_submissions(batch)
+        idle = not batch.items.filter(state="QUEUED").exists()
+        if idle and batch.state == "RUNNING" and not batch.items.filter(state="PENDING").exists():
+            batch.state = "FINISHED"
+            batch.save(update_fields=["state"])
+    if idle:
+        update_rejudged_user_results(batch)
+
+
+def _queue_submissions(batch):
+    # Jobs removed from the evaluation queue never finish.
+    batch.items.filter(state="QUEUED").exclude(Exists(QueuedJob.objects.filter(submission=OuterRef("submission")))).update(state="CANCELLED")
+    if batch.state != "RUNNING":
+        return
+    in_flight = batch.items.filter(state="QUEUED").count()
+    items = list(batch.items.filter(state="PENDING").select_related("submission__problem_instance").order_by("id")[: max(batch.max_in_flight - in_flight, 0)])
+    RejudgeBatchItem.objects.filter(id__in=[item.id for item in items]).update(state="QUEUED")
+    with batch_delay_environ():
+        for item in items:
+            submission = item.submission
+            submission.problem_instance.controller.judge(submission, {"rejudge_batch_id": batch.id}, is_rejudge=True)
+
+
+def mark_rejudge_batch_item_judged(batch_id, submission_id):
+    """Called when a submission of the batch is judged."""
+    # Submissions of a cancelled batch may still finish judging, so their
+    # results must be updated too.
+    RejudgeBatchItem.objects.filter(batch_id=batch_id, submission_id=submission_id, state__in=["QUEUED", "CANCELLED"]).update(state="DONE")
+    not_updated = RejudgeBatchItem.objects.filter(batch_id=batch_id, state="DONE", results_updated=False)
+    if not_updated.count() >= settings.REJUDGE_BATCH_USER_RESULTS_CHUNK:
+        update_rejudged_user_results(RejudgeBatch.objects.get(id=batch_id))
+    dispatch_rejudge_batch(batch_id)
+
+
+def reconcile_rejudge_batches():
+    """Dispatches again the active batches with submissions which are not
+    in the evaluation queue anymore, but were never reported as judged.
+    Returns the number of such batches.
+    """
+    lost = RejudgeBatchItem.objects.filter(batch=OuterRef("pk"), state="QUEUED").exclude(Exists(QueuedJob.objects.filter(submission=OuterRef("submission"))))
+    batch_ids = list(RejudgeBatch.objects.filter(state__in=["RUNNING", "PAUSED"]).filter(Exists(lost)).values_list("id", flat=True))
+    for batch_id in batch_ids:
+        dispatch_rejudge_batch(batch_id)
+    return len(batch_ids)
+
+
+def job_dropped(environ):
+    """Called (in a transaction) when a cancelled job is dropped from
+    the evaluation queue, so that its batch doesn't wait for it.
+    """
+    batch_id = environ.get("extra_args", {}).get("rejudge_batch_id")
+    if batch_id is not None:
+        transaction.on_commit(lambda: dispatch_rejudge_batch(batch_id))
+
+
+def update_rejudged_user_results(batch):
+    """Updates user results of the judged submissions of the batch, with
+    a single ranking invalidation.
+    """
+    items = list(batch.items.filter(state="DONE", results_updated=False).select_related("submission__user"))
+    pairs = [(item.submission.user, batch.problem_instance) for item in items if item.submission.user is not None]
+    if pairs:
+        batch.problem_instance.controller.bulk_update_user_results(pairs)
+    RejudgeBatchItem.objects.filter(id__in=[item.id for item in items]).update(results_updated=True)
+
+
+def pause_rejudge_batch(batch):
+    """Stops queueing submissions of the batch. The ones already queued
+    are still judged.
+    """
+    RejudgeBatch.objects.filter(id=batch.id, state="RUNNING").update(state="PAUSED")
+
+
+def resume_rejudge_batch(batch):
+    if RejudgeBatch.objects.filter(id=batch.id, state="PAUSED").update(state="RUNNING"):
+        dispatch_rejudge_batch(batch.id)
+
+
+def cancel_rejudge_batch(batch):
+    """Cancels the batch, removing its queued submissions from
+    the evaluation queue.
+    """
+    with transaction.atomic():
+        if not RejudgeBatch.objects.filter(id=batch.id, state__in=["RUNNING", "PAUSED"]).update(state="CANCELLED"):
+            return
+        batch.items.filter(state="PENDING").update(state="CANCELLED")
+        queued = batch.items.filter(state="QUEUED")
+        QueuedJob.objects.filter(submission__in=queued.values("submission")).update(state="CANCELLED")
+        queued.update(state="CANCELLED")
+    update_rejudged_user_results(batch)
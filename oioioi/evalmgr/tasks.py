@@ -1,22 +1,29 @@
 import copy
 import pprint
 import sys
+import threading
+from contextlib import contextmanager
 from uuid import uuid4
 
 import six
 from celery.exceptions import Ignore
+from django.conf import settings
 from django.db import transaction
 from django.utils.module_loading import import_string
 
 from celery import shared_task
+from oioioi.base.utils import memoized
 from oioioi.base.utils.db import require_transaction
 from oioioi.base.utils.loaders import load_modules
 from oioioi.evalmgr import logger
 from oioioi.evalmgr.models import QueuedJob, SavedEnviron
-from oioioi.evalmgr.utils import mark_job_state
+from oioioi.evalmgr.profiling import profile_phase
+from oioioi.evalmgr.utils import mark_job_state, mark_jobs_state
 
 loaded_controllers = False
 
+_collected_environs = threading.local()
+
 
 def _placeholder(environ, **kwargs):
     return environ
@@ -139,6 +146,12 @@ def replace_recipe_entry(environ, name, new_entry):
     recipe[index] = new_entry
 
 
+@memoized
+def _get_handler(handler_name):
+    """Imports a recipe handler, once per process."""
+    return import_string(handler_name)
+
+
 def _run_phase(env, phase, extra_kwargs=None):
     phaseName = phase[0]
     handlerName = phase[1]
@@ -150,8 +163,11 @@ def _run_phase(env, phase, extra_kwargs=None):
         kwargs = phase[2].copy()
     if extra_kwargs:
         kwargs.update(extra_kwargs)
-    handler_func = import_string(handlerName)
-    env = handler_func(env, **kwargs)
+    handler_func = _get_handler(handlerName)
+    if settings.EVALMGR_PROFILE_PHASES:
+        env = profile_phase(phaseName, handlerName, handler_func, env, kwargs)
+    else:
+        env = handler_func(env, **kwargs)
     if env is None:
         raise RuntimeError(f'Evaluation handler "{phaseName}" ({handlerName}) forgot to return the environment.')
     return env
@@ -243,7 +259,14 @@ def delay_environ(environ, **evalmgr_extra_args):
     was already resumed before (or was cancelled).
 
     Requires to be called from transaction.
+
+    Inside :func:`batch_delay_environ` the environ is only collected, and
+    None is returned.
     """
+    collected = getattr(_collected_environs, "items", None)
+    if collected is not None:
+        collected.append((environ, evalmgr_extra_args))
+        return None
     if "saved_environ_id" in environ:
         environ = _resume_job(environ)
         if environ is None:
@@ -255,6 +278,59 @@ def delay_environ(environ, **evalmgr_extra_args):
     return async_result
 
 
+@require_transaction
+def delay_environs(environs, **evalmgr_extra_args):
+    """Like :func:`delay_environ`, but for many environs, marking them all
+    as queued with a constant number of queries. Returns the list of
+    associated async results of the environs which were queued.
+
+    Requires to be called from transaction.
+    """
+    return _delay_environs([(environ, evalmgr_extra_args) for environ in environs])
+
+
+def _delay_environs(items):
+    resumed = []
+    for environ, extra_args in items:
+        if "saved_environ_id" in environ:
+            environ = _resume_job(environ)
+            if environ is None:
+                continue
+        resumed.append((environ, extra_args))
+    queued = {id(environ) for environ in mark_jobs_state([environ for environ, _extra_args in resumed], "QUEUED")}
+    async_results = []
+    jobs = []
+    for environ, extra_args in resumed:
+        if id(environ) not in queued:
+            continue
+        async_result = evalmgr_job.apply_async((environ,), **extra_args)
+        async_results.append(async_result)
+        jobs.append(QueuedJob(job_id=environ["job_id"], celery_task_id=async_result.id))
+    QueuedJob.objects.bulk_update(jobs, ["celery_task_id"])
+    return async_results
+
+
+@contextmanager
+def batch_delay_environ():
+    """Collects the environs passed to :func:`delay_environ` in the block
+    (in the current thread) and queues them together, with
+    :func:`delay_environs`, at its end.
+
+    Requires to be called from transaction.
+    """
+    if getattr(_collected_environs, "items", None) is not None:
+        yield
+        return
+    _collected_environs.items = []
+    try:
+        yield
+        items = _collected_environs.items
+    finally:
+        _collected_environs.items = None
+    if items:
+        _delay_environs(items)
+
+
 @shared_task
 def evalmgr_job(env):
     r"""Takes environment and evaluates it according to its recipe.
@@ -313,7 +389,10 @@ def evalmgr_job(env):
         load_modules("controllers")
         loaded_controllers = True
 
-    env = copy.deepcopy(env)
+    # Environs received from the broker are fresh copies, but the ones
+    # passed directly or run eagerly belong to the caller.
+    if evalmgr_job.request.called_directly or evalmgr_job.request.is_eager:
+        env = copy.deepcopy(env)
 
     try:
         if "job_id" not in env:
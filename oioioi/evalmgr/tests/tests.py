@@ -1,15 +1,27 @@
 import copy
+import json
 import os.path
 import uuid
+from io import StringIO
 
+from django.conf import settings
+from django.core.management import call_command
 from django.db import transaction
 from django.test.utils import override_settings
 from django.urls import reverse
 
 from oioioi.base.tests import TestCase
 from oioioi.contests.models import Contest, Submission
-from oioioi.evalmgr.models import QueuedJob, SavedEnviron
-from oioioi.evalmgr.tasks import create_environ, delay_environ, transfer_job
+from oioioi.evalmgr.models import QueuedJob, RejudgeBatch, SavedEnviron, SavedEnvironPart
+from oioioi.evalmgr.profiling import phase_stats
+from oioioi.evalmgr.rejudge import (
+    cancel_rejudge_batch,
+    dispatch_rejudge_batch,
+    prepare_rejudge_batch_environ,
+    reconcile_rejudge_batches,
+    resume_rejudge_batch,
+)
+from oioioi.evalmgr.tasks import batch_delay_environ, create_environ, delay_environ, delay_environs, transfer_job
 from oioioi.evalmgr.utils import mark_job_state
 from oioioi.filetracker.client import get_client
 from oioioi.programs.controllers import ProgrammingContestController
@@ -76,6 +88,64 @@ class TestLocalJobs(TestCase):
         self.assertEqual("Epic fail.", city_result.get()["output"])
         self.assertEqual("Epic fail.", jungle_result.get()["output"])
 
+    def test_delay_environs(self):
+        QueuedJob.objects.create(job_id="cancelled", state="CANCELLED")
+        environs = [{"job_id": job_id, "recipe": hunting, "area": area} for job_id, area in (("city", "city"), ("forest", "forest"), ("cancelled", "forest"))]
+        with transaction.atomic():
+            results = delay_environs(environs)
+        self.assertEqual(["Epic fail.", "Hedgehog hunted."], [result.get()["output"] for result in results])
+        self.assertFalse(QueuedJob.objects.exists())
+
+    def test_batch_delay_environ(self):
+        TestAsyncJobs.transferred_environs = []
+        env = create_environ()
+        env["recipe"] = [("transfer", "oioioi.evalmgr.tests.tests._call_transfer")]
+        with transaction.atomic(), batch_delay_environ():
+            self.assertIsNone(delay_environ(env))
+            self.assertFalse(QueuedJob.objects.exists())
+        self.assertEqual(len(TestAsyncJobs.transferred_environs), 1)
+        self.assertEqual(QueuedJob.objects.get().state, "WAITING")
+
+    def test_mark_job_state_queries(self):
+        env = {"job_id": "job"}
+        with transaction.atomic():
+            self.assertTrue(mark_job_state(env, "QUEUED"))
+            with self.assertNumQueries(1):
+                self.assertTrue(mark_job_state(env, "PROGRESS"))
+            self.assertEqual(QueuedJob.objects.get().state, "PROGRESS")
+            QueuedJob.objects.update(state="CANCELLED")
+            self.assertFalse(mark_job_state(env, "WAITING"))
+            self.assertFalse(QueuedJob.objects.exists())
+
+
+class TestPhaseProfiling(TestCase):
+    @override_settings(EVALMGR_PROFILE_PHASES=True)
+    def test_profiling(self):
+        for _ in range(2):
+            env = create_environ()
+            env.update({"recipe": hunting, "area": "forest", "problem_controller": "hunting.Controller"})
+            delay_environ_wrapper(env).get()
+
+        stats = {row["phase"]: row for row in phase_stats()}
+        self.assertEqual(set(stats), {"Prepare guns", "Hunt", "Rest"})
+        self.assertEqual(stats["Hunt"]["count"], 2)
+        self.assertEqual(stats["Hunt"]["controller"], "hunting.Controller")
+        self.assertEqual(sum(stats["Hunt"]["histogram"].values()), 2)
+        self.assertGreater(stats["Rest"]["avg_environ_size"], 0)
+
+        out = StringIO()
+        call_command("evalmgr_phase_stats", stdout=out)
+        self.assertIn("Prepare guns", out.getvalue())
+
+        call_command("evalmgr_phase_stats", reset=True)
+        self.assertEqual(phase_stats(), [])
+
+    def test_disabled(self):
+        env = create_environ()
+        env.update({"recipe": hunting, "area": "forest"})
+        delay_environ_wrapper(env).get()
+        self.assertEqual(phase_stats(), [])
+
 
 def upload_source(env, **kwargs):
     fc = get_client()
@@ -340,6 +410,29 @@ class TestAsyncJobs(TestCase):
             delay_environ_wrapper(res).get()
         self.assertNotEqual(ids[0], ids[1])
 
+    def test_environ_parts(self):
+        env = create_environ()
+        QueuedJob.objects.create(job_id=env["job_id"])
+        env["tests"] = {str(i): {"name": str(i), "in_file": f"/tests/{i}.in"} for i in range(100)}
+        env["test_results"] = {}
+
+        SavedEnviron.save_environ(env).delete()
+        self.assertEqual(SavedEnvironPart.objects.count(), 1)
+
+        # Unchanged values are stored only once.
+        env["test_results"] = {str(i): {"result_code": "OK", "time_used": i} for i in range(100)}
+        saved_environ = SavedEnviron.save_environ(env)
+        self.assertEqual(SavedEnvironPart.objects.count(), 2)
+        self.assertEqual(saved_environ.load_environ(), json.loads(json.dumps(env)))
+        saved_environ.delete()
+
+        env["test_results"]["0"]["time_used"] = 1000
+        SavedEnviron.save_environ(env)
+        self.assertEqual(SavedEnvironPart.objects.count(), 2)
+
+        QueuedJob.objects.get(job_id=env["job_id"]).delete()
+        self.assertEqual(SavedEnvironPart.objects.count(), 0)
+
 
 def _call_transfer(environ):
     environ["magic"] = 1234
@@ -454,6 +547,85 @@ class TestViews(TestCase):
         self.assertContains(response, "Queued 1 submission(s) for rejudge.")
 
 
+class TestRejudgeBatch(TestCase):
+    fixtures = [
+        "test_users",
+        "test_contest",
+        "test_full_package",
+        "test_problem_instance",
+        "test_submission",
+    ]
+
+    def _create_batch(self, state):
+        submission = Submission.objects.get(pk=1)
+        batch = RejudgeBatch.objects.create(problem_instance=submission.problem_instance, state=state)
+        batch.items.create(submission=submission)
+        return batch
+
+    def test_pause_and_resume(self):
+        batch = self._create_batch("PAUSED")
+        dispatch_rejudge_batch(batch.id)
+        self.assertEqual(batch.items.get().state, "PENDING")
+
+        resume_rejudge_batch(batch)
+        batch.refresh_from_db()
+        self.assertEqual(batch.state, "FINISHED")
+        item = batch.items.get()
+        self.assertEqual(item.state, "DONE")
+        self.assertTrue(item.results_updated)
+
+        cancel_rejudge_batch(batch)
+        batch.refresh_from_db()
+        self.assertEqual(batch.state, "FINISHED")
+
+    def test_cancel(self):
+        batch = self._create_batch("PAUSED")
+        cancel_rejudge_batch(batch)
+        batch.refresh_from_db()
+        self.assertEqual(batch.state, "CANCELLED")
+        self.assertEqual(batch.items.get().state, "CANCELLED")
+
+        resume_rejudge_batch(batch)
+        self.assertEqual(batch.items.get().state, "CANCELLED")
+
+    def test_priority(self):
+        environ = {"contest_priority": settings.REJUDGE_BATCH_PRIORITY - 5}
+        prepare_rejudge_batch_environ(environ)
+        self.assertEqual(environ["contest_priority"], settings.REJUDGE_BATCH_PRIORITY - 6)
+        environ = {"contest_priority": settings.REJUDGE_BATCH_PRIORITY + 100}
+        prepare_rejudge_batch_environ(environ)
+        self.assertEqual(environ["contest_priority"], settings.REJUDGE_BATCH_PRIORITY + settings.OIOIOI_INSTANCE_PRIORITY_BONUS)
+
+    def test_reconcile_lost_jobs(self):
+        batch = self._create_batch("RUNNING")
+        batch.items.update(state="QUEUED")
+        call_command("reconcile_rejudge_batches", verbosity=0)
+        batch.refresh_from_db()
+        self.assertEqual(batch.state, "FINISHED")
+        self.assertEqual(batch.items.get().state, "CANCELLED")
+        self.assertEqual(reconcile_rejudge_batches(), 0)
+
+    def test_cancelled_job_dispatches_batch(self):
+        batch = self._create_batch("RUNNING")
+        batch.items.update(state="QUEUED")
+        QueuedJob.objects.create(job_id="job", submission_id=1, state="CANCELLED")
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.assertFalse(mark_job_state({"job_id": "job", "submission_id": 1, "extra_args": {"rejudge_batch_id": batch.id}}, "QUEUED"))
+        batch.refresh_from_db()
+        self.assertEqual(batch.state, "FINISHED")
+
+    def test_admin_view(self):
+        batch = self._create_batch("PAUSED")
+        self.assertTrue(self.client.login(username="test_admin"))
+        url = reverse("oioioiadmin:evalmgr_rejudgebatch_changelist")
+        response = self.client.get(url)
+        self.assertContains(response, "0 / 1")
+
+        post_data = {"action": "resume_batches", "_selected_action": [str(batch.pk)]}
+        response = self.client.post(url, post_data, follow=True)
+        self.assertContains(response, "1 / 1")
+
+
 class AddHandlersController(ProgrammingContestController):
     pass
 
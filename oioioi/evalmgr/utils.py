@@ -7,26 +7,69 @@ from oioioi.evalmgr.models import QueuedJob
 logger = logging.getLogger(__name__)
 
 
+def _job_dropped(environ):
+    # oioioi.evalmgr.rejudge queues jobs with oioioi.evalmgr.tasks, which
+    # imports this module.
+    from oioioi.evalmgr.rejudge import job_dropped
+
+    job_dropped(environ)
+
+
 @require_transaction
 def mark_job_state(environ, state, **kwargs):
     """Sets status of given environ in job queue. Additional arguments are
     used to update QueuedJob object. Returns True when the status was
     set, and the job should be continued, False when it ought to be
     ignored.
+
+    A job which is already queued is updated with a single conditional
+    ``UPDATE``, which skips cancelled jobs.
     """
-    if "submission_id" in environ:
-        submission = Submission.objects.filter(id=environ["submission_id"])
-        if submission.exists():
-            kwargs["submission"] = submission.get()
-    kwargs["state"] = state
-    qj, created = QueuedJob.objects.get_or_create(job_id=environ["job_id"], defaults=kwargs)
+    job_id = environ["job_id"]
+    if QueuedJob.objects.filter(job_id=job_id).exclude(state="CANCELLED").update(state=state, **kwargs):
+        return True
+    if QueuedJob.objects.filter(job_id=job_id, state="CANCELLED").delete()[0]:
+        logger.info("Job %s cancelled.", str(job_id))
+        _job_dropped(environ)
+        return False
+    defaults = dict(kwargs, state=state)
+    if "submission_id" in environ and Submission.objects.filter(id=environ["submission_id"]).exists():
+        defaults.setdefault("submission_id", environ["submission_id"])
+    _qj, created = QueuedJob.objects.get_or_create(job_id=job_id, defaults=defaults)
     if not created:
-        if qj.state == "CANCELLED":
-            qj.delete()
-            logger.info("Job %s cancelled.", str(environ["job_id"]))
-            return False
-        else:
-            for k, v in kwargs.items():
-                setattr(qj, k, v)
-            qj.save()
+        # Someone else has just created the job.
+        return mark_job_state(environ, state, **kwargs)
     return True
+
+
+@require_transaction
+def mark_jobs_state(environs, state):
+    """Like :func:`mark_job_state`, but for many environs at once, with
+    a constant number of queries. Returns the list of environs which
+    should be continued.
+    """
+    job_ids = [environ["job_id"] for environ in environs]
+    states = dict(QueuedJob.objects.select_for_update().filter(job_id__in=job_ids).values_list("job_id", "state"))
+    cancelled = {job_id for job_id, job_state in states.items() if job_state == "CANCELLED"}
+    if cancelled:
+        QueuedJob.objects.filter(job_id__in=cancelled).delete()
+        logger.info("Jobs %s cancelled.", ", ".join(sorted(cancelled)))
+        for environ in environs:
+            if environ["job_id"] in cancelled:
+                _job_dropped(environ)
+    QueuedJob.objects.filter(job_id__in=states.keys() - cancelled).exclude(state="CANCELLED").update(state=state)
+
+    new = [environ for environ in environs if environ["job_id"] not in states]
+    submission_ids = set(
+        Submission.objects.filter(id__in=[environ["submission_id"] for environ in new if "submission_id" in environ]).values_list("id", flat=True)
+    )
+    QueuedJob.objects.bulk_create(
+        [
+            QueuedJob(
+                job_id=environ["job_id"], state=state, submission_id=environ.get("submission_id") if environ.get("submission_id") in submission_ids else None
+            )
+            for environ in new
+        ],
+        ignore_conflicts=True,
+    )
+    return [environ for environ in environs if environ["job_id"] not in cancelled]
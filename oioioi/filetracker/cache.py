@@ -0,0 +1,284 @@
+"""Read-through cache of Filetracker files for web processes.
+
+Files are cached by their versioned names. A version of a file never
+changes, so cached files need no invalidation, other than removing the
+ones deleted by the process itself.
+
+There are two tiers: an in-memory LRU cache for small, frequently read
+files (e.g. statements and zip indexes), of total size at most
+``FILETRACKER_READ_CACHE_MEMORY_SIZE`` bytes, and a directory
+``FILETRACKER_READ_CACHE_DIR`` with at most
+``FILETRACKER_READ_CACHE_DISK_SIZE`` bytes of files, shared by all the
+processes of the machine. Setting a size to 0 disables the tier.
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+from filetracker.utils import split_name, versioned_name
+from oioioi.base.utils import memoized, reset_memoized
+
+_CHUNK_SIZE = 1 << 16
+
+
+def _read_at_most(reader, size):
+    chunks = []
+    while size > 0:
+        chunk = reader.read(min(size, _CHUNK_SIZE))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _spool(prefix, reader):
+    file = tempfile.SpooledTemporaryFile(max_size=_CHUNK_SIZE)
+    try:
+        file.write(prefix)
+        shutil.copyfileobj(reader, file, _CHUNK_SIZE)
+    finally:
+        reader.close()
+    file.seek(0)
+    return file
+
+
+class _PrefixedReader:
+    """A file-like object reading ``prefix`` and then from ``reader``."""
+
+    def __init__(self, prefix, reader):
+        self.prefix = prefix
+        self.reader = reader
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.reader.read(size)
+        if size is None or size < 0:
+            data, self.prefix = self.prefix + self.reader.read(), b""
+        else:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+        return data
+
+    def close(self):
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReadCache:
+    def __init__(self, memory_size=0, memory_max_file_size=0, disk_dir=None, disk_size=0):
+        self.memory_size = memory_size
+        self.memory_max_file_size = min(memory_max_file_size, memory_size)
+        self.disk_dir = disk_dir if disk_size else None
+        self.disk_size = disk_size
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.disk_used = None
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @property
+    def enabled(self):
+        return bool(self.memory_max_file_size or self.disk_dir)
+
+    def stats(self):
+        """Returns the hit and miss counters of the cache in this process."""
+        with self.lock:
+            return dict(self.counters, memory_used=self.memory_used, memory_files=len(self.memory))
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _disk_path(self, name, version):
+        return os.path.join(self.disk_dir, hashlib.sha256(name.encode("utf-8")).hexdigest(), str(version))
+
+    def _get_from_memory(self, key):
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+            return data
+
+    def _put_in_memory(self, key, data):
+        if len(data) > self.memory_max_file_size:
+            return
+        with self.lock:
+            if key in self.memory:
+                return
+            self.memory[key] = data
+            self.memory_used += len(data)
+            while self.memory_used > self.memory_size:
+                _key, evicted = self.memory.popitem(last=False)
+                self.memory_used -= len(evicted)
+
+    def _get_from_disk(self, name, version):
+        path = self._disk_path(name, version)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        # The modification time is used to find the least recently used
+        # files.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return file
+
+    def _put_on_disk(self, name, version, stream):
+        path = self._disk_path(name, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+            try:
+                shutil.copyfileobj(stream, f, _CHUNK_SIZE)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+        # Opened before the file may be removed to make room for it.
+        file = open(path, "rb")
+        self._disk_added(os.fstat(file.fileno()).st_size)
+        return file
+
+    def _disk_added(self, size):
+        with self.lock:
+            if self.disk_used is None:
+                self.disk_used = sum(entry[2] for entry in self._disk_entries())
+            else:
+                self.disk_used += size
+            if self.disk_used <= self.disk_size:
+                return
+            # Removes the least recently used files, down to 90% of the
+            # limit, so that it doesn't have to be done after every file.
+            entries = sorted(self._disk_entries(), key=lambda entry: entry[1])
+            self.disk_used = sum(entry[2] for entry in entries)
+            for path, _mtime, size in entries:
+                if self.disk_used <= self.disk_size * 0.9:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                self.disk_used -= size
+
+    def _disk_entries(self):
+        for dir_entry in os.scandir(self.disk_dir):
+            if not dir_entry.is_dir():
+                continue
+            for entry in os.scandir(dir_entry.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, stat.st_mtime, stat.st_size
+
+    def open(self, client, path, seekable=False):
+        """Returns a file-like object with the contents of the Filetracker
+        file ``path``, from the cache if possible.
+
+        The version of an unversioned ``path`` is asked for first.
+        Files too large to be cached are streamed unless ``seekable``
+        is set, in which case they are spooled to a temporary file.
+        """
+        name, version = split_name(path)
+        if version is None:
+            version = client.file_version(path)
+        key = versioned_name(name, version)
+
+        data = self._get_from_memory(key)
+        if data is not None:
+            self._count("memory_hits")
+            return io.BytesIO(data)
+        if self.disk_dir:
+            file = self._get_from_disk(name, version)
+            if file is not None:
+                self._count("disk_hits")
+                if os.fstat(file.fileno()).st_size <= self.memory_max_file_size:
+                    data = file.read()
+                    file.close()
+                    self._put_in_memory(key, data)
+                    return io.BytesIO(data)
+                return file
+
+        self._count("misses")
+        reader, vname = client.get_stream(key)
+        name, version = split_name(vname)
+        if self.disk_dir:
+            try:
+                file = self._put_on_disk(name, version, reader)
+            finally:
+                reader.close()
+            if os.fstat(file.fileno()).st_size > self.memory_max_file_size:
+                return file
+            with file:
+                data = file.read()
+        else:
+            data = _read_at_most(reader, self.memory_max_file_size + 1)
+            if len(data) > self.memory_max_file_size:
+                if not seekable:
+                    return _PrefixedReader(data, reader)
+                return _spool(data, reader)
+            reader.close()
+        self._put_in_memory(vname, data)
+        return io.BytesIO(data)
+
+    def size(self, path):
+        """Returns the size of a versioned ``path`` if it's cached,
+        None otherwise.
+        """
+        name, version = split_name(path)
+        if version is None:
+            return None
+        data = self._get_from_memory(path)
+        if data is not None:
+            return len(data)
+        if self.disk_dir:
+            try:
+                return os.path.getsize(self._disk_path(name, version))
+            except FileNotFoundError:
+                pass
+        return None
+
+    def remove(self, path):
+        """Removes all the cached versions of the file ``path``."""
+        name, _version = split_name(path)
+        with self.lock:
+            for key in [key for key in self.memory if split_name(key)[0] == name]:
+                self.memory_used -= len(self.memory.pop(key))
+        if self.disk_dir:
+            shutil.rmtree(os.path.dirname(self._disk_path(name, 0)), ignore_errors=True)
+            with self.lock:
+                self.disk_used = None
+
+
+@memoized
+def get_read_cache():
+    """Returns the read-through cache of this process, configured with
+    the ``FILETRACKER_READ_CACHE_*`` settings.
+    """
+    return ReadCache(
+        memory_size=settings.FILETRACKER_READ_CACHE_MEMORY_SIZE,
+        memory_max_file_size=settings.FILETRACKER_READ_CACHE_MEMORY_MAX_FILE_SIZE,
+        disk_dir=settings.FILETRACKER_READ_CACHE_DIR,
+        disk_size=settings.FILETRACKER_READ_CACHE_DISK_SIZE,
+    )
+
+
+@receiver(setting_changed)
+def _on_setting_changed(sender, setting, **kwargs):
+    if setting.startswith("FILETRACKER_READ_CACHE_"):
+        reset_memoized(get_read_cache)
@@ -1,8 +1,14 @@
 import datetime
-import itertools
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+from django.apps import apps
 from django.core.management.base import BaseCommand
-from django.db.models.loading import cache
+from django.db import models
+from django.db.models import Q
 from django.utils.translation import gettext as _
 from django.utils.translation import ngettext
 
@@ -10,6 +16,55 @@ from filetracker.utils import split_name
 from oioioi.filetracker.client import get_client
 
 
+def _components(name):
+    return name.split("/")
+
+
+class GarbageCollectionState:
+    """State of a garbage collection, kept in an SQLite database, so that
+    an interrupted collection can be resumed.
+
+    It holds the set of Filetracker files referenced by the database (the
+    "needed" files), which may be much larger than the memory, and how far
+    the building of this set and the deletion have got.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS needed (name TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.db.execute("CREATE TABLE IF NOT EXISTS progress (key TEXT PRIMARY KEY, value) WITHOUT ROWID")
+        self.db.commit()
+
+    def get(self, key, default=None):
+        row = self.db.execute("SELECT value FROM progress WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO progress VALUES (?, ?)", (key, value))
+
+    def add_needed(self, names):
+        self.db.executemany("INSERT OR IGNORE INTO needed VALUES (?)", ((name,) for name in names))
+
+    def filter_needed(self, names):
+        needed = set()
+        names = list(names)
+        # SQLite limits the number of parameters of a query.
+        for i in range(0, len(names), 500):
+            chunk = names[i : i + 500]
+            query = "SELECT name FROM needed WHERE name IN ({})".format(", ".join("?" * len(chunk)))
+            needed.update(row[0] for row in self.db.execute(query, chunk))
+        return needed
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self, remove=False):
+        self.db.close()
+        if remove:
+            os.unlink(self.path)
+
+
 class Command(BaseCommand):
     help = _("Delete all orphaned files older than specified number of days.")
 
@@ -32,64 +87,206 @@ class Command(BaseCommand):
             default=False,
             help=_("If set, the orphaned files will only be displayed, not deleted."),
         )
+        parser.add_argument(
+            "--state",
+            action="store",
+            dest="state",
+            default=os.path.join(tempfile.gettempdir(), "oioioi-collectgarbage.sqlite3"),
+            help=_("File keeping the state of the collection, which is resumed if it is interrupted."),
+        )
+        parser.add_argument(
+            "--max-state-age",
+            action="store",
+            type=float,
+            dest="max_state_age",
+            default=24,
+            help=_("A collection interrupted more than this many hours ago is started from scratch. Default value is 24."),
+        )
+        parser.add_argument(
+            "--batch-size",
+            action="store",
+            type=int,
+            dest="batch_size",
+            default=1000,
+            help=_("Number of database rows or files handled at once. Default value is 1000."),
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            action="store",
+            type=int,
+            dest="jobs",
+            default=4,
+            help=_("Number of files deleted in parallel. Default value is 4."),
+        )
+        parser.add_argument(
+            "--max-rate",
+            action="store",
+            type=float,
+            dest="max_rate",
+            default=None,
+            help=_("Maximum number of files deleted per second."),
+        )
+
+    def _file_fields(self):
+        for model in apps.get_models():
+            if model._meta.proxy:
+                continue
+            fields = [field for field in model._meta.fields if isinstance(field, models.FileField) and hasattr(field.storage, "_make_filetracker_path")]
+            if fields:
+                yield model, fields
 
-    def _get_needed_files(self):
-        result = []
-        for app in cache.get_apps():
-            model_list = cache.get_models(app)
-            for model in model_list:
-                file_fields = [field.name for field in model._meta.fields if field.get_internal_type() == "FileField"]
+    def _collect_needed_files(self, state, batch_size):
+        """Adds names of the files referenced by the database to the state,
+        model by model, in batches ordered by primary key.
+        """
+        for model, fields in self._file_fields():
+            label = model._meta.label
+            if state.get("done:" + label):
+                continue
+            last_pk = state.get("last_pk:" + label)
+            queryset = model._default_manager.order_by("pk").values_list("pk", *[field.attname for field in fields])
+            while True:
+                batch = list((queryset.filter(pk__gt=last_pk) if last_pk is not None else queryset)[:batch_size])
+                if not batch:
+                    break
+                names = []
+                for row in batch:
+                    for field, value in zip(fields, row[1:], strict=True):
+                        if not value:
+                            continue
+                        try:
+                            names.append(split_name(field.storage._make_filetracker_path(value))[0])
+                        except ValueError:
+                            continue
+                state.add_needed(names)
+                last_pk = batch[-1][0]
+                state.set("last_pk:" + label, last_pk)
+                state.commit()
+            state.set("done:" + label, True)
+            state.commit()
 
-                if len(file_fields) > 0:
-                    files = model.objects.all().values_list(*file_fields)
-                    result.extend([split_name(file)[0] for file in itertools.chain.from_iterable(files) if file])
-        return result
+    def _referenced_files(self, file_fields, names):
+        """Returns the files among ``names`` which are referenced by the
+        database now.
+
+        The needed files are collected before any file is deleted, so files
+        which became referenced since then are found this way.
+        """
+        referenced = set()
+        for model, fields in file_fields:
+            for field in fields:
+                prefix = field.storage.prefix
+                django_names = [field.storage._cut_prefix(name) for name in names if name.startswith(prefix)]
+                # SQL queries shouldn't get too long.
+                for i in range(0, len(django_names), 100):
+                    query = Q()
+                    for name in django_names[i : i + 100]:
+                        query |= Q(**{field.attname: name}) | Q(**{field.attname + "__startswith": name + "@"})
+                    for value in model._default_manager.filter(query).values_list(field.attname, flat=True):
+                        referenced.add(split_name(field.storage._make_filetracker_path(value))[0])
+        return referenced
+
+    def _iter_files(self, client, after=None):
+        """Yields unversioned names and modification times of the local
+        Filetracker files, ordered by the components of their paths,
+        starting after the file ``after``.
+        """
+        after = _components(after) if after is not None else None
+        store = client.local_store
+        if store is None:
+            return
+        if not hasattr(store, "dir"):
+            entries = [(split_name(entry.name)[0], entry.mtime) for entry in store.list_files()]
+            for name, mtime in sorted(entries, key=lambda entry: _components(entry[0])):
+                if after is None or _components(name) > after:
+                    yield name, mtime
+            return
+
+        def walk(path, components):
+            try:
+                entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+            except FileNotFoundError:
+                return
+            for entry in entries:
+                entry_components = components + [entry.name]
+                if after is not None and entry_components < after[: len(entry_components)]:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    yield from walk(entry.path, entry_components)
+                elif after is None or entry_components > after:
+                    try:
+                        mtime = entry.stat(follow_symlinks=False).st_mtime
+                    except FileNotFoundError:
+                        continue
+                    yield "/".join(entry_components), mtime
+
+        yield from walk(store.dir, [""])
+
+    def _batches(self, iterable, size):
+        batch = []
+        for item in iterable:
+            batch.append(item)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
     def handle(self, *args, **options):
-        needed_files = self._get_needed_files()
-        all_files = get_client().list_local_files()
-        max_date_to_delete = datetime.datetime.now() - datetime.timedelta(days=options["days"])
-
-        diff = {f[0] for f in all_files} - set(needed_files)
-        to_delete = [f[0] for f in all_files if f[0] in diff and datetime.datetime.fromtimestamp(f[1]) < max_date_to_delete]
-
-        files_count = len(to_delete)
-        if files_count == 0 and int(options["verbosity"]) > 0:
-            print(_("No files to delete."))
-        elif options["pretend"]:
-            if int(options["verbosity"]) > 1:
-                print(
-                    ngettext(
-                        "The following %d file is scheduled for deletion:",
-                        "The following %d files are scheduled for deletion:",
-                        files_count,
-                    )
-                    % files_count
-                )
-                for file in to_delete:
-                    print(" ", file)
-            elif int(options["verbosity"]) == 1:
-                print(
-                    ngettext(
-                        "%d file scheduled for deletion.",
-                        "%d files scheduled for deletion.",
-                        files_count,
-                    )
-                    % files_count
-                )
-        else:
-            if int(options["verbosity"]) > 1:
-                print(
-                    ngettext(
-                        "Deleting the following %d file:",
-                        "Deleting the following %d files:",
-                        files_count,
-                    )
-                    % files_count
-                )
-            if int(options["verbosity"]) == 1:
-                print(ngettext("Deleting %d file", "Deleting %d files", files_count) % files_count)
-            for file in to_delete:
-                if int(options["verbosity"]) > 1:
-                    print(" ", file)
-                get_client().delete_file("/" + file)
+        verbosity = int(options["verbosity"])
+        client = get_client()
+
+        state = GarbageCollectionState(options["state"])
+        started = state.get("started")
+        # A collection which only pretended to delete files can't be
+        # resumed by one which deletes them, and vice versa.
+        if started is not None and (time.time() - started > options["max_state_age"] * 3600 or bool(state.get("pretend")) != options["pretend"]):
+            state.close(remove=True)
+            state = GarbageCollectionState(options["state"])
+            started = None
+        if started is None:
+            state.set("started", time.time())
+            state.set("pretend", options["pretend"])
+            state.set("max_mtime", (datetime.datetime.now() - datetime.timedelta(days=options["days"])).timestamp())
+            state.commit()
+        elif verbosity > 0:
+            self.stdout.write(_("Resuming an interrupted collection."))
+
+        self._collect_needed_files(state, options["batch_size"])
+        file_fields = list(self._file_fields())
+
+        max_mtime = state.get("max_mtime")
+        files_count = state.get("deleted", 0)
+        start_time = time.monotonic()
+        deleted_now = 0
+        with ThreadPoolExecutor(max_workers=options["jobs"]) as executor:
+            for batch in self._batches(self._iter_files(client, state.get("last_file")), options["batch_size"]):
+                candidates = [name for name, mtime in batch if mtime < max_mtime]
+                needed = state.filter_needed(candidates)
+                to_delete = [name for name in candidates if name not in needed]
+                referenced = self._referenced_files(file_fields, to_delete)
+                to_delete = [name for name in to_delete if name not in referenced]
+                if verbosity > 1:
+                    for name in to_delete:
+                        self.stdout.write("  " + name)
+                if not options["pretend"]:
+                    list(executor.map(client.delete_file, to_delete))
+                files_count += len(to_delete)
+                deleted_now += len(to_delete)
+                state.set("last_file", batch[-1][0])
+                state.set("deleted", files_count)
+                state.commit()
+                if options["max_rate"] and not options["pretend"]:
+                    time.sleep(max(0, deleted_now / options["max_rate"] - (time.monotonic() - start_time)))
+        state.close(remove=True)
+
+        if files_count == 0:
+            if verbosity > 0:
+                self.stdout.write(_("No files to delete."))
+        elif verbosity > 0:
+            if options["pretend"]:
+                message = ngettext("%d file scheduled for deletion.", "%d files scheduled for deletion.", files_count)
+            else:
+                message = ngettext("%d file deleted.", "%d files deleted.", files_count)
+            self.stdout.write(message % files_count)
@@ -10,6 +10,7 @@ from django.core.files.storage import Storage
 from django.urls import reverse
 from django.utils import timezone
 
+from oioioi.filetracker.cache import get_read_cache
 from oioioi.filetracker.client import get_client
 from oioioi.filetracker.filename import FiletrackerFilename
 from oioioi.filetracker.utils import FileInFiletracker
@@ -42,6 +43,10 @@ class FiletrackerStorage(Storage):
         if "w" in mode or "+" in mode or "a" in mode:
             raise ValueError("FiletrackerStorage.open does not support writing. Use FiletrackerStorage.save.")
         path = self._make_filetracker_path(name)
+        read_cache = get_read_cache()
+        if read_cache.enabled:
+            # Callers such as zipfile need to seek in the returned file.
+            return File(read_cache.open(self.client, path, seekable=True), FiletrackerFilename(name))
         reader, _version = self.client.get_stream(path)
         return File(reader, FiletrackerFilename(name))
 
@@ -73,6 +78,10 @@ class FiletrackerStorage(Storage):
     def read_using_cache(self, name):
         """Opens a file using a cache (if it's possible)"""
         path = self._make_filetracker_path(name)
+        read_cache = get_read_cache()
+        if read_cache.enabled:
+            # Callers such as zipfile need to seek in the returned file.
+            return File(read_cache.open(self.client, path, seekable=True), FiletrackerFilename(name))
         reader, _version = self.client.get_stream(path, serve_from_cache=True)
         return File(reader, FiletrackerFilename(name))
 
@@ -95,6 +104,7 @@ class FiletrackerStorage(Storage):
     def delete(self, name):
         path = self._make_filetracker_path(name)
         self.client.delete_file(path)
+        get_read_cache().remove(path)
 
     def exists(self, name):
         path = self._make_filetracker_path(name)
@@ -107,6 +117,9 @@ class FiletrackerStorage(Storage):
 
     def size(self, name):
         path = self._make_filetracker_path(name)
+        size = get_read_cache().size(path)
+        if size is not None:
+            return size
         return self.client.file_size(path)
 
     def modified_time(self, name):
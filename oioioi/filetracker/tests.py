@@ -1,16 +1,25 @@
 import datetime
+import os
 import shutil
 import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch
 
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.core.management import call_command
 from django.db.models.fields.files import FieldFile, FileField
+from django.test.utils import override_settings
 from django.urls import reverse
 from django.utils import timezone
 from filetracker.client.dummy import DummyClient
 
 from filetracker.client import Client as FiletrackerClient
+from filetracker.utils import split_name
 from oioioi.base.tests import TestCase
+from oioioi.filetracker.cache import get_read_cache
+from oioioi.filetracker.management.commands.collectgarbage import GarbageCollectionState
 from oioioi.filetracker.models import FileTestModel
 from oioioi.filetracker.storage import FiletrackerStorage
 from oioioi.filetracker.utils import (
@@ -116,6 +125,138 @@ class TestFileStorage(TestCase):
             shutil.rmtree(dir)
 
 
+class TestReadCache(TestCase):
+    def setUp(self):
+        self.client = DummyClient()
+        self.storage = FiletrackerStorage(client=self.client)
+        self.name = self.storage.save("statement.html", ContentFile(b"<html/>"))
+
+    def _open(self, name):
+        with self.storage.open(name, "rb") as f:
+            return f.read()
+
+    @override_settings(FILETRACKER_READ_CACHE_MEMORY_SIZE=1024, FILETRACKER_READ_CACHE_MEMORY_MAX_FILE_SIZE=16)
+    def test_memory_cache(self):
+        self.assertEqual(self._open(self.name), b"<html/>")
+        self.assertEqual(self._open(self.name), b"<html/>")
+        self.assertEqual(get_read_cache().stats()["memory_hits"], 1)
+        self.assertEqual(get_read_cache().stats()["misses"], 1)
+
+        # Too large to be cached.
+        large_name = self.storage.save("large.html", ContentFile(b"x" * 100))
+        self.assertEqual(self._open(large_name), b"x" * 100)
+        self.assertEqual(self._open(large_name), b"x" * 100)
+        self.assertEqual(get_read_cache().stats()["misses"], 3)
+        with self.storage.read_using_cache(large_name) as f:
+            f.seek(50)
+            self.assertEqual(f.read(), b"x" * 50)
+
+        self.assertEqual(get_read_cache().stats()["memory_files"], 1)
+        self.storage.delete(self.name)
+        self.assertEqual(get_read_cache().stats()["memory_files"], 0)
+
+    def test_disk_cache(self):
+        dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dir)
+        with override_settings(FILETRACKER_READ_CACHE_DIR=dir, FILETRACKER_READ_CACHE_DISK_SIZE=100):
+            self.assertEqual(self._open(self.name), b"<html/>")
+            self.assertEqual(self._open(self.name), b"<html/>")
+            self.assertEqual(get_read_cache().stats()["disk_hits"], 1)
+            self.assertEqual(self.storage.size(self.name), 7)
+
+            # The least recently used file is removed.
+            os.utime(get_read_cache()._disk_path(*split_name("/" + self.name.versioned_name)), (0, 0))
+            large_name = self.storage.save("large.html", ContentFile(b"x" * 95))
+            self.assertEqual(self._open(large_name), b"x" * 95)
+            self.assertIsNone(get_read_cache().size("/" + self.name.versioned_name))
+            self.assertEqual(self._open(self.name), b"<html/>")
+            self.assertEqual(get_read_cache().stats()["misses"], 3)
+
+
+class TestCollectGarbage(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.client = FiletrackerClient(cache_dir=self.dir, remote_store=None)
+        old = time.time() - 40 * 24 * 3600
+        self.versioned_names = {}
+        for name in ("tests/needed.in", "tests/orphan.in", "eval/a/orphan.out", "eval/b/orphan.out", "eval/new.out"):
+            with tempfile.NamedTemporaryFile() as f:
+                f.write(name.encode())
+                f.flush()
+                vname = self.client.put_file("/" + name, f.name)
+                self.versioned_names[name] = vname
+            if name == "tests/needed.in":
+                FileTestModel.objects.create(file_field=vname[1:])
+            if name != "eval/new.out":
+                os.utime(os.path.join(self.dir, "files", name), (old, old))
+
+    def _exists(self, name):
+        return os.path.exists(os.path.join(self.dir, "files", name))
+
+    def test_collectgarbage(self):
+        state = os.path.join(self.dir, "state.sqlite3")
+        delete_file = self.client.delete_file
+        deleted = []
+
+        def interrupted_delete_file(name):
+            if len(deleted) == 2:
+                raise KeyboardInterrupt
+            deleted.append(name)
+            delete_file(name)
+
+        with patch("oioioi.filetracker.management.commands.collectgarbage.get_client", return_value=self.client):
+            call_command("collectgarbage", "--pretend", "--state", state, stdout=StringIO())
+            self.assertTrue(self._exists("tests/orphan.in"))
+
+            with patch.object(self.client, "delete_file", interrupted_delete_file), self.assertRaises(KeyboardInterrupt):
+                call_command("collectgarbage", "--state", state, "--batch-size", "1", "--jobs", "1", stdout=StringIO())
+            self.assertEqual(deleted, ["/eval/a/orphan.out", "/eval/b/orphan.out"])
+
+            out = StringIO()
+            call_command("collectgarbage", "--state", state, "--batch-size", "1", stdout=out)
+            self.assertIn("3 files deleted", out.getvalue())
+
+        self.assertFalse(self._exists("tests/orphan.in"))
+        self.assertTrue(self._exists("tests/needed.in"))
+        self.assertTrue(self._exists("eval/new.out"))
+        self.assertFalse(os.path.exists(state))
+
+    def test_collectgarbage_rechecks_database(self):
+        state = os.path.join(self.dir, "state.sqlite3")
+        delete_file = self.client.delete_file
+
+        def interrupted_delete_file(name):
+            if name == "/tests/orphan.in":
+                raise KeyboardInterrupt
+            delete_file(name)
+
+        with patch("oioioi.filetracker.management.commands.collectgarbage.get_client", return_value=self.client):
+            with patch.object(self.client, "delete_file", interrupted_delete_file), self.assertRaises(KeyboardInterrupt):
+                call_command("collectgarbage", "--state", state, "--batch-size", "1", "--jobs", "1", stdout=StringIO())
+            # Referenced after the needed files were collected.
+            FileTestModel.objects.create(file_field=self.versioned_names["tests/orphan.in"][1:])
+
+            out = StringIO()
+            call_command("collectgarbage", "--state", state, "--batch-size", "1", stdout=out)
+            self.assertIn("2 files deleted", out.getvalue())
+        self.assertTrue(self._exists("tests/orphan.in"))
+
+    def test_collectgarbage_after_pretend(self):
+        state = os.path.join(self.dir, "state.sqlite3")
+        with patch("oioioi.filetracker.management.commands.collectgarbage.get_client", return_value=self.client):
+            # An interrupted pretended collection is not resumed.
+            with patch.object(GarbageCollectionState, "filter_needed", side_effect=KeyboardInterrupt), self.assertRaises(KeyboardInterrupt):
+                call_command("collectgarbage", "--pretend", "--state", state, stdout=StringIO())
+            self.assertTrue(os.path.exists(state))
+
+            out = StringIO()
+            call_command("collectgarbage", "--state", state, stdout=out)
+            self.assertNotIn("Resuming", out.getvalue())
+            self.assertIn("3 files deleted", out.getvalue())
+        self.assertFalse(self._exists("tests/orphan.in"))
+
+
 class TestStreamingMixin:
     def assertStreamingEqual(self, response, content):
         self.assertEqual(self.streamingContent(response), content)
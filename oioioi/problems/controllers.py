@@ -21,8 +21,10 @@ from oioioi.contests.models import (
     Submission,
     SubmissionReport,
     UserResultForProblem,
+    get_or_create_user_results_for_update,
 )
 from oioioi.contests.scores import IntegerScore
+from oioioi.evalmgr.rejudge import prepare_rejudge_batch_environ
 from oioioi.evalmgr.tasks import create_environ, delay_environ
 from oioioi.problems.models import ProblemStatistics, UserStatistics
 from oioioi.problems.utils import can_admin_problem, get_basic_user_submissions_count
@@ -141,6 +143,7 @@ class ProblemController(RegisteredSubclassesBase, ObjectWithMixins):
         environ = create_environ()
         environ["extra_args"] = extra_args or {}
         environ["is_rejudge"] = is_rejudge
+        environ["problem_controller"] = submission.problem_instance.problem.controller_name
         if hasattr(submission, "programsubmission"):
             user_lang = None
             for code, lang in settings.LANGUAGES:
@@ -221,6 +224,9 @@ class ProblemController(RegisteredSubclassesBase, ObjectWithMixins):
             ),
         )
 
+        if "rejudge_batch_id" in environ["extra_args"]:
+            prepare_rejudge_batch_environ(environ)
+
         evalmgr_extra_args = environ.get("evalmgr_extra_args", {})
         logger.debug(
             "Judging submission #%d with environ:\n %s",
@@ -451,6 +457,19 @@ class ProblemController(RegisteredSubclassesBase, ObjectWithMixins):
             problem_instance.controller.update_user_result_for_problem(result)
             result.save()
 
+    def bulk_update_user_results(self, user_problem_instance_pairs):
+        """Bulk version of :meth:`update_user_results`, taking an iterable of
+        ``(user, problem_instance)`` pairs.
+
+        All the results are updated in a single transaction and saved with
+        one query.
+        """
+        with transaction.atomic():
+            results = get_or_create_user_results_for_update(UserResultForProblem, "problem_instance", user_problem_instance_pairs)
+            for result in results:
+                result.problem_instance.controller.update_user_result_for_problem(result)
+            UserResultForProblem.objects.bulk_update(results, ["score", "status", "submission_report"])
+
     def validate_submission_form(self, request, problem_instance, form, cleaned_data):
         return cleaned_data
 
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.translation import gettext as _
+from django.utils.translation import ngettext
+
+from oioioi.problems.models import Problem, update_problem_search_index
+
+
+class Command(BaseCommand):
+    help = _(
+        "Rebuilds the search index of the Problemset for every problem. "
+        "It has to be run after loading problems or their tags with "
+        "loaddata, as tags of problems loaded this way are not indexed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            action="store",
+            type=int,
+            dest="batch_size",
+            default=1000,
+            help=_("Number of problems indexed at once. Default value is 1000."),
+        )
+
+    def handle(self, *args, **options):
+        problem_ids = list(Problem.objects.order_by("pk").values_list("pk", flat=True))
+        batch_size = options["batch_size"]
+        for i in range(0, len(problem_ids), batch_size):
+            with transaction.atomic():
+                update_problem_search_index(problem_ids[i : i + batch_size], create=True)
+        if int(options["verbosity"]) > 0:
+            self.stdout.write(ngettext("Indexed %d problem.", "Indexed %d problems.", len(problem_ids)) % len(problem_ids))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0039_alter_algorithmtagproposal_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problempackage',
+            name='stage_timings',
+            field=models.JSONField(blank=True, null=True, verbose_name='stage timings'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0040_problempackage_stage_timings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProblemSearchIndex',
+            fields=[
+                ('problem', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='problems.problem')),
+                ('text', models.TextField(blank=True)),
+                ('names', models.JSONField(default=dict)),
+                ('algorithm_tags', models.TextField(blank=True)),
+                ('difficulty_tags', models.TextField(blank=True)),
+                ('origin_tags', models.TextField(blank=True)),
+            ],
+        ),
+    ]
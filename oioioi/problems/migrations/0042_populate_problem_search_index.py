@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def _tags_text(names):
+    return " {} ".format(" ".join(sorted(names))) if names else ""
+
+
+def populate_problem_search_index(apps, schema_editor):
+    Problem = apps.get_model('problems', 'Problem')
+    ProblemName = apps.get_model('problems', 'ProblemName')
+    ProblemSearchIndex = apps.get_model('problems', 'ProblemSearchIndex')
+    AlgorithmTagThrough = apps.get_model('problems', 'AlgorithmTagThrough')
+    DifficultyTagThrough = apps.get_model('problems', 'DifficultyTagThrough')
+    OriginTag = apps.get_model('problems', 'OriginTag')
+    OriginInfoValue = apps.get_model('problems', 'OriginInfoValue')
+
+    names = defaultdict(dict)
+    for problem_id, language, name in ProblemName.objects.values_list('problem_id', 'language', 'name'):
+        names[problem_id][language] = name
+    tags = defaultdict(lambda: defaultdict(list))
+    for field, queryset in (
+        ('algorithm_tags', AlgorithmTagThrough.objects.values_list('problem_id', 'tag__name')),
+        ('difficulty_tags', DifficultyTagThrough.objects.values_list('problem_id', 'tag__name')),
+        ('origin_tags', OriginTag.problems.through.objects.values_list('problem_id', 'origintag__name')),
+    ):
+        for problem_id, name in queryset:
+            tags[problem_id][field].append(name)
+    info_values = OriginInfoValue.problems.through.objects.values_list(
+        'problem_id', 'origininfovalue__parent_tag__name', 'origininfovalue__value'
+    )
+    for problem_id, tag_name, value in info_values:
+        tags[problem_id]['origin_tags'].append(f'{tag_name}_{value}')
+
+    ProblemSearchIndex.objects.all().delete()
+    ProblemSearchIndex.objects.bulk_create(
+        [
+            ProblemSearchIndex(
+                problem_id=pk,
+                text='\n'.join([legacy_name, short_name, *names[pk].values()]),
+                names=names[pk],
+                algorithm_tags=_tags_text(tags[pk]['algorithm_tags']),
+                difficulty_tags=_tags_text(tags[pk]['difficulty_tags']),
+                origin_tags=_tags_text(tags[pk]['origin_tags']),
+            )
+            for pk, legacy_name, short_name in Problem.objects.values_list('pk', 'legacy_name', 'short_name').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0041_problemsearchindex'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_problem_search_index, migrations.RunPython.noop),
+    ]
@@ -9,7 +9,7 @@ from django.core import validators
 from django.core.files.base import ContentFile
 from django.core.validators import validate_slug
 from django.db import models, transaction
-from django.db.models.signals import post_delete, post_save, pre_delete
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.encoding import force_str
@@ -325,6 +325,9 @@ class ProblemPackage(models.Model):
     )
     status = EnumField(package_statuses, default="?", verbose_name=_("status"))
     creation_date = models.DateTimeField(default=timezone.now, verbose_name=_("creation date"))
+    # Seconds spent in the stages of the last successful processing of
+    # the package, by stage name.
+    stage_timings = models.JSONField(null=True, blank=True, verbose_name=_("stage timings"))
 
     @property
     def download_name(self):
@@ -938,3 +941,123 @@ def decrease_aggregated_algorithm_tag_proposal(sender, instance, **kwargs):
 @receiver(post_delete, sender=DifficultyTagProposal)
 def decrease_aggregated_difficulty_tag_proposal(sender, instance, **kwargs):
     decrease_aggregated_tag_proposal(sender, instance, AggregatedDifficultyTagProposal, **kwargs)
+
+
+class ProblemSearchIndex(models.Model):
+    """Denormalized data of a problem used for searching and ordering
+    in the problemset, so that it doesn't need joins with names and tags.
+
+    ``text`` contains the names of the problem in all the languages, its
+    legacy name and its short name, one per line. The ``*_tags`` fields
+    contain names of the tags separated and surrounded by spaces, the
+    origin info values being named ``<origin tag>_<value>``.
+
+    It's kept up to date by signal handlers, see
+    :func:`update_problem_search_index`.
+    """
+
+    problem = models.OneToOneField(Problem, primary_key=True, related_name="search_index", on_delete=models.CASCADE)
+    text = models.TextField(blank=True)
+    names = models.JSONField(default=dict)
+    algorithm_tags = models.TextField(blank=True)
+    difficulty_tags = models.TextField(blank=True)
+    origin_tags = models.TextField(blank=True)
+
+
+def _tags_text(names):
+    return " {} ".format(" ".join(sorted(names))) if names else ""
+
+
+def update_problem_search_index(problem_ids, create=False):
+    """Recomputes the :class:`ProblemSearchIndex` entries of the given
+    problems. Missing entries are created only if ``create`` is set.
+    """
+    problem_ids = set(problem_ids)
+    if not problem_ids:
+        return
+    entries = {
+        pk: (ProblemSearchIndex(problem_id=pk, names={}), [legacy_name, short_name])
+        for pk, legacy_name, short_name in Problem.objects.filter(pk__in=problem_ids).values_list("pk", "legacy_name", "short_name")
+    }
+    if not entries:
+        return
+    tags = {pk: {"algorithm_tags": [], "difficulty_tags": [], "origin_tags": []} for pk in entries}
+
+    for problem_id, language, name in ProblemName.objects.filter(problem_id__in=entries).values_list("problem_id", "language", "name"):
+        entries[problem_id][0].names[language] = name
+        entries[problem_id][1].append(name)
+    for field, queryset in (
+        ("algorithm_tags", AlgorithmTagThrough.objects.values_list("problem_id", "tag__name")),
+        ("difficulty_tags", DifficultyTagThrough.objects.values_list("problem_id", "tag__name")),
+        ("origin_tags", OriginTag.problems.through.objects.values_list("problem_id", "origintag__name")),
+    ):
+        for problem_id, name in queryset.filter(problem_id__in=entries):
+            tags[problem_id][field].append(name)
+    info_values = OriginInfoValue.problems.through.objects.filter(problem_id__in=entries)
+    for problem_id, tag_name, value in info_values.values_list("problem_id", "origininfovalue__parent_tag__name", "origininfovalue__value"):
+        tags[problem_id]["origin_tags"].append(f"{tag_name}_{value}")
+
+    fields = ["text", "names", "algorithm_tags", "difficulty_tags", "origin_tags"]
+    for pk, (entry, texts) in entries.items():
+        entry.text = "\n".join(texts)
+        for field, names in tags[pk].items():
+            setattr(entry, field, _tags_text(names))
+    entries = [entry for entry, _texts in entries.values()]
+    if create:
+        ProblemSearchIndex.objects.bulk_create(entries, update_conflicts=True, unique_fields=["problem"], update_fields=fields)
+    else:
+        ProblemSearchIndex.objects.bulk_update(entries, fields)
+
+
+@receiver(post_save, sender=Problem)
+def _update_search_index_of_problem(sender, instance, **kwargs):
+    update_problem_search_index([instance.pk], create=True)
+
+
+@receiver(post_save, sender=ProblemName)
+@receiver(post_delete, sender=ProblemName)
+@receiver(post_save, sender=AlgorithmTagThrough)
+@receiver(post_delete, sender=AlgorithmTagThrough)
+@receiver(post_save, sender=DifficultyTagThrough)
+@receiver(post_delete, sender=DifficultyTagThrough)
+def _update_search_index_of_related_problem(sender, instance, **kwargs):
+    update_problem_search_index([instance.problem_id])
+
+
+@receiver(post_save, sender=AlgorithmTag)
+@receiver(post_save, sender=DifficultyTag)
+@receiver(post_save, sender=OriginTag)
+@receiver(post_save, sender=OriginInfoValue)
+def _update_search_index_of_tag_problems(sender, instance, created, **kwargs):
+    if not created:
+        update_problem_search_index(instance.problems.values_list("pk", flat=True))
+
+
+# Rows of automatically created through tables are deleted without
+# signals, so the problems of deleted origin tags are remembered before.
+@receiver(pre_delete, sender=OriginTag)
+@receiver(pre_delete, sender=OriginInfoValue)
+def _remember_problems_of_deleted_tag(sender, instance, **kwargs):
+    instance._search_index_problems = list(instance.problems.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=OriginTag)
+@receiver(post_delete, sender=OriginInfoValue)
+def _update_search_index_of_deleted_tag_problems(sender, instance, **kwargs):
+    update_problem_search_index(instance.__dict__.pop("_search_index_problems", []))
+
+
+@receiver(m2m_changed, sender=AlgorithmTag.problems.through)
+@receiver(m2m_changed, sender=DifficultyTag.problems.through)
+@receiver(m2m_changed, sender=OriginTag.problems.through)
+@receiver(m2m_changed, sender=OriginInfoValue.problems.through)
+def _update_search_index_of_tagged_problems(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            update_problem_search_index([instance.pk])
+    elif action == "pre_clear":
+        instance._search_index_cleared_problems = list(instance.problems.values_list("pk", flat=True))
+    elif action == "post_clear":
+        update_problem_search_index(instance.__dict__.pop("_search_index_cleared_problems", []))
+    elif action in ("post_add", "post_remove"):
+        update_problem_search_index(pk_set)
@@ -85,7 +85,7 @@ def problem_site_statement_zip_view(request, site_key, path):
     statement = query_statement(problem.id)
     if not statement:
         raise Http404
-    return query_zip(statement, path)
+    return query_zip(statement, path, request)
 
 
 def check_for_statement(request, problem):
@@ -1,3 +1,6 @@
+import io
+import zipfile
+
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, Permission, User
 from django.contrib.contenttypes.models import ContentType
@@ -384,6 +387,27 @@ class TestProblemSite(TestCase, TestStreamingMixin):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, url_external_stmt)
 
+    def test_statement_zip(self):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zip_file:
+            zip_file.writestr("index.html", "<p>statement</p>", compress_type=zipfile.ZIP_DEFLATED)
+            zip_file.writestr("img/a.png", b"image", compress_type=zipfile.ZIP_STORED)
+        problem = Problem.objects.get(id=1)
+        problem.statements.all().delete()
+        ProblemStatement.objects.create(problem=problem, content=ContentFile(buf.getvalue(), name="statement.zip"))
+
+        url = reverse("problem_site_statement_zip", kwargs={"site_key": "123", "path": "img/a.png"})
+        response = self.client.get(url)
+        self.assertEqual(response.content, b"image")
+        self.assertIn("max-age", response["Cache-Control"])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        url = reverse("problem_site_statement_zip", kwargs={"site_key": "123", "path": "index.html"})
+        self.assertEqual(self.client.get(url).content, b"<p>statement</p>")
+        url = reverse("problem_site_statement_zip", kwargs={"site_key": "123", "path": "missing.html"})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
     def test_submissions_tab(self):
         for problem in Problem.objects.all():
             problem.main_problem_instance.contest = None
@@ -1,12 +1,24 @@
 from datetime import UTC, datetime  # pylint: disable=E0611
 
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test.utils import override_settings
 from django.urls import reverse
 
 from oioioi.base.tests import TestCase
 from oioioi.contests.models import Contest
-from oioioi.problems.models import AlgorithmTag, AlgorithmTagThrough, Problem
+from oioioi.problems.models import (
+    AlgorithmTag,
+    AlgorithmTagThrough,
+    OriginInfoCategory,
+    OriginInfoValue,
+    OriginTag,
+    Problem,
+    ProblemName,
+    ProblemSearchIndex,
+    ProblemSite,
+    update_problem_search_index,
+)
 
 
 class TestProblemsetPage(TestCase):
@@ -354,3 +366,65 @@ class TestProblemsetFilters(TestCase):
                     self.assertContains(response, problemTag, html=True)
                 else:
                     self.assertNotContains(response, problemTag, html=True)
+
+
+@override_settings(PROBLEM_TAGS_VISIBLE=True)
+class TestProblemSearchIndex(TestCase):
+    def setUp(self):
+        self.problem = Problem.objects.create(legacy_name="Legacy", short_name="abc", visibility=Problem.VISIBILITY_PUBLIC)
+        ProblemSite.objects.create(problem=self.problem, url_key="abc")
+
+    def _index(self):
+        return ProblemSearchIndex.objects.get(problem=self.problem)
+
+    def _search(self, **params):
+        response = self.client.get(reverse("problemset_main"), params)
+        self.assertEqual(response.status_code, 200)
+        return self.problem in response.context["problems"]
+
+    def test_names(self):
+        self.assertEqual(self._index().text, "Legacy\nabc")
+        name = ProblemName.objects.create(problem=self.problem, name="Zadanie", language="pl")
+        self.assertEqual(self._index().names, {"pl": "Zadanie"})
+        self.assertIn("Zadanie", self._index().text)
+        self.assertTrue(self._search(q="zadan"))
+        self.assertFalse(self._search(q="other"))
+
+        name.delete()
+        self.assertNotIn("Zadanie", self._index().text)
+
+    def test_tags(self):
+        tag = AlgorithmTag.objects.create(name="dp")
+        AlgorithmTagThrough.objects.create(problem=self.problem, tag=tag)
+        self.assertEqual(self._index().algorithm_tags, " dp ")
+        self.assertTrue(self._search(algorithm="dp"))
+        self.assertFalse(self._search(algorithm="DP"))
+        tag.name = "dynamic"
+        tag.save()
+        self.assertEqual(self._index().algorithm_tags, " dynamic ")
+        self.assertFalse(self._search(algorithm="dp"))
+
+        origin = OriginTag.objects.create(name="pa")
+        category = OriginInfoCategory.objects.create(parent_tag=origin, name="year")
+        value = OriginInfoValue.objects.create(parent_tag=origin, category=category, value="2011")
+        origin.problems.add(self.problem)
+        value.problems.add(self.problem)
+        self.assertEqual(self._index().origin_tags, " pa pa_2011 ")
+        self.assertTrue(self._search(origin="pa_2011"))
+
+        self.problem.origintag_set.clear()
+        self.assertEqual(self._index().origin_tags, " pa_2011 ")
+        origin.delete()
+        self.assertEqual(self._index().origin_tags, "")
+
+    def test_update(self):
+        ProblemSearchIndex.objects.all().delete()
+        update_problem_search_index([self.problem.pk])
+        self.assertFalse(ProblemSearchIndex.objects.exists())
+        update_problem_search_index([self.problem.pk], create=True)
+        self.assertEqual(self._index().text, "Legacy\nabc")
+
+    def test_rebuild_command(self):
+        ProblemSearchIndex.objects.all().delete()
+        call_command("rebuild_problem_search_index", verbosity=0)
+        self.assertEqual(self._index().text, "Legacy\nabc")
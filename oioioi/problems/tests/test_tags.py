@@ -1,6 +1,7 @@
 import json
 import urllib.parse
 
+from django.core.management import call_command
 from django.test.utils import override_settings
 from django.urls import reverse
 
@@ -44,6 +45,7 @@ class TestAlgorithmTagLabel(TestCase):
 class TestProblemSearchOrigin(TestCase, AssertContainsOnlyMixin):
     fixtures = ["test_problem_search_origin"]
     url = reverse("problemset_main")
+
     task_names = all_values = [
         "0_private",
         "0_public",
@@ -55,6 +57,11 @@ class TestProblemSearchOrigin(TestCase, AssertContainsOnlyMixin):
         "3_pa_2012_r1",
     ]
 
+    @classmethod
+    def setUpTestData(cls):
+        # Tags of problems loaded by loaddata are not indexed.
+        call_command("rebuild_problem_search_index", verbosity=0)
+
     def test_search_origintag(self):
         self.client.get("/c/c/")
         response = self.client.get(self.url, {"origin": "pa"})
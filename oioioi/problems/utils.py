@@ -1,13 +1,19 @@
+import hashlib
 import mimetypes
+import struct
 import sys
 import zipfile
+import zlib
 from collections import defaultdict
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import SuspiciousOperation
 from django.db.models import Count
 from django.http import Http404, HttpResponse
 from django.utils import translation
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 
 from oioioi.base.utils import request_cached
 from oioioi.contests.models import ProblemInstance, Submission
@@ -160,20 +166,65 @@ def query_statement(problem_id):
     return sorted(statements, key=sort_key)[0]
 
 
-def query_zip(statement, path):
+def _statement_zip_index(statement, zip_file):
+    """Returns a dict mapping names of members of the statement zip to
+    tuples describing where and how they are stored, parsing the zip's
+    central directory only once per version of the statement.
+    """
+    cache_key = "problems:statement_zip_index:" + statement.content.name.versioned_name
+    index = cache.get(cache_key)
+    if index is None:
+        index = {info.filename: (info.header_offset, info.compress_size, info.compress_type, info.flag_bits) for info in zipfile.ZipFile(zip_file).infolist()}
+        cache.set(cache_key, index, None)
+    return index
+
+
+def _read_zip_member(zip_file, entry, path):
+    """Reads a member of the zip directly from its local header, falling
+    back to :mod:`zipfile` for encrypted members and unusual compression
+    methods.
+    """
+    header_offset, compress_size, compress_type, flag_bits = entry
+    if flag_bits & 0x1 or compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        return zipfile.ZipFile(zip_file).read(path)
+    zip_file.seek(header_offset)
+    header = zip_file.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile("Bad local file header of " + path)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    zip_file.seek(header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+    data = zip_file.read(compress_size)
+    if compress_type == zipfile.ZIP_DEFLATED:
+        data = zlib.decompress(data, -zlib.MAX_WBITS)
+    return data
+
+
+def query_zip(statement, path, request=None):
+    """Returns a response with the file ``path`` from the HTML statement
+    zip. If ``request`` is given, conditional requests are handled.
+    """
     if statement.extension != ".zip":
         raise SuspiciousOperation
 
-    # ZipFile will call seek(), so we need a real file here
-    zip = zipfile.ZipFile(statement.content.read_using_cache())
-    try:
-        info = zip.getinfo(path)
-    except KeyError:
-        raise Http404
+    versioned_name = statement.content.name.versioned_name
+    etag = quote_etag(hashlib.sha1(f"{versioned_name}:{path}".encode()).hexdigest())
+    if request is not None:
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+
+    # A local copy of the zip, as we need to seek()
+    with statement.content.read_using_cache() as zip_file:
+        entry = _statement_zip_index(statement, zip_file).get(path)
+        if entry is None:
+            raise Http404
+        content = _read_zip_member(zip_file, entry, path)
 
     content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
-    response = HttpResponse(zip.read(path), content_type=content_type)
-    response["Content-Length"] = info.file_size
+    response = HttpResponse(content, content_type=content_type)
+    response["Content-Length"] = len(content)
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, max_age=settings.STATEMENT_ZIP_CACHE_MAX_AGE)
     return response
 
 
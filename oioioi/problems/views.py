@@ -25,7 +25,9 @@ from django.db.models import (
     Value,
     When,
 )
-from django.db.models.functions import Coalesce
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Coalesce, StrIndex
+from django.db.models.lookups import GreaterThan
 from django.http import Http404, HttpResponse, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, redirect
 from django.template.response import TemplateResponse
@@ -185,6 +187,19 @@ def add_or_update_problem_view(request):
     return add_or_update_problem(request, request.contest, "problems/add-or-update.html")
 
 
+def _tag_filter(field, *names):
+    """Matches problems having any of the tags ``names`` in the ``field``
+    of their :class:`~oioioi.problems.models.ProblemSearchIndex`.
+
+    Tag names are case-sensitive, so ``contains`` can't be used, as it
+    ignores the case on SQLite.
+    """
+    q = Q()
+    for name in names:
+        q |= Q(GreaterThan(StrIndex(f"search_index__{field}", Value(f" {name} ")), 0))
+    return q
+
+
 def filter_problems_by_origin(problems, origin_tags):
     """The filters are almost always logical ANDed, the only exception to
     this are OriginInfoValues within their OriginInfoCategory, which are
@@ -213,12 +228,12 @@ def filter_problems_by_origin(problems, origin_tags):
                 if category not in info[tag[0]]:
                     # pk=None doesn't match any problem, needed for logical OR
                     info[tag[0]][category] = Q(pk=None)
-                info[tag[0]][category] |= Q(origininfovalue__value=value.value)
+                info[tag[0]][category] |= _tag_filter("origin_tags", value.name)
         else:
             raise Http404
 
     for tag, categories in info.items():
-        problems = problems.filter(origintag__name=tag)
+        problems = problems.filter(_tag_filter("origin_tags", tag))
         for q in categories.values():
             problems = problems.filter(q)
 
@@ -227,12 +242,13 @@ def filter_problems_by_origin(problems, origin_tags):
 
 def _get_problems_by_query(query):
     prefetch = Prefetch("names", queryset=ProblemName.objects.filter(language=get_language()))
-    filtered_problems = Problem.objects.prefetch_related(prefetch).filter(
-        Q(names__name__icontains=query) | Q(legacy_name__icontains=query) | Q(ascii_name__icontains=unidecode(str(query))) | Q(short_name__icontains=query),
-        problemsite__isnull=False,
-    )
+    return Problem.objects.prefetch_related(prefetch).filter(_query_filter(query), problemsite__isnull=False)
+
 
-    return filtered_problems.distinct()
+def _query_filter(query):
+    # The search index contains all the names of a problem, so no joins
+    # (and no distinct()) are needed.
+    return Q(search_index__text__icontains=query) | Q(ascii_name__icontains=unidecode(str(query)))
 
 
 def filter_problems_by_query(problems, datadict):
@@ -242,10 +258,9 @@ def filter_problems_by_query(problems, datadict):
     origin_tags = datadict.getlist("origin")
 
     if query:
-        problems_matching_query = _get_problems_by_query(query)
-        problems = problems.filter(pk__in=problems_matching_query)
+        problems = problems.filter(_query_filter(query), problemsite__isnull=False)
     if difficulty_tags:
-        problems = problems.filter(difficultytag__name__in=difficulty_tags)
+        problems = problems.filter(_tag_filter("difficulty_tags", *difficulty_tags))
     if origin_tags:
         problems = filter_problems_by_origin(problems, origin_tags)
     if algorithm_tags:
@@ -253,9 +268,9 @@ def filter_problems_by_query(problems, datadict):
             proposal_match_problem_ids = AggregatedAlgorithmTagProposal.objects.filter(
                 tag__name__in=algorithm_tags, amount__gte=settings.PROBSET_MIN_AMOUNT_TO_CONSIDER_TAG_PROPOSAL
             ).values_list("problem_id", flat=True)
-            problems = problems.filter(Q(algorithmtag__name__in=algorithm_tags) | Q(id__in=proposal_match_problem_ids)).distinct()
+            problems = problems.filter(_tag_filter("algorithm_tags", *algorithm_tags) | Q(id__in=proposal_match_problem_ids))
         else:
-            problems = problems.filter(algorithmtag__name__in=algorithm_tags)
+            problems = problems.filter(_tag_filter("algorithm_tags", *algorithm_tags))
 
     return problems
 
@@ -373,7 +388,7 @@ def problemset_get_problems(request):
             raise Http404
 
         if field == "name":
-            problems = problems.annotate(localized_name=Subquery(ProblemName.objects.filter(problem=OuterRef("pk"), language=get_language()).values("name")))
+            problems = problems.annotate(localized_name=KeyTextTransform(get_language(), "search_index__names"))
             lookup = F("localized_name")
 
         if "desc" in request.GET:
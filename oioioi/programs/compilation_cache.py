@@ -0,0 +1,136 @@
+"""Content-addressed cache of compiled programs.
+
+A compilation depends only on the source, the compiler and its arguments,
+and the additional files given to it. Model solutions and the checkers,
+input verifiers and output generators of problem packages are usually
+unchanged between package versions, so they don't have to be compiled on
+every upload.
+
+Compiled programs are stored by :func:`store_compilation` and reused by
+:func:`get_compilation`. The least recently used ones are removed when
+their total size exceeds ``COMPILATION_CACHE_MAX_SIZE`` bytes. Setting it
+to 0 (the default) disables the cache. Changing ``COMPILATION_CACHE_VERSION``
+invalidates all the cached programs.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from filetracker.client import FiletrackerError
+from oioioi.filetracker.client import get_client
+from oioioi.filetracker.utils import django_to_filetracker_path
+from oioioi.programs.models import CachedCompilation
+from oioioi.programs.result_cache import content_digest, file_digest
+
+logger = logging.getLogger(__name__)
+
+# Keys of a compilation job which (besides the files) affect its result.
+_JOB_KEYS = (
+    "language",
+    "compiler",
+    "extra_compilation_args",
+    "compilation_result_size_limit",
+)
+
+# Keys of the compilation result which are stored with the program.
+_RESULT_KEYS = ("result_code", "compiler_output", "exec_info")
+
+
+def is_enabled():
+    return bool(settings.COMPILATION_CACHE_MAX_SIZE)
+
+
+def compilation_key(job):
+    """Returns the cache key of a sioworkers compilation job.
+
+    Digests of the source file and the additional archive may be given in
+    the job, as ``source_file_digest`` and ``additional_archive_digest``.
+    """
+    key = {name: job.get(name) for name in _JOB_KEYS}
+    key["version"] = settings.COMPILATION_CACHE_VERSION
+    for name in ("source_file", "additional_archive"):
+        if not job.get(name):
+            key[name] = None
+        else:
+            key[name] = job.get(name + "_digest") or content_digest(job[name])
+    key["extra_files"] = {name: file_digest(path) for name, path in (job.get("extra_files") or {}).items()}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_compilation(key, out_file):
+    """Copies the program cached under ``key`` to the filetracker file
+    ``out_file`` and returns the compilation result, in the format
+    returned by sioworkers. Returns None if there is no such program.
+
+    Entries whose program is missing from Filetracker (e.g. removed by
+    hand) are removed.
+    """
+    try:
+        entry = CachedCompilation.objects.get(key=key)
+    except CachedCompilation.DoesNotExist:
+        return None
+    client = get_client()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "binary")
+        try:
+            client.get_file(django_to_filetracker_path(entry.binary), filename)
+        except FiletrackerError:
+            logger.warning("Program %s is missing from the compilation cache", entry.binary.name, exc_info=True)
+            CachedCompilation.objects.filter(pk=entry.pk).delete()
+            return None
+        client.put_file(out_file, filename)
+    CachedCompilation.objects.filter(pk=entry.pk).update(last_used=timezone.now())
+    return dict(entry.result, out_file=out_file)
+
+
+def store_compilation(key, result):
+    """Stores a copy of the program compiled by a job with the cache key
+    ``key``, if the compilation succeeded, and removes the least recently
+    used programs if the cache got too big.
+    """
+    if result.get("result_code") != "OK" or not result.get("out_file"):
+        return
+    if CachedCompilation.objects.filter(key=key).exists():
+        return
+    entry = CachedCompilation(key=key, result={name: result[name] for name in _RESULT_KEYS if name in result})
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "binary")
+        get_client().get_file(result["out_file"], filename)
+        entry.size = os.path.getsize(filename)
+        with open(filename, "rb") as f:
+            entry.binary.save(key, File(f), save=False)
+    try:
+        with transaction.atomic():
+            entry.save()
+    except IntegrityError:
+        # Stored by someone else in the meantime.
+        entry.binary.delete(save=False)
+        return
+    _evict()
+
+
+def _evict():
+    max_size = settings.COMPILATION_CACHE_MAX_SIZE
+    total_size = CachedCompilation.objects.aggregate(total=Sum("size"))["total"] or 0
+    if total_size <= max_size:
+        return
+    # Removes the least recently used programs, down to 90% of the limit,
+    # so that it doesn't have to be done after every compilation.
+    evicted = 0
+    for entry in CachedCompilation.objects.order_by("last_used").iterator():
+        if total_size <= max_size * 0.9:
+            break
+        entry.binary.delete(save=False)
+        entry.delete()
+        total_size -= entry.size
+        evicted += 1
+    logger.info("Removed %d programs from the compilation cache", evicted)
@@ -33,6 +33,7 @@ from oioioi.evalmgr.tasks import (
 from oioioi.filetracker.utils import django_to_filetracker_path
 from oioioi.problems.controllers import ProblemController
 from oioioi.problems.utils import can_admin_problem, can_admin_problem_instance
+from oioioi.programs import compilation_cache
 from oioioi.programs.models import (
     CompilationReport,
     ContestCompiler,
@@ -170,6 +171,9 @@ class ProgrammingProblemController(ProblemController):
             environ["report_kinds"] = ["HIDDEN"]
 
         environ["compiler"] = problem_instance.controller.get_compiler_for_submission(submission)
+        # Model solutions are usually unchanged between package versions.
+        if compilation_cache.is_enabled() and is_model_submission(submission):
+            environ["cache_compilation"] = True
 
         config = ExtraConfig.objects.get(problem_id=problem.id)
         environ["fake_time"] = config.parsed_config.get("fake_time", "off")
@@ -200,12 +204,16 @@ class ProgrammingProblemController(ProblemController):
         recipe_body = [("collect_tests", "oioioi.programs.handlers.collect_tests")]
 
         if "INITIAL" in kinds:
+            initial_run_tests_kwargs = {"kind": "EXAMPLE"}
+            if settings.PIPELINED_TESTS and "NORMAL" in kinds:
+                # Final tests are run together with the example ones.
+                initial_run_tests_kwargs["pipelined_kinds"] = ["NORMAL"]
             recipe_body.extend(
                 [
                     (
                         "initial_run_tests",
                         "oioioi.programs.handlers.run_tests",
-                        {"kind": "EXAMPLE"},
+                        initial_run_tests_kwargs,
                     ),
                     ("initial_run_tests_end", "oioioi.programs.handlers.run_tests_end"),
                     ("initial_grade_tests", "oioioi.programs.handlers.grade_tests"),
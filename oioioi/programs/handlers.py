@@ -20,6 +20,7 @@ from oioioi.filetracker.utils import (
     django_to_filetracker_path,
     filetracker_to_django_file,
 )
+from oioioi.programs import compilation_cache
 from oioioi.programs.models import (
     CompilationReport,
     GroupReport,
@@ -28,6 +29,12 @@ from oioioi.programs.models import (
     TestReport,
     UserOutGenStatus,
 )
+from oioioi.programs.result_cache import (
+    content_digest,
+    get_test_results,
+    result_key,
+    store_test_results,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -84,6 +91,8 @@ def compile(env, **kwargs):
          ``env['language']`` is, the compiler is set to ``'default-' +
          env['language']``.
        * the entire ``env`` is also passed to the ``compile`` job
+       * env['cache_compilation'] - if set, the compiled program is taken
+         from (or stored in) :mod:`oioioi.programs.compilation_cache`
 
     PRODUCES
        * env['compilation_result'] - may be OK if the file compiled
@@ -93,6 +102,9 @@ def compile(env, **kwargs):
          binary path
        * env['compilation_message'] - contains compiler stdout and stderr
        * env['exec_info'] - information how to execute the compiled file
+       * env['compiled_file_digest'] - the digest of the compiled file,
+         if ``settings.TEST_RESULT_CACHE_ENABLED`` is set (by
+         :func:`compile_end`)
     """
 
     compilation_job = env.copy()
@@ -101,6 +113,13 @@ def compile(env, **kwargs):
     compilation_job["out_file"] = _make_filename(env, "exe")
     if "language" in env and "compiler" not in env:
         compilation_job["compiler"] = "default-" + env["language"]
+    if env.get("cache_compilation") and compilation_cache.is_enabled():
+        cache_key = compilation_cache.compilation_key(compilation_job)
+        result = compilation_cache.get_compilation(cache_key, compilation_job["out_file"])
+        if result is not None:
+            env["workers_jobs.results"] = {"compile": result}
+            return env
+        env["compilation_cache_key"] = cache_key
     env["workers_jobs"] = {"compile": compilation_job}
     return transfer_job(
         env,
@@ -111,10 +130,14 @@ def compile(env, **kwargs):
 
 def compile_end(env, **kwargs):
     new_env = env["workers_jobs.results"]["compile"]
+    if "compilation_cache_key" in env:
+        compilation_cache.store_compilation(env.pop("compilation_cache_key"), new_env)
     env["compiled_file"] = new_env.get("out_file")
     env["compilation_message"] = new_env.get("compiler_output", "")
     env["compilation_result"] = new_env.get("result_code", "CE")
     env["exec_info"] = new_env.get("exec_info", {})
+    if env["compiled_file"] and settings.TEST_RESULT_CACHE_ENABLED:
+        env["compiled_file_digest"] = content_digest(env["compiled_file"])
     return env
 
 
@@ -196,6 +219,10 @@ def collect_tests(env, **kwargs):
         test_env["name"] = test.name
         test_env["in_file"] = django_to_filetracker_path(test.input_file)
         test_env["hint_file"] = django_to_filetracker_path(test.output_file)
+        if test.input_digest:
+            test_env["in_file_digest"] = test.input_digest
+        if test.output_digest:
+            test_env["hint_file_digest"] = test.output_digest
         test_env["kind"] = test.kind
         test_env["group"] = test.group or test.name
         test_env["max_score"] = test.max_score
@@ -212,12 +239,36 @@ def collect_tests(env, **kwargs):
     return env
 
 
+def _use_cached_test_results(env, jobs):
+    """Computes the result cache keys of ``jobs``. On rejudges, also
+    removes from ``jobs`` the ones with cached results, which are then
+    used by :func:`run_tests_end` as if they were returned by sioworkers.
+    """
+    if "compiled_file_digest" not in env:
+        env["compiled_file_digest"] = content_digest(env["compiled_file"])
+    cache_keys = {test_name: result_key(job, env["compiled_file_digest"]) for test_name, job in jobs.items()}
+    cached_results = {}
+    if env.get("is_rejudge"):
+        cached = get_test_results(cache_keys.values())
+        for test_name in [test_name for test_name, key in cache_keys.items() if key in cached]:
+            result = jobs.pop(test_name)
+            result.update(cached[cache_keys.pop(test_name)])
+            cached_results[test_name] = result
+    env["workers_jobs.cache_keys"] = cache_keys
+    env["workers_jobs.cached_results"] = cached_results
+
+
 @_skip_on_compilation_error
-def run_tests(env, kind=None, **kwargs):
+def run_tests(env, kind=None, pipelined_kinds=(), **kwargs):
     """Runs tests and saves their results into the environment
 
     If ``kind`` is specified, only tests with the given kind will be run.
 
+    Tests of ``pipelined_kinds`` are sent to sioworkers together with
+    the tests of ``kind``. :func:`run_tests_end` keeps their results aside
+    (in ``env['pipelined_test_results']``) and the next ``run_tests`` for
+    their kind uses them instead of running the tests again.
+
     Used ``environ`` keys:
       * ``tests``: this should be a dictionary, mapping test name into
         the environment to pass to the ``exec`` job
@@ -236,6 +287,10 @@ def run_tests(env, kind=None, **kwargs):
         arguments passed to
         :fun:`oioioi.sioworkers.jobs.run_sioworkers_jobs`
         (kwargs).
+      * ``is_rejudge``: if set, results of tests which were already run
+        with the same binary, files and limits are taken from
+        :mod:`oioioi.programs.result_cache` (if
+        ``settings.TEST_RESULT_CACHE_ENABLED`` is set)
 
     Produced ``environ`` keys:
       * ``test_results``: a dictionary, mapping test names into
@@ -260,15 +315,22 @@ def run_tests(env, kind=None, **kwargs):
     """
     jobs = {}
     not_to_judge = []
+    pipelined = []
     for test_name, test_env in env["tests"].items():
+        test_kind = kind
         if kind and test_env["kind"] != kind:
-            continue
+            if test_env["kind"] not in pipelined_kinds:
+                continue
+            test_kind = test_env["kind"]
         if not test_env["to_judge"]:
-            not_to_judge.append(test_name)
+            if test_kind == kind:
+                not_to_judge.append(test_name)
             continue
+        if test_kind != kind:
+            pipelined.append(test_name)
         job = test_env.copy()
         job["job_type"] = (env.get("exec_mode", "") + env.get("task_type_suffix", "-exec")).lstrip("-")
-        if kind == "INITIAL" or kind == "EXAMPLE":
+        if test_kind == "INITIAL" or test_kind == "EXAMPLE":
             job["task_priority"] = EXAMPLE_TEST_TASK_PRIORITY
         elif env["submission_kind"] == "TESTRUN":
             job["task_priority"] = TESTRUN_TEST_TASK_PRIORITY
@@ -289,6 +351,25 @@ def run_tests(env, kind=None, **kwargs):
             job["num_processes"] = env["num_processes"]
         job["untrusted_checker"] = env["untrusted_checker"]
         jobs[test_name] = job
+    pipelined_results = env.get("pipelined_test_results", {}).pop(kind, None)
+    if pipelined_results is not None:
+        # Already run together with the tests of the previous stage.
+        if not env["pipelined_test_results"]:
+            del env["pipelined_test_results"]
+        env["workers_jobs.results"] = pipelined_results
+        env["workers_jobs.not_to_judge"] = not_to_judge
+        return env
+    if kind:
+        for pipelined_kind in pipelined_kinds:
+            env.setdefault("pipelined_test_results", {})[pipelined_kind] = {}
+    if pipelined:
+        env["workers_jobs.pipelined"] = pipelined
+    if jobs and settings.TEST_RESULT_CACHE_ENABLED and not env.get("save_outputs"):
+        _use_cached_test_results(env, jobs)
+        if not jobs:
+            env["workers_jobs.results"] = {}
+            env["workers_jobs.not_to_judge"] = not_to_judge
+            return env
     extra_args = env.get("sioworkers_extra_args", {}).get(kind, {})
     env["workers_jobs"] = jobs
     env["workers_jobs.extra_args"] = extra_args
@@ -304,10 +385,18 @@ def run_tests(env, kind=None, **kwargs):
 def run_tests_end(env, **kwargs):
     not_to_judge = env["workers_jobs.not_to_judge"]
     del env["workers_jobs.not_to_judge"]
+    cache_keys = env.pop("workers_jobs.cache_keys", {})
+    cached_results = env.pop("workers_jobs.cached_results", {})
+    pipelined = set(env.pop("workers_jobs.pipelined", []))
     jobs = env["workers_jobs.results"]
+    if cache_keys:
+        store_test_results({cache_keys[test_name]: result for test_name, result in jobs.items() if test_name in cache_keys})
     env.setdefault("test_results", {})
-    for test_name, result in jobs.items():
-        env["test_results"].setdefault(test_name, {}).update(result)
+    for test_name, result in list(jobs.items()) + list(cached_results.items()):
+        if test_name in pipelined:
+            env["pipelined_test_results"][env["tests"][test_name]["kind"]][test_name] = result
+        else:
+            env["test_results"].setdefault(test_name, {}).update(result)
     for test_name in not_to_judge:
         env["test_results"].setdefault(test_name, {}).update(env["tests"][test_name])
     return env
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('programs', '0023_groupreport_subtask_dependency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedTestResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('result_code', models.CharField(max_length=8)),
+                ('result_string', models.TextField(blank=True)),
+                ('time_used', models.IntegerField()),
+                ('mem_used', models.IntegerField()),
+                ('num_syscalls', models.IntegerField(blank=True, null=True)),
+                ('result_percentage_numerator', models.IntegerField(blank=True, null=True)),
+                ('result_percentage_denominator', models.IntegerField(blank=True, null=True)),
+                ('creation_date', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
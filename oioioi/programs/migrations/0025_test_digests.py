@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('programs', '0024_cachedtestresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='input_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='output_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:22
+
+import oioioi.filetracker.fields
+import oioioi.programs.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('programs', '0025_test_digests'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedCompilation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('binary', oioioi.filetracker.fields.FileField(max_length=255, upload_to=oioioi.programs.models.make_compilation_filename)),
+                ('size', models.BigIntegerField()),
+                ('result', models.JSONField()),
+                ('last_used', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
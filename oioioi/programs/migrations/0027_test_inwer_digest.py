@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('programs', '0026_cachedcompilation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='inwer_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
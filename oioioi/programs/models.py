@@ -93,6 +93,15 @@ class Test(models.Model):
     max_score = models.IntegerField(verbose_name=_("score"), default=10)
     order = models.IntegerField(default=0)
     is_active = models.BooleanField(default=True)
+    # SHA-256 of the contents of the input and output files, if known.
+    # Set by package backends, so that unchanged files are not uploaded
+    # again and don't have to be downloaded to compute result cache keys.
+    input_digest = models.CharField(max_length=64, blank=True, default="", editable=False)
+    output_digest = models.CharField(max_length=64, blank=True, default="", editable=False)
+    # Digest of the input verifier (and the files it was compiled with)
+    # which accepted the input file, so that the inputs are verified again
+    # when it changes.
+    inwer_digest = models.CharField(max_length=64, blank=True, default="", editable=False)
 
     @property
     def problem(self):
@@ -348,6 +357,46 @@ class GroupReport(models.Model):
     dependency_prereqs = models.CharField(max_length=255, blank=True, default="")
 
 
+class CachedTestResult(models.Model):
+    """Outcome of running a compiled program on a test, as returned by
+    sioworkers.
+
+    ``key`` is a hash of everything the outcome depends on, see
+    :func:`oioioi.programs.result_cache.result_key`. Entries may be
+    deleted at any time, the tests are then simply run again.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    result_code = models.CharField(max_length=8)
+    result_string = models.TextField(blank=True)
+    time_used = models.IntegerField()
+    mem_used = models.IntegerField()
+    num_syscalls = models.IntegerField(null=True, blank=True)
+    result_percentage_numerator = models.IntegerField(null=True, blank=True)
+    result_percentage_denominator = models.IntegerField(null=True, blank=True)
+    creation_date = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+def make_compilation_filename(instance, filename):
+    return f"compilations/{instance.key}"
+
+
+class CachedCompilation(models.Model):
+    """A compiled program, with the compilation result returned by
+    sioworkers.
+
+    ``key`` is a hash of everything the compilation depends on, see
+    :func:`oioioi.programs.compilation_cache.compilation_key`. Entries
+    may be deleted at any time, the program is then simply compiled again.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    binary = FileField(upload_to=make_compilation_filename)
+    size = models.BigIntegerField()
+    result = models.JSONField()
+    last_used = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
 class ReportActionsConfig(models.Model):
     problem = models.OneToOneField(
         Problem,
@@ -0,0 +1,157 @@
+"""Content-addressed cache of test results.
+
+The outcome of running a program on a test depends only on the compiled
+binary, the input and hint files, the checker (and interactor) and the
+limits. When none of them changed, e.g. when a problem is rejudged after
+modifying only some of its tests, the test doesn't have to be run again.
+
+Results are stored by :func:`store_test_results` after every run and
+reused by :func:`~oioioi.programs.handlers.run_tests` on rejudges, if
+``TEST_RESULT_CACHE_ENABLED`` is set. Results older than
+``TEST_RESULT_CACHE_MAX_AGE`` are neither used nor kept.
+
+Verdicts which depend on the speed of the judging machine (time limits
+exceeded, or nearly exceeded) are not stored, so that rejudging after fixing
+a faulty machine runs such tests again.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from oioioi.filetracker.client import get_client
+from oioioi.programs.models import CachedTestResult
+
+_CHUNK_SIZE = 1 << 16
+
+# Results of these are not reproducible.
+_UNCACHED_RESULT_CODES = ("SE", "TLE")
+
+# Results of programs which used more than this fraction of the time limit
+# could differ on another machine.
+_MAX_TIME_LIMIT_FRACTION = 0.5
+
+# Expired results are removed at most once per this many seconds.
+_PRUNE_INTERVAL = 60 * 60
+
+# Keys of a job which (besides the files) affect its result.
+_JOB_KEYS = (
+    "job_type",
+    "exec_info",
+    "exec_time_limit",
+    "exec_mem_limit",
+    "check_output",
+    "checker_format",
+    "untrusted_checker",
+    "num_processes",
+)
+
+
+def content_digest(path):
+    """Returns the SHA-256 of the contents of a filetracker file."""
+    reader, _version = get_client().get_stream(path)
+    digest = hashlib.sha256()
+    try:
+        for chunk in iter(lambda: reader.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    finally:
+        reader.close()
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    """Like :func:`content_digest`, but cached by the path and the version
+    of the file. Meant for test files, whose digests are needed for every
+    judged submission.
+    """
+    cache_key = f"programs:file_digest:{path}@{get_client().file_version(path)}"
+    digest = cache.get(cache_key)
+    if digest is None:
+        digest = content_digest(path)
+        cache.set(cache_key, digest, None)
+    return digest
+
+
+def result_key(job, exe_digest):
+    """Returns the cache key of a sioworkers test job (as built by
+    :func:`~oioioi.programs.handlers.run_tests`), ``exe_digest`` being
+    the digest of its ``exe_file``.
+
+    Digests of the files known in advance may be given in the job, as
+    ``<name>_digest`` (e.g. ``in_file_digest``).
+    """
+    key = {name: job.get(name) for name in _JOB_KEYS}
+    key["exe_file"] = exe_digest
+    for name in ("in_file", "hint_file", "chk_file", "interactor_file"):
+        if not job.get(name):
+            key[name] = None
+        else:
+            key[name] = job.get(name + "_digest") or file_digest(job[name])
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_test_results(keys):
+    """Returns a dict mapping the ``keys`` found in the cache to
+    the cached results, in the format returned by sioworkers.
+    """
+    results = {}
+    for entry in CachedTestResult.objects.filter(key__in=keys, creation_date__gte=_expiry_date()):
+        result = {
+            "result_code": entry.result_code,
+            "result_string": entry.result_string,
+            "time_used": entry.time_used,
+            "mem_used": entry.mem_used,
+        }
+        if entry.num_syscalls is not None:
+            result["num_syscalls"] = entry.num_syscalls
+        if entry.result_percentage_denominator is not None:
+            result["result_percentage"] = (
+                entry.result_percentage_numerator,
+                entry.result_percentage_denominator,
+            )
+        results[entry.key] = result
+    return results
+
+
+def store_test_results(results):
+    """Stores results of test jobs, given as a dict mapping cache keys to
+    the results returned by sioworkers.
+    """
+    entries = []
+    for key, result in results.items():
+        if result.get("result_code") in _UNCACHED_RESULT_CODES or "result_code" not in result:
+            continue
+        time_limit = result.get("exec_time_limit")
+        if time_limit and result.get("time_used", 0) > time_limit * _MAX_TIME_LIMIT_FRACTION:
+            continue
+        percentage = result.get("result_percentage")
+        entries.append(
+            CachedTestResult(
+                key=key,
+                result_code=result["result_code"],
+                result_string=result.get("result_string") or "",
+                time_used=result.get("time_used", 0),
+                mem_used=result.get("mem_used", 0),
+                num_syscalls=result.get("num_syscalls"),
+                result_percentage_numerator=percentage[0] if percentage else None,
+                result_percentage_denominator=percentage[1] if percentage else None,
+            )
+        )
+    with transaction.atomic():
+        CachedTestResult.objects.filter(key__in=[entry.key for entry in entries], creation_date__lt=_expiry_date()).delete()
+        CachedTestResult.objects.bulk_create(entries, ignore_conflicts=True)
+    _prune_expired()
+
+
+def _expiry_date():
+    return timezone.now() - timedelta(seconds=settings.TEST_RESULT_CACHE_MAX_AGE)
+
+
+def _prune_expired():
+    if cache.add("programs:result_cache_pruned", True, _PRUNE_INTERVAL):
+        CachedTestResult.objects.filter(creation_date__lt=_expiry_date()).delete()
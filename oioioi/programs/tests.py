@@ -1,5 +1,6 @@
 import os
 import re
+import tempfile
 import urllib
 from collections import defaultdict
 from datetime import UTC, datetime, timedelta  # pylint: disable=E0611
@@ -33,12 +34,16 @@ from oioioi.contests.models import Contest, ProblemInstance, Round, Submission
 from oioioi.contests.scores import IntegerScore, ScoreValue
 from oioioi.contests.tests import PrivateRegistrationController, SubmitMixin
 from oioioi.evalmgr.tasks import create_environ
+from oioioi.filetracker.client import get_client
 from oioioi.filetracker.tests import TestStreamingMixin
+from oioioi.filetracker.utils import django_to_filetracker_path
 from oioioi.problems.models import Problem
-from oioioi.programs import utils
+from oioioi.programs import compilation_cache, handlers, utils
 from oioioi.programs.controllers import ProgrammingContestController
 from oioioi.programs.handlers import collect_tests
 from oioioi.programs.models import (
+    CachedCompilation,
+    CachedTestResult,
     CheckerFormatForContest,
     CheckerFormatForProblem,
     LanguageOverrideForTest,
@@ -51,6 +56,7 @@ from oioioi.programs.models import (
     check_compilers_config,
 )
 from oioioi.programs.problem_instance_utils import get_allowed_languages_dict
+from oioioi.programs.result_cache import content_digest, get_test_results, store_test_results
 from oioioi.programs.utils import form_field_id_for_langs, get_checker_format
 from oioioi.programs.views import _testreports_to_generate_outs
 from oioioi.sinolpack.models import ExtraConfig
@@ -1421,6 +1427,182 @@ class TestRejudge(TestCase, SubmitFileMixin):
             ["1a", "2"],
         )
 
+    @override_settings(TEST_RESULT_CACHE_ENABLED=True)
+    def test_rejudge_uses_result_cache(self):
+        self.assertTrue(self.client.login(username="test_user"))
+        contest = Contest.objects.get()
+        pi = ProblemInstance.objects.get(id=1)
+        self.submit_code(contest, pi, "int main(void) { return 0; }")
+        submission = ProgramSubmission.objects.latest("id")
+
+        def statuses():
+            reports = TestReport.objects.filter(submission_report__submission=submission, submission_report__status="ACTIVE")
+            return {report.test_name: report.status for report in reports}
+
+        self.assertTrue(CachedTestResult.objects.exists())
+        self.assertNotIn("WA", statuses().values())
+
+        # Fake cached results, so that it's visible when they are used.
+        CachedTestResult.objects.update(result_code="WA")
+        pi.controller.judge(submission, is_rejudge=True)
+        self.assertEqual(set(statuses().values()), {"WA"})
+
+        with override_settings(TEST_RESULT_CACHE_ENABLED=False):
+            pi.controller.judge(submission, is_rejudge=True)
+        self.assertNotIn("WA", statuses().values())
+
+    @override_settings(TEST_RESULT_CACHE_ENABLED=True)
+    def test_result_cache_uses_test_digests(self):
+        self.assertTrue(self.client.login(username="test_user"))
+        contest = Contest.objects.get()
+        pi = ProblemInstance.objects.get(id=1)
+        self.submit_code(contest, pi, "int main(void) { return 0; }")
+        submission = ProgramSubmission.objects.latest("id")
+        CachedTestResult.objects.update(result_code="WA")
+
+        def statuses():
+            reports = TestReport.objects.filter(submission_report__submission=submission, submission_report__status="ACTIVE")
+            return set(reports.values_list("status", flat=True))
+
+        # Stored digests are used instead of the contents of the files.
+        Test.objects.filter(problem_instance=pi).update(input_digest="0" * 64)
+        pi.controller.judge(submission, is_rejudge=True)
+        self.assertNotIn("WA", statuses())
+
+        for test in Test.objects.filter(problem_instance=pi):
+            test.input_digest = content_digest(django_to_filetracker_path(test.input_file))
+            test.save()
+        CachedTestResult.objects.update(result_code="WA")
+        pi.controller.judge(submission, is_rejudge=True)
+        self.assertEqual(statuses(), {"WA"})
+
+
+class TestResultCache(TestCase):
+    def _result(self, **kwargs):
+        return dict({"result_code": "OK", "result_string": "", "time_used": 100, "mem_used": 1000, "exec_time_limit": 1000}, **kwargs)
+
+    def test_timing_dependent_results_not_stored(self):
+        store_test_results(
+            {
+                "a": self._result(),
+                "b": self._result(result_code="TLE", time_used=1000),
+                "c": self._result(time_used=900),
+                "d": self._result(result_code="SE"),
+            }
+        )
+        self.assertEqual(set(get_test_results(["a", "b", "c", "d"])), {"a"})
+
+    @override_settings(TEST_RESULT_CACHE_MAX_AGE=3600)
+    def test_expired_results(self):
+        store_test_results({"a": self._result(), "b": self._result()})
+        CachedTestResult.objects.filter(key="a").update(creation_date=django_timezone.now() - timedelta(hours=2))
+        self.assertEqual(set(get_test_results(["a", "b"])), {"b"})
+
+        store_test_results({"a": self._result(result_code="WA")})
+        self.assertEqual(get_test_results(["a"])["a"]["result_code"], "WA")
+
+
+@override_settings(COMPILATION_CACHE_MAX_SIZE=1024 * 1024)
+class TestCompilationCache(TestCase):
+    def _put(self, path, content):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(content)
+            f.flush()
+            get_client().put_file(path, f.name)
+        return path
+
+    def _read(self, path):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "file")
+            get_client().get_file(path, filename)
+            with open(filename, "rb") as f:
+                return f.read()
+
+    def _store(self, key, content, result_code="OK"):
+        out_file = self._put(f"/eval/{key}.e", content)
+        compilation_cache.store_compilation(key, {"result_code": result_code, "out_file": out_file, "compiler_output": "ok", "exec_info": {}})
+
+    def test_compilation_key(self):
+        source = self._put("/eval/source.c", b"int main() {}")
+        job = {"source_file": source, "language": "c", "compiler": "default-c"}
+        key = compilation_cache.compilation_key(job)
+        self.assertEqual(key, compilation_cache.compilation_key(dict(job, source_file=self._put("/eval/other.c", b"int main() {}"))))
+        self.assertEqual(key, compilation_cache.compilation_key(dict(job, source_file_digest=content_digest(source))))
+        self.assertNotEqual(key, compilation_cache.compilation_key(dict(job, compiler="system-c")))
+        self.assertNotEqual(key, compilation_cache.compilation_key(dict(job, extra_compilation_args=["-O2"])))
+        self.assertNotEqual(key, compilation_cache.compilation_key(dict(job, extra_files={"lib.h": self._put("/eval/lib.h", b"")})))
+        with override_settings(COMPILATION_CACHE_VERSION=2):
+            self.assertNotEqual(key, compilation_cache.compilation_key(job))
+
+    def test_store_and_get(self):
+        self.assertIsNone(compilation_cache.get_compilation("a" * 64, "/eval/out.e"))
+        self._store("a" * 64, b"binary")
+        self._store("b" * 64, b"error", result_code="CE")
+        self.assertEqual(CachedCompilation.objects.count(), 1)
+
+        result = compilation_cache.get_compilation("a" * 64, "/eval/out.e")
+        self.assertEqual(result, {"result_code": "OK", "out_file": "/eval/out.e", "compiler_output": "ok", "exec_info": {}})
+        self.assertEqual(self._read("/eval/out.e"), b"binary")
+
+    def test_missing_program(self):
+        self._store("a" * 64, b"binary")
+        get_client().delete_file(django_to_filetracker_path(CachedCompilation.objects.get().binary))
+        self.assertIsNone(compilation_cache.get_compilation("a" * 64, "/eval/out.e"))
+        self.assertFalse(CachedCompilation.objects.exists())
+
+    @override_settings(COMPILATION_CACHE_MAX_SIZE=10)
+    def test_eviction(self):
+        self._store("a" * 64, b"1234")
+        self._store("b" * 64, b"1234")
+        CachedCompilation.objects.filter(key="a" * 64).update(last_used=django_timezone.now() - timedelta(hours=2))
+        CachedCompilation.objects.filter(key="b" * 64).update(last_used=django_timezone.now() - timedelta(hours=1))
+        compilation_cache.get_compilation("a" * 64, "/eval/out.e")
+        self._store("c" * 64, b"1234")
+        self.assertEqual(set(CachedCompilation.objects.values_list("key", flat=True)), {"a" * 64, "c" * 64})
+
+    def test_compile_handler(self):
+        env = {
+            "source_file": self._put("/eval/source.c", b"int main() {}"),
+            "language": "c",
+            "eval_dir": "/eval/test",
+            "job_id": "job",
+            "cache_compilation": True,
+        }
+        job = dict(env, compiler="default-c")
+        self._store(compilation_cache.compilation_key(job), b"binary")
+        env = handlers.compile_end(handlers.compile(env))
+        self.assertEqual(env["compilation_result"], "OK")
+        self.assertEqual(self._read(env["compiled_file"]), b"binary")
+
+
+class TestPipelinedTests(TestCase, SubmitFileMixin):
+    fixtures = [
+        "test_users",
+        "test_contest",
+        "test_full_package",
+        "test_problem_instance",
+    ]
+
+    @override_settings(PIPELINED_TESTS=True)
+    def test_pipelined_tests(self):
+        self.assertTrue(self.client.login(username="test_user"))
+        contest = Contest.objects.get()
+        pi = ProblemInstance.objects.get(id=1)
+        self.submit_code(contest, pi, "int main(void) { return 0; }")
+        submission = ProgramSubmission.objects.latest("id")
+
+        for report_kind, test_kind in [("INITIAL", "EXAMPLE"), ("NORMAL", "NORMAL")]:
+            reports = TestReport.objects.filter(
+                submission_report__submission=submission,
+                submission_report__kind=report_kind,
+                submission_report__status="ACTIVE",
+            )
+            tests = Test.objects.filter(problem_instance=pi, kind=test_kind, is_active=True)
+            self.assertEqual(
+                set(reports.values_list("test_name", flat=True)),
+                set(tests.values_list("name", flat=True)),
+            )
+
 
 class TestLimitsLimits(TestCase):
     fixtures = [
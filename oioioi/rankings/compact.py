@@ -0,0 +1,168 @@
+"""Compact, columnar serialization of rankings.
+
+Unlike the pickled data used for rendering, a :class:`CompactRanking` holds
+no model instances -- only ids of users and problem instances, places and
+serialized scores -- so it's cheap to load. It also contains a hash index
+of user ids, so the position of a user can be found in constant time
+without decoding the whole ranking.
+
+Layout of version 1 (all integers are little-endian)::
+
+    header          MAGIC, version (B), number of rows (I),
+                    number of problem instances (I), index size (I)
+    pi_ids          problem instance ids (q[number of problem instances])
+    user_ids        user ids in ranking order (q[number of rows])
+    places          places (i[number of rows])
+    index           open addressing hash table of (user id + 1, position)
+                    pairs, 0 marks an empty slot (q[2 * index size])
+    scores          zlib-compressed, NUL-separated serialized scores,
+                    the sums column followed by a column for every
+                    problem instance, empty for no score
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+
+from oioioi.contests.scores import ScoreValue
+
+MAGIC = b"OIRK"
+VERSION = 1
+_HEADER = struct.Struct("<4sBIII")
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK_64 = (1 << 64) - 1
+
+
+def _slot(user_id, mask):
+    return ((user_id * _HASH_MULTIPLIER) & _MASK_64) >> 32 & mask
+
+
+def _to_bytes(typecode, values):
+    values = array(typecode, values)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _score_repr(score):
+    return score.serialize() if score is not None else ""
+
+
+def encode_ranking(pi_ids, rows):
+    """Encodes a ranking.
+
+    ``rows`` is a list of ``(user_id, place, sum, scores)`` tuples in
+    ranking order, where ``scores`` are the scores of the user for
+    the problem instances with ids ``pi_ids``. Scores may be None.
+    """
+    index_size = 1
+    while index_size < 2 * len(rows):
+        index_size *= 2
+    index = [0] * (2 * index_size)
+    for position, (user_id, _place, _sum, _scores) in enumerate(rows):
+        slot = _slot(user_id, index_size - 1)
+        while index[2 * slot]:
+            slot = (slot + 1) & (index_size - 1)
+        index[2 * slot] = user_id + 1
+        index[2 * slot + 1] = position
+
+    columns = [[_score_repr(row[2]) for row in rows]]
+    columns += [[_score_repr(row[3][i]) for row in rows] for i in range(len(pi_ids))]
+    scores = "\0".join(value for column in columns for value in column)
+
+    return b"".join(
+        [
+            _HEADER.pack(MAGIC, VERSION, len(rows), len(pi_ids), index_size),
+            _to_bytes("q", pi_ids),
+            _to_bytes("q", [row[0] for row in rows]),
+            _to_bytes("i", [row[1] for row in rows]),
+            _to_bytes("q", index),
+            zlib.compress(scores.encode("utf-8")),
+        ]
+    )
+
+
+class CompactRanking:
+    """Read access to a ranking encoded with :func:`encode_ranking`.
+
+    Columns are decoded lazily, on first access.
+    """
+
+    def __init__(self, data):
+        data = memoryview(data)
+        magic, version, self.num_rows, self.num_problems, self._index_size = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Unsupported ranking serialization format")
+        offset = _HEADER.size
+        self._pi_ids = data[offset : offset + 8 * self.num_problems]
+        offset += 8 * self.num_problems
+        self._user_ids = data[offset : offset + 8 * self.num_rows]
+        offset += 8 * self.num_rows
+        self._places = data[offset : offset + 4 * self.num_rows]
+        offset += 4 * self.num_rows
+        self._index = data[offset : offset + 16 * self._index_size]
+        offset += 16 * self._index_size
+        self._compressed_scores = data[offset:]
+        self._scores = None
+
+    def _array(self, typecode, data):
+        values = array(typecode)
+        values.frombytes(data)
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values
+
+    @property
+    def pi_ids(self):
+        return list(self._array("q", self._pi_ids))
+
+    @property
+    def user_ids(self):
+        return list(self._array("q", self._user_ids))
+
+    @property
+    def places(self):
+        return list(self._array("i", self._places))
+
+    def position(self, user_id):
+        """Returns the 0-based position of the user in the ranking,
+        or None if the user is not in the ranking.
+        """
+        mask = self._index_size - 1
+        slot = _slot(user_id, mask)
+        while True:
+            stored_id, position = struct.unpack_from("<qq", self._index, 16 * slot)
+            if stored_id == 0:
+                return None
+            if stored_id == user_id + 1:
+                return position
+            slot = (slot + 1) & mask
+
+    def _score_columns(self):
+        if self._scores is None:
+            values = zlib.decompress(self._compressed_scores).decode("utf-8").split("\0")
+            self._scores = [values[i * self.num_rows : (i + 1) * self.num_rows] for i in range(self.num_problems + 1)]
+        return self._scores
+
+    @property
+    def sums(self):
+        return [ScoreValue.deserialize(value) for value in self._score_columns()[0]]
+
+    def scores(self, problem_index):
+        """Returns the column of scores for the ``problem_index``-th
+        problem instance.
+        """
+        return [ScoreValue.deserialize(value) for value in self._score_columns()[problem_index + 1]]
+
+    def row(self, position):
+        """Returns ``(user_id, place, sum, scores)`` of the row at
+        the given position.
+        """
+        columns = self._score_columns()
+        return (
+            struct.unpack_from("<q", self._user_ids, 8 * position)[0],
+            struct.unpack_from("<i", self._places, 4 * position)[0],
+            ScoreValue.deserialize(columns[0][position]),
+            [ScoreValue.deserialize(column[position]) for column in columns[1:]],
+        )
@@ -1,25 +1,34 @@
+import bisect
+import hashlib
+import json
 from collections import defaultdict
 from operator import itemgetter  # pylint: disable=E0611
 
 import unicodecsv
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.core.cache import cache
+from django.db import models
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.template.loader import render_to_string
 from django.test import RequestFactory
 from django.urls import reverse
-from django.utils import timezone
+from django.utils import timezone, translation
 from django.utils.encoding import force_str
+from django.utils.functional import Promise
 from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 
 from oioioi.base.models import PreferencesSaved
 from oioioi.base.utils import ObjectWithMixins, RegisteredSubclassesBase
 from oioioi.contests.controllers import ContestController, ContestControllerContext
 from oioioi.contests.models import Contest, ProblemInstance, UserResultForProblem
+from oioioi.contests.scores import ScoreValue
 from oioioi.contests.utils import is_contest_basicadmin, is_contest_observer, visible_rounds
 from oioioi.filetracker.utils import make_content_disposition_header
-from oioioi.rankings.models import Ranking, RankingPage
+from oioioi.rankings.compact import encode_ranking
+from oioioi.rankings.models import Ranking, RankingPage, UnrenderedPage
 
 CONTEST_RANKING_KEY = "c"
 
@@ -33,7 +42,12 @@ class RankingMixinForContestController:
 
     def update_user_results(self, user, problem_instance, *args, **kwargs):
         super().update_user_results(user, problem_instance, *args, **kwargs)
-        self.ranking_controller().invalidate_pi(problem_instance)
+        self.ranking_controller().invalidate_user_result(user, problem_instance)
+
+    def bulk_update_user_results(self, user_problem_instance_pairs, *args, **kwargs):
+        pairs = list(user_problem_instance_pairs)
+        super().bulk_update_user_results(pairs, *args, **kwargs)
+        self.ranking_controller().invalidate_user_results(pairs)
 
 
 ContestController.mix_in(RankingMixinForContestController)
@@ -146,7 +160,7 @@ class RankingController(RegisteredSubclassesBase, ObjectWithMixins):
             print(data)
             return mark_safe(html)
 
-        ranking = Ranking.objects.get_or_create(contest=self.contest, key=key)[0]
+        ranking = Ranking.objects.defer("serialized_data", "compact_data", "csv_data").get_or_create(contest=self.contest, key=key)[0]
         try:
             page = ranking.pages.get(nr=page_nr)
         except RankingPage.DoesNotExist:
@@ -155,30 +169,108 @@ class RankingController(RegisteredSubclassesBase, ObjectWithMixins):
                 return mark_safe(render_to_string("rankings/generating_ranking.html"))
             return mark_safe(render_to_string("rankings/no_page.html"))
 
+        html = page.data
+        if page.content_hash:
+            html = self._get_lazily_rendered_page(ranking, page)
         context = {
-            "ranking_html": mark_safe(page.data),
+            "ranking_html": mark_safe(html),
             "is_up_to_date": ranking.is_up_to_date(),
         }
         return mark_safe(render_to_string("rankings/rendered_ranking.html", context))
 
+    def _get_lazily_rendered_page(self, ranking, page):
+        """Renders a page left unrendered by rankingsd, or takes it
+        from the cache.
+
+        The content hash of the page changes together with its data,
+        so the cached html never needs to be invalidated.
+        """
+        permission = self._key_permission(ranking.key)
+        cache_key = f"ranking_page/{ranking.id}/{permission}/{page.nr}/{page.content_hash}/{get_language()}"
+        html = cache.get(cache_key)
+        if html is None:
+            html = self._render_ranking_page(ranking.key, ranking.serialized, page.nr)
+            cache.set(cache_key, html, settings.RANKING_PAGE_CACHE_TIMEOUT)
+        return html
+
     def get_serialized_ranking(self, key):
         return self.serialize_ranking(key)
 
+    def invalidate_user_result(self, user, pi):
+        """Invalidates rankings affected by a change of the result of
+        ``user`` for ``pi``.
+        """
+        self.invalidate_pi(pi)
+
+    def invalidate_user_results(self, user_pi_pairs):
+        """Invalidates rankings affected by changes of the results of
+        the given ``(user, problem_instance)`` pairs.
+        """
+        for pi in {pi for _user, pi in user_pi_pairs}:
+            self.invalidate_pi(pi)
+
+    def _num_pages(self, data):
+        num_participants = len(data["rows"])
+        on_page = data["participants_on_page"]
+        num_pages = (num_participants + on_page - 1) // on_page
+        return max(num_pages, 1)  # Render at least a single page
+
+    def _page_content_hash(self, key, data, page):
+        on_page = data["participants_on_page"]
+        rows = data["rows"][(page - 1) * on_page : page * on_page]
+        rest = {name: value for name, value in data.items() if name != "rows"}
+        content = (key, page, self._num_pages(data), rest, rows)
+        serialized = json.dumps(content, sort_keys=True, default=_content_hash_default)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def _build_page(self, key, data, page):
+        if settings.RANKING_LAZY_RENDERING:
+            return UnrenderedPage(self._page_content_hash(key, data, page))
+        return self._render_ranking_page(key, data, page)
+
     def build_ranking(self, key):
         """Serializes data and renders html for given key.
 
         Results are processed using serialize_ranking, and then as many
         pages as needed are rendered. Returns a tuple containing serialized
         data and a list of strings, that are html code of ranking pages.
+
+        With ``RANKING_LAZY_RENDERING`` the pages are not rendered,
+        instead there is an :class:`~oioioi.rankings.models.UnrenderedPage`
+        for each of them, which is rendered on first access.
         """
         data = self.serialize_ranking(key)
         pages = []
-        num_participants = len(data["rows"])
+        for i in range(1, self._num_pages(data) + 1):
+            pages.append(self._build_page(key, data, i))
+        return data, pages
+
+    def rebuild_ranking(self, key, data, user_ids):
+        """Incremental counterpart of :meth:`build_ranking`.
+
+        ``data`` is the result of the previous serialization of the ranking
+        and ``user_ids`` are the ids of users whose results changed since.
+        Only the pages on which some row changed are rendered, the remaining
+        ones are ``None`` in the returned list.
+
+        Returns None if the ranking can't be updated incrementally.
+        """
+        old_rows = [(row["user"].id, row["place"]) for row in data["rows"]]
+        old_num_pages = self._num_pages(data)
+        data = self.update_serialized_ranking(key, data, user_ids)
+        if data is None:
+            return None
+        new_rows = [(row["user"].id, row["place"]) for row in data["rows"]]
+        num_pages = self._num_pages(data)
         on_page = data["participants_on_page"]
-        num_pages = (num_participants + on_page - 1) // on_page
-        num_pages = max(num_pages, 1)  # Render at least a single page
+        pages = []
         for i in range(1, num_pages + 1):
-            pages.append(self._render_ranking_page(key, data, i))
+            page_rows = slice((i - 1) * on_page, i * on_page)
+            # Pagination links change together with the number of pages.
+            if num_pages != old_num_pages or old_rows[page_rows] != new_rows[page_rows] or any(user_id in user_ids for user_id, _place in new_rows[page_rows]):
+                pages.append(self._build_page(key, data, i))
+            else:
+                pages.append(None)
         return data, pages
 
     def _fake_request(self, page):
@@ -208,6 +300,90 @@ class RankingController(RegisteredSubclassesBase, ObjectWithMixins):
         """
         raise NotImplementedError
 
+    def update_serialized_ranking(self, key, data, user_ids):
+        """Returns ``data`` returned earlier by :meth:`serialize_ranking`
+        updated with the current results of users with ids ``user_ids``.
+
+        Returns None if this is not possible without serializing
+        the whole ranking again, which is the default.
+        """
+        return None
+
+    def render_serialized_ranking_to_csv(self, key, data):
+        """Returns ``data`` returned by :meth:`serialize_ranking` as
+        a CSV file (bytes), which rankingsd stores if
+        ``RANKING_PRECOMPUTE_CSV`` is set, or None if the controller
+        doesn't support it, which is the default.
+        """
+        return None
+
+    def encode_serialized_ranking(self, data):
+        """Returns ``data`` returned by :meth:`serialize_ranking` encoded
+        with :func:`~oioioi.rankings.compact.encode_ranking`, or None if
+        the data can't be represented this way, which is the default.
+        """
+        return None
+
+
+class _CsvLineBuffer:
+    """File-like object for ``unicodecsv.writer``, which makes
+    ``writerow`` return the written line instead of buffering it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _iter_chunks(data, chunk_size=65536):
+    data = memoryview(data)
+    for i in range(0, len(data), chunk_size):
+        yield bytes(data[i : i + chunk_size])
+
+
+# Order of the users with equal scores in rankings.
+_USER_ORDERING = ("last_name", "first_name", "username")
+
+
+def _content_hash_default(value):
+    """Converts objects found in serialized rankings to JSON values for
+    :meth:`RankingController._page_content_hash`.
+
+    Model instances (and other objects) are represented by their public
+    attributes, so related objects are represented by their ids.
+    """
+    if isinstance(value, ScoreValue):
+        return value.serialize()
+    if isinstance(value, Promise):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    if isinstance(value, models.Model):
+        return [value._meta.label, {name: v for name, v in vars(value).items() if not name.startswith("_")}]
+    if hasattr(value, "__dict__"):
+        return [type(value).__qualname__, {name: v for name, v in vars(value).items() if not name.startswith("_")}]
+    return str(value)
+
+
+class _RankingRowOrder:
+    """Sort key ordering ranking rows the same way as serialize_ranking:
+    by the score descending, and then by the position of the user in
+    ``_USER_ORDERING``.
+
+    The positions come from the database, so that the names are compared
+    using its collation, as in serialize_ranking.
+    """
+
+    __slots__ = ("score", "position")
+
+    def __init__(self, score, position):
+        self.score = score
+        self.position = position
+
+    def __lt__(self, other):
+        if self.score != other.score:
+            return self.score > other.score
+        return self.position < other.position
+
 
 class DefaultRankingController(RankingController):
     description = _("Default ranking")
@@ -254,14 +430,26 @@ class DefaultRankingController(RankingController):
     def keys_for_probleminstance(self, pi):
         return self.construct_all_full_keys(self.partial_keys_for_probleminstance(pi))
 
-    def invalidate_pi(self, pi):
-        Ranking.invalidate_queryset(
-            Ranking.objects.filter(
-                contest_id=pi.contest_id,
-                key__in=self.keys_for_probleminstance(pi),
-            )
+    def _rankings_for_probleminstance(self, pi):
+        return Ranking.objects.filter(
+            contest_id=pi.contest_id,
+            key__in=self.keys_for_probleminstance(pi),
         )
 
+    def invalidate_pi(self, pi):
+        Ranking.invalidate_queryset(self._rankings_for_probleminstance(pi))
+
+    def invalidate_user_result(self, user, pi):
+        Ranking.invalidate_queryset_for_results(self._rankings_for_probleminstance(pi), [(user, pi)])
+
+    def invalidate_user_results(self, user_pi_pairs):
+        pairs_by_key = defaultdict(list)
+        for user, pi in user_pi_pairs:
+            for key in self.keys_for_probleminstance(pi):
+                pairs_by_key[key].append((user, pi))
+        rankings = Ranking.objects.filter(contest=self.contest, key__in=list(pairs_by_key))
+        Ranking.invalidate_rankings_for_results({ranking_id: pairs_by_key[key] for ranking_id, key in rankings.values_list("id", "key")})
+
     def can_search_for_users(self):
         return True
 
@@ -271,9 +459,14 @@ class DefaultRankingController(RankingController):
             rows = self.serialize_ranking(key)["rows"]
         else:
             try:
-                ranking = Ranking.objects.get(contest=self.contest, key=key)
+                ranking = Ranking.objects.defer("serialized_data", "csv_data").get(contest=self.contest, key=key)
             except Ranking.DoesNotExist:
                 return None
+            compact = ranking.compact
+            if compact is not None:
+                position = compact.position(user.id)
+                return None if position is None else position + 1
+            # Rankings recalculated before the compact format existed.
             serialized = ranking.serialized or {}
             rows = serialized.get("rows")
             if not rows:  # Ranking isn't ready yet
@@ -285,6 +478,19 @@ class DefaultRankingController(RankingController):
         # User not found
         return None
 
+    def encode_serialized_ranking(self, data):
+        pi_ids = [pi.id for pi, _statement_visible in data["problem_instances"]]
+        rows = [
+            (
+                row["user"].id,
+                row["place"],
+                row["sum"],
+                [r.score if r else None for r in row["results"]],
+            )
+            for row in data["rows"]
+        ]
+        return encode_ranking(pi_ids, rows)
+
     def _render_ranking_page(self, key, data, page):
         request = self._fake_request(page)
         data["is_admin"] = self.is_admin_key(key)
@@ -308,18 +514,49 @@ class DefaultRankingController(RankingController):
         line.append(row["sum"])
         return line
 
+    def _iter_csv_lines(self, key, data):
+        """Yields the lines of the CSV export of ``data`` as bytes."""
+        writer = unicodecsv.writer(_CsvLineBuffer())
+        # The header is translated now, and the rows in the language active
+        # now, as the response is streamed after the view returns.
+        header = writer.writerow(list(map(force_str, self._get_csv_header(key, data))))
+        language = get_language()
+
+        def lines():
+            yield header
+            with translation.override(language):
+                for row in data["rows"]:
+                    yield writer.writerow(list(map(force_str, self._get_csv_row(key, row))))
+
+        return lines()
+
+    def _csv_lines_for_key(self, key):
+        """Returns CSV lines of the ranking, taking them from the data
+        computed by rankingsd if it's up to date.
+        """
+        ranking = Ranking.objects.defer("serialized_data", "compact_data", "csv_data").filter(contest=self.contest, key=key).first()
+        if ranking is not None and ranking.is_up_to_date():
+            if get_language() == settings.LANGUAGE_CODE:
+                csv_data = Ranking.objects.filter(id=ranking.id).values_list("csv_data", flat=True).get()
+                if csv_data:
+                    return _iter_chunks(csv_data)
+            data = ranking.serialized
+            if data is not None:
+                return self._iter_csv_lines(key, data)
+        return self._iter_csv_lines(key, self.serialize_ranking(key))
+
+    def render_serialized_ranking_to_csv(self, key, data):
+        return b"".join(self._iter_csv_lines(key, data))
+
     def render_ranking_to_csv(self, request, partial_key):
         key = self.get_full_key(request, partial_key)
-        data = self.serialize_ranking(key)
+        if getattr(settings, "MOCK_RANKINGSD", False):
+            lines = self._iter_csv_lines(key, self.serialize_ranking(key))
+        else:
+            lines = self._csv_lines_for_key(key)
 
-        response = HttpResponse(content_type="text/csv")
+        response = StreamingHttpResponse(lines, content_type="text/csv")
         response["Content-Disposition"] = make_content_disposition_header("attachment", "{}-{}-{}.csv".format(_("ranking"), self.contest.id, key))
-        writer = unicodecsv.writer(response)
-
-        writer.writerow(list(map(force_str, self._get_csv_header(key, data))))
-        for row in data["rows"]:
-            writer.writerow(list(map(force_str, self._get_csv_row(key, row))))
-
         return response
 
     def filter_users_for_ranking(self, key, queryset):
@@ -338,7 +575,7 @@ class DefaultRankingController(RankingController):
         users = users.filter(id__in=list(by_user.keys()))
         data = []
         all_rounds_trial = all(r.is_trial for r in rounds)
-        for user in users.order_by("last_name", "first_name", "username"):
+        for user in users.order_by(*_USER_ORDERING):
             by_user_row = by_user[user.id]
             user_results = []
             user_data = {"user": user, "results": user_results, "sum": None}
@@ -376,6 +613,9 @@ class DefaultRankingController(RankingController):
         returned.
         """
         data.sort(key=extractor, reverse=True)
+        self._number_places(data, extractor)
+
+    def _number_places(self, data, extractor):
         prev_sum = None
         place = None
         for i, row in enumerate(data, 1):
@@ -396,19 +636,26 @@ class DefaultRankingController(RankingController):
         context = ContestControllerContext(self.contest, now, False)
         return [(pi, self._is_problem_statement_visible(context, key, pi, now)) for pi in pis]
 
-    def serialize_ranking(self, key):
+    def _get_ranking_scope(self, key):
         partial_key = self.get_partial_key(key)
         rounds = list(self._rounds_for_key(key))
         pis = list(
             self._filter_pis_for_ranking(partial_key, ProblemInstance.objects.filter(round__in=rounds)).select_related("problem").prefetch_related("round")
         )
         users = self.filter_users_for_ranking(key, User.objects.all()).distinct()
-        results = (
+        return rounds, pis, users
+
+    def _get_results_for_ranking(self, pis, users):
+        return (
             UserResultForProblem.objects.filter(problem_instance__in=pis, user__in=users)
             .prefetch_related("problem_instance__round")
             .select_related("submission_report", "problem_instance", "problem_instance__contest")
         )
 
+    def serialize_ranking(self, key):
+        rounds, pis, users = self._get_ranking_scope(key)
+        results = self._get_results_for_ranking(pis, users)
+
         data = self._get_users_results(pis, results, rounds, users)
         self._assign_places(data, itemgetter("sum"))
         return {
@@ -417,6 +664,42 @@ class DefaultRankingController(RankingController):
             "participants_on_page": getattr(settings, "PARTICIPANTS_ON_PAGE", 100),
         }
 
+    def update_serialized_ranking(self, key, data, user_ids):
+        rounds, pis, users = self._get_ranking_scope(key)
+        problem_instances = self._get_pis_with_visibility(key, pis)
+        participants_on_page = getattr(settings, "PARTICIPANTS_ON_PAGE", 100)
+        # Columns of the ranking changed, so every row has to be rebuilt.
+        if [(pi.id, visible) for pi, visible in problem_instances] != [(pi.id, visible) for pi, visible in data["problem_instances"]]:
+            return None
+        if participants_on_page != data["participants_on_page"]:
+            return None
+
+        positions = {user_id: position for position, user_id in enumerate(users.order_by(*_USER_ORDERING).values_list("id", flat=True))}
+        rows = [row for row in data["rows"] if row["user"].id not in user_ids]
+        # Someone is no longer in the ranking.
+        if any(row["user"].id not in positions for row in rows):
+            return None
+
+        users = users.filter(id__in=user_ids)
+        results = self._get_results_for_ranking(pis, users)
+        changed_rows = self._get_users_results(pis, results, rounds, users)
+
+        # The remaining rows are still sorted, so the changed ones are
+        # put in their places with a binary search.
+        extractor = itemgetter("sum")
+
+        def order(row):
+            return _RankingRowOrder(extractor(row), positions[row["user"].id])
+
+        for row in changed_rows:
+            bisect.insort(rows, row, key=order)
+        self._number_places(rows, extractor)
+        return {
+            "rows": rows,
+            "problem_instances": problem_instances,
+            "participants_on_page": participants_on_page,
+        }
+
 
 def update_rankings_with_user_callback(sender, user, **kwargs):
     contests = Contest.objects.filter(probleminstance__submission__user=user)
@@ -1,10 +1,106 @@
+import logging
+import multiprocessing
+import multiprocessing.connection
 import time
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Min
+from django.utils import timezone
 from django.utils.translation import gettext as _
 
-from oioioi.rankings.models import choose_for_recalculation, recalculate
+from oioioi.rankings.models import (
+    Ranking,
+    choose_for_recalculation,
+    recalculate,
+    recalculation_queue_stats,
+)
+from oioioi.rankings.wakeup import get_wakeup_channel
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerMetrics:
+    """Statistics of a single rankingsd worker, reported to the log every
+    ``RANKINGSD_METRICS_INTERVAL`` seconds.
+    """
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.reset()
+
+    def reset(self):
+        self.recalculations = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.cooldown_waits = 0
+        self.last_report = time.monotonic()
+
+    def recalculated(self, latency):
+        self.recalculations += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def report_if_needed(self):
+        if time.monotonic() - self.last_report < settings.RANKINGSD_METRICS_INTERVAL:
+            return
+        stats = recalculation_queue_stats()
+        avg_latency = self.total_latency / self.recalculations if self.recalculations else 0.0
+        logger.info(
+            "rankingsd worker %d: queue depth %d, cooling down %d, %d recalculations (avg %.2fs, max %.2fs), %d cooldown waits",
+            self.worker_id,
+            stats["queued"],
+            stats["cooling_down"],
+            self.recalculations,
+            avg_latency,
+            self.max_latency,
+            self.cooldown_waits,
+        )
+        self.reset()
+
+
+def _seconds_to_cooldown_end():
+    """Returns the number of seconds after which some invalidated ranking
+    will be ready for recalculation, or None if there is no such ranking.
+    """
+    cooldown_date = Ranking.objects.filter(needs_recalculation=True, recalc_in_progress=None).aggregate(Min("cooldown_date"))["cooldown_date__min"]
+    if cooldown_date is None:
+        return None
+    return max((cooldown_date - timezone.now()).total_seconds(), 0)
+
+
+def run_worker(worker_id):
+    metrics = WorkerMetrics(worker_id)
+    channel = get_wakeup_channel()
+    # Listen before the first poll, so no invalidation can be missed.
+    channel.listen(worker_id)
+    # Monotonic time of the nearest end of a cooldown (None if no ranking
+    # is cooling down). It changes only when rankings are invalidated or
+    # recalculated, so it is cached until then or until it passes.
+    cooldown_end = None
+    cooldown_known = False
+    while True:
+        r = choose_for_recalculation()
+        if r:
+            start = time.monotonic()
+            recalculate(r)
+            metrics.recalculated(time.monotonic() - start)
+            cooldown_known = False
+        else:
+            now = time.monotonic()
+            if not cooldown_known or (cooldown_end is not None and cooldown_end <= now):
+                seconds = _seconds_to_cooldown_end()
+                cooldown_end = None if seconds is None else now + seconds
+                cooldown_known = True
+            timeout = channel.fallback_interval()
+            if cooldown_end is not None:
+                metrics.cooldown_waits += 1
+                # A ranking leaving cooldown doesn't notify anyone.
+                timeout = min(timeout, max(cooldown_end - now, 0) + settings.RANKINGSD_POLLING_INTERVAL)
+            if channel.wait(timeout):
+                cooldown_known = False
+        metrics.report_if_needed()
 
 
 class Command(BaseCommand):
@@ -17,10 +113,28 @@ class Command(BaseCommand):
         "with cooldown."
     )
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes recalculating rankings concurrently, RANKINGSD_CONCURRENCY in the supervisord configuration",
+        )
+
     def handle(self, *args, **options):
-        while True:
-            r = choose_for_recalculation()
-            if r:
-                recalculate(r)
-            else:
-                time.sleep(settings.RANKINGSD_POLLING_INTERVAL)
+        workers = options["workers"]
+        if workers <= 1:
+            run_worker(0)
+            return
+
+        # Forked workers must not share database connections.
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=run_worker, args=(worker_id,), daemon=True) for worker_id in range(workers)]
+        for process in processes:
+            process.start()
+        # Workers run forever, so we get here only if one of them died.
+        multiprocessing.connection.wait([process.sentinel for process in processes])
+        for process in processes:
+            process.terminate()
+        raise CommandError("A rankingsd worker died unexpectedly")
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contests', '0025_merge_0017_submission_max_score_0024_roundstartdelay'),
+        ('rankings', '0004_rankingmessage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ranking',
+            name='needs_full_recalculation',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='rankingrecalc',
+            name='full_recalculation',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='RankingChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('problem_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contests.probleminstance')),
+                ('ranking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='rankings.ranking')),
+                ('recalc', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='rankings.rankingrecalc')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankings', '0005_ranking_needs_full_recalculation_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ranking',
+            name='compact_data',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankings', '0006_ranking_compact_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rankingpage',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
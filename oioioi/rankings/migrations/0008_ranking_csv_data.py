@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankings', '0007_rankingpage_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ranking',
+            name='csv_data',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -1,18 +1,25 @@
 import logging
 import pickle
+from collections import namedtuple
 from datetime import timedelta  # pylint: disable=E0611
 
 from django.conf import settings
-from django.db import models, transaction
-from django.utils import timezone
+from django.contrib.auth.models import User
+from django.db import connection, models, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone, translation
 from django.utils.translation import gettext_lazy as _
 
 from oioioi.base.models import PublicMessage
-from oioioi.contests.models import Contest
+from oioioi.contests.models import Contest, ProblemInstance
+from oioioi.rankings.compact import CompactRanking
+from oioioi.rankings.wakeup import wake_up_rankingsd
 
 
 class RankingRecalc(models.Model):
-    pass
+    # whether the ranking must be built from scratch, or can be updated
+    # using the RankingChanges assigned to this recalculation
+    full_recalculation = models.BooleanField(default=True)
 
 
 class Ranking(models.Model):
@@ -30,7 +37,8 @@ class Ranking(models.Model):
     Invalidation is handled explicitly. We assume our ranking is valid,
     until someone else (probably ContestController and friends) tells us
     that something changed. Then the ranking is marked as invalid (not up
-    to date) with the help of invalidate_* methods.
+    to date) with the help of invalidate_* methods, which also wake up
+    rankingsd (see oioioi.rankings.wakeup).
 
     We use _cooldown_ strategy of recalculation. Anytime we regenerate
     ranking we set a cooldown, based on how much time the previous
@@ -67,6 +75,17 @@ class Ranking(models.Model):
     RANKING_MIN_COOLDOWN - minimum cooldown duration (safety limit)
     RANKING_MAX_COOLDOWN - maximum cooldown duration (safety limit)
 
+    If the only thing that changed since the last recalculation are results
+    of some users (see invalidate_queryset_for_results), the ranking is
+    recalculated incrementally -- only the rows of those users are updated
+    in the serialized data and only the pages whose rows moved are rendered
+    again. Any other invalidation forces a full recalculation.
+
+    The incremental recalculation can be configured by setting:
+    RANKING_MAX_INCREMENTAL_CHANGES - maximum number of users with changed
+                                      results for which the ranking is still
+                                      updated incrementally, 0 disables it
+
     NOTE: We use the local time (and not the database time), for all time
     calculations, including the cooldowns, so be careful about drastic
     changes of system time on the generating machine.
@@ -84,10 +103,15 @@ class Ranking(models.Model):
 
     # internal, use serialized instead
     serialized_data = models.BinaryField(null=True)
+    # internal, use compact instead
+    compact_data = models.BinaryField(null=True)
+    # CSV export in settings.LANGUAGE_CODE, see RANKING_PRECOMPUTE_CSV
+    csv_data = models.BinaryField(null=True)
 
     # internal to ranking recalculation mechanism
     # use invalidate_* and is_up_to_date instead
     needs_recalculation = models.BooleanField(default=True)
+    needs_full_recalculation = models.BooleanField(default=True)
     cooldown_date = models.DateTimeField(auto_now_add=True)
     recalc_in_progress = models.ForeignKey(RankingRecalc, null=True, on_delete=models.SET_NULL)
 
@@ -99,6 +123,20 @@ class Ranking(models.Model):
 
         return pickle.loads(self.serialized_data)
 
+    @property
+    def compact(self):
+        """:class:`~oioioi.rankings.compact.CompactRanking` of this ranking,
+        if its controller supports it.
+
+        It's much cheaper to load than :attr:`serialized`, so prefer it
+        if you don't need the model instances (use ``defer("serialized_data")``
+        when querying).
+        """
+        if not self.compact_data:
+            return None
+
+        return CompactRanking(self.compact_data)
+
     def controller(self):
         """RankingController of the contest"""
         return self.contest.controller.ranking_controller()
@@ -106,7 +144,41 @@ class Ranking(models.Model):
     @classmethod
     def invalidate_queryset(cls, qs):
         """Marks queryset of rankings as invalid"""
-        qs.all().update(needs_recalculation=True, invalidation_date=timezone.now())
+        qs.all().update(
+            needs_recalculation=True,
+            needs_full_recalculation=True,
+            invalidation_date=timezone.now(),
+        )
+        wake_up_rankingsd()
+
+    @classmethod
+    def invalidate_queryset_for_results(cls, qs, user_pi_pairs):
+        """Marks queryset of rankings as invalid, because the results of
+        the given ``(user, problem_instance)`` pairs changed.
+
+        Such rankings may be recalculated incrementally.
+        """
+        cls.invalidate_rankings_for_results(dict.fromkeys(qs.values_list("id", flat=True), user_pi_pairs))
+
+    @classmethod
+    @transaction.atomic
+    def invalidate_rankings_for_results(cls, pairs_by_ranking):
+        """Like :meth:`invalidate_queryset_for_results`, but takes a dict
+        mapping ids of rankings to the changed ``(user, problem_instance)``
+        pairs, so the invalidation of many rankings with different changes
+        takes a constant number of queries.
+        """
+        if not pairs_by_ranking:
+            return
+        cls.objects.filter(id__in=list(pairs_by_ranking)).update(needs_recalculation=True, invalidation_date=timezone.now())
+        RankingChange.objects.bulk_create(
+            [
+                RankingChange(ranking_id=ranking_id, user=user, problem_instance=problem_instance)
+                for ranking_id, user_pi_pairs in pairs_by_ranking.items()
+                for user, problem_instance in user_pi_pairs
+            ]
+        )
+        wake_up_rankingsd()
 
     @classmethod
     def invalidate_contest(cls, contest):
@@ -132,6 +204,26 @@ class RankingPage(models.Model):
     ranking = models.ForeignKey(Ranking, related_name="pages", on_delete=models.CASCADE)
     nr = models.IntegerField()
     data = models.TextField()
+    # Set instead of data for pages rendered on first access
+    # (see RANKING_LAZY_RENDERING).
+    content_hash = models.CharField(max_length=64, blank=True)
+
+
+#: Page of a ranking which is not rendered by rankingsd, but on first access.
+UnrenderedPage = namedtuple("UnrenderedPage", "content_hash")
+
+
+class RankingChange(models.Model):
+    """Result of a user for a problem instance, which changed since
+    the last recalculation of a ranking.
+
+    Changes not yet taken by any recalculation have ``recalc`` set to None.
+    """
+
+    ranking = models.ForeignKey(Ranking, related_name="changes", on_delete=models.CASCADE)
+    recalc = models.ForeignKey(RankingRecalc, null=True, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    problem_instance = models.ForeignKey(ProblemInstance, on_delete=models.CASCADE)
 
 
 def clamp(minimum, x, maximum):
@@ -140,15 +232,24 @@ def clamp(minimum, x, maximum):
 
 @transaction.atomic
 def choose_for_recalculation():
+    """Claims a ranking for recalculation, returns its RankingRecalc.
+
+    Many rankingsd workers may claim rankings concurrently. Rankings of
+    contests which have no recalculation in progress go first, so that
+    a single huge contest doesn't keep all the workers busy, and then
+    the least recently recalculated ones.
+    """
     now = timezone.now()
+    contest_busy = Ranking.objects.filter(contest=OuterRef("contest"), recalc_in_progress__isnull=False)
     r = (
         Ranking.objects.filter(
             needs_recalculation=True,
             cooldown_date__lt=now,
             recalc_in_progress=None,
         )
-        .order_by("last_recalculation_date")
-        .select_for_update()
+        .annotate(contest_busy=Exists(contest_busy))
+        .order_by("contest_busy", "last_recalculation_date")
+        .select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
         .first()
     )
     if r is None:
@@ -159,24 +260,50 @@ def choose_for_recalculation():
         timedelta(seconds=settings.RANKING_MAX_COOLDOWN),
     )
     r.cooldown_date = now + cooldown_duration
-    r.needs_recalculation = False
-    recalc = RankingRecalc()
+    recalc = RankingRecalc(full_recalculation=r.needs_full_recalculation)
     recalc.save()
+    r.needs_recalculation = False
+    r.needs_full_recalculation = False
     r.recalc_in_progress = recalc
     r.save()
+    r.changes.filter(recalc=None).update(recalc=recalc)
     return recalc
 
 
+def recalculation_queue_stats():
+    """Returns numbers of invalidated rankings which are waiting for
+    a worker (``queued``) and for the end of their cooldown
+    (``cooling_down``).
+    """
+    now = timezone.now()
+    waiting = Ranking.objects.filter(needs_recalculation=True, recalc_in_progress=None)
+    return {
+        "queued": waiting.filter(cooldown_date__lt=now).count(),
+        "cooling_down": waiting.filter(cooldown_date__gte=now).count(),
+    }
+
+
 @transaction.atomic
 def save_pages(ranking, pages_list):
-    ranking.pages.all().delete()
-    for nr, page_data in enumerate(pages_list, 1):
-        page = RankingPage(ranking=ranking, nr=nr, data=page_data)
-        page.save()
+    """Stores pages of the ranking.
+
+    Elements of ``pages_list`` are rendered html, :class:`UnrenderedPage`
+    or ``None``, which means that the page hasn't changed and its previous
+    version should be kept.
+    """
+    changed = {nr: page_data for nr, page_data in enumerate(pages_list, 1) if page_data is not None}
+    ranking.pages.filter(models.Q(nr__gt=len(pages_list)) | models.Q(nr__in=list(changed))).delete()
+    pages = []
+    for nr, page_data in changed.items():
+        if isinstance(page_data, UnrenderedPage):
+            pages.append(RankingPage(ranking=ranking, nr=nr, data="", content_hash=page_data.content_hash))
+        else:
+            pages.append(RankingPage(ranking=ranking, nr=nr, data=page_data))
+    RankingPage.objects.bulk_create(pages)
 
 
 @transaction.atomic
-def save_recalc_results(recalc, date_before, date_after, serialized, pages_list, cooldown_date):
+def save_recalc_results(recalc, date_before, date_after, serialized, pages_list, cooldown_date, compact=None, csv=None):
     try:
         r = Ranking.objects.filter(recalc_in_progress=recalc).select_for_update().get()
     except Ranking.DoesNotExist:
@@ -184,7 +311,12 @@ def save_recalc_results(recalc, date_before, date_after, serialized, pages_list,
     if serialized is not None:
         assert pages_list is not None
         r.serialized_data = pickle.dumps(serialized)
+        r.compact_data = compact
+        r.csv_data = csv
         save_pages(r, pages_list)
+    else:
+        # Changes taken by this recalculation are lost together with it.
+        r.needs_full_recalculation = True
     r.last_recalculation_date = date_before
     r.last_recalculation_duration = date_after - date_before
     old_recalc = r.recalc_in_progress
@@ -195,6 +327,16 @@ def save_recalc_results(recalc, date_before, date_after, serialized, pages_list,
     old_recalc.delete()
 
 
+def _recalculate_incrementally(ranking, recalc, ranking_controller):
+    serialized = ranking.serialized
+    if serialized is None:
+        return None
+    user_ids = set(RankingChange.objects.filter(recalc=recalc).values_list("user_id", flat=True))
+    if not user_ids or len(user_ids) > settings.RANKING_MAX_INCREMENTAL_CHANGES:
+        return None
+    return ranking_controller.rebuild_ranking(ranking.key, serialized, user_ids)
+
+
 def recalculate(recalc):
     date_before = timezone.now()
     try:
@@ -203,7 +345,17 @@ def recalculate(recalc):
         return
     ranking_controller = r.controller()
     try:
-        serialized, pages_list = ranking_controller.build_ranking(r.key)
+        result = None
+        if not recalc.full_recalculation:
+            result = _recalculate_incrementally(r, recalc, ranking_controller)
+        if result is None:
+            result = ranking_controller.build_ranking(r.key)
+        serialized, pages_list = result
+        compact = ranking_controller.encode_serialized_ranking(serialized)
+        csv = None
+        if settings.RANKING_PRECOMPUTE_CSV:
+            with translation.override(settings.LANGUAGE_CODE):
+                csv = ranking_controller.render_serialized_ranking_to_csv(r.key, serialized)
         cooldown_date = None
     except Exception as e:
         if getattr(settings, "MOCK_RANKINGSD", False):
@@ -212,9 +364,9 @@ def recalculate(recalc):
         logger.exception("An error occurred while recalculating ranking", exc_info=e)
         cooldown_duration = timedelta(seconds=settings.RANKING_ERROR_COOLDOWN)
         cooldown_date = timezone.now() + cooldown_duration
-        serialized, pages_list = (None, None)
+        serialized, pages_list, compact, csv = (None, None, None, None)
     date_after = timezone.now()
-    save_recalc_results(recalc, date_before, date_after, serialized, pages_list, cooldown_date)
+    save_recalc_results(recalc, date_before, date_after, serialized, pages_list, cooldown_date, compact, csv)
 
 
 class RankingMessage(PublicMessage):
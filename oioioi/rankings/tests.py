@@ -1,5 +1,10 @@
+import pickle
 import re
+import shutil
+import tempfile
+import time
 from datetime import UTC, datetime  # pylint: disable=E0611
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -15,19 +20,30 @@ from oioioi.base.tests import (
     fake_timezone_now,
 )
 from oioioi.base.tests.tests import TestPublicMessage
-from oioioi.contests.models import Contest, ProblemInstance, Round, UserResultForProblem
+from oioioi.contests.models import (
+    Contest,
+    ProblemInstance,
+    Round,
+    UserResultForContest,
+    UserResultForProblem,
+    UserResultForRound,
+)
 from oioioi.contests.scores import IntegerScore
 from oioioi.pa.score import PAScore
 from oioioi.programs.controllers import ProgrammingContestController
-from oioioi.rankings.controllers import DefaultRankingController
+from oioioi.rankings.compact import CompactRanking, encode_ranking
+from oioioi.rankings.controllers import CONTEST_RANKING_KEY, DefaultRankingController
+from oioioi.rankings.management.commands import rankingsd
 from oioioi.rankings.models import (
     Ranking,
+    RankingChange,
     RankingMessage,
     RankingPage,
     RankingRecalc,
     choose_for_recalculation,
     recalculate,
 )
+from oioioi.rankings.wakeup import InProcessWakeupChannel, LocalSocketWakeupChannel
 
 VISIBLE_TASKS = ["zad1", "zad2"]
 HIDDEN_TASKS = ["zad3", "zad4"]
@@ -247,22 +263,22 @@ class TestRankingViews(TestCase):
         self.assertTrue(self.client.login(username="test_admin"))
         with fake_time(datetime(2012, 8, 5, tzinfo=UTC)):
             response = self.client.get(url)
-            self.assertContains(response, "User,")
+            content = b"".join(response.streaming_content).decode("utf-8")
+            self.assertIn("User,", content)
             # Check that Admin is filtered out.
-            self.assertNotContains(response, "Admin")
+            self.assertNotIn("Admin", content)
 
             expected_order = ["Test,User", "Test,User 2"]
             prev_pos = 0
-            content = response.content.decode("utf-8")
             for user in expected_order:
                 pattern = f"{user},"
-                self.assertContains(response, user)
+                self.assertIn(user, content)
                 pos = content.find(pattern)
                 self.assertGreater(pos, prev_pos, msg=(f"User {user} has incorrect position"))
                 prev_pos = pos
 
             for task in ["zad1", "zad2", "zad3", "zad3"]:
-                self.assertContains(response, task)
+                self.assertIn(task, content)
 
             response = self.client.get(reverse("ranking", kwargs={"contest_id": contest.id, "key": "1"}))
             self.assertContains(response, "zad1")
@@ -336,6 +352,9 @@ class MockRankingController(DefaultRankingController):
         assert key == "key"
         return self.recalculation_result
 
+    def encode_serialized_ranking(self, data):
+        return None
+
 
 class MockRankingContestController(ProgrammingContestController):
     def ranking_controller(self):
@@ -452,6 +471,131 @@ class TestRecalc(TestCase):
         recalc = choose_for_recalculation()
         self.assertIsNotNone(recalc)
 
+    def test_fair_choice_between_contests(self):
+        contest = Contest.objects.get()
+        other_contest = Contest.objects.create(id="other", name="Other", controller_name=contest.controller_name)
+
+        def make_ranking(contest, key, year):
+            date = datetime(year, 1, 1, tzinfo=UTC)
+            ranking = Ranking.objects.create(contest=contest, key=key)
+            Ranking.objects.filter(id=ranking.id).update(cooldown_date=date, last_recalculation_date=date)
+            return ranking
+
+        busy = make_ranking(contest, "admin#c", 2000)
+        make_ranking(contest, "regular#c", 2001)
+        idle = make_ranking(other_contest, "regular#c", 2002)
+
+        recalc = choose_for_recalculation()
+        self.assertEqual(Ranking.objects.get(recalc_in_progress=recalc), busy)
+        # The other contest goes first, even though its ranking was
+        # recalculated more recently.
+        recalc = choose_for_recalculation()
+        self.assertEqual(Ranking.objects.get(recalc_in_progress=recalc), idle)
+
+    @override_settings(RANKING_MIN_COOLDOWN=0, PARTICIPANTS_ON_PAGE=1)
+    def test_incremental_recalculation(self):
+        contest = Contest.objects.get()
+        rc = contest.controller.ranking_controller()
+        key = "admin#" + CONTEST_RANKING_KEY
+        ranking = Ranking.objects.create(contest=contest, key=key)
+
+        def recalculate_ranking():
+            Ranking.objects.update(cooldown_date=datetime(2000, 1, 1, tzinfo=UTC))
+            recalc = choose_for_recalculation()
+            self.assertIsNotNone(recalc)
+            full = recalc.full_recalculation
+            recalculate(recalc)
+            ranking.refresh_from_db()
+            self.assertTrue(ranking.is_up_to_date())
+            return full
+
+        def ranking_rows(data):
+            return [(row["user"].id, row["place"], row["sum"]) for row in data["rows"]]
+
+        self.assertTrue(recalculate_ranking())
+        pages = {page.nr: page.id for page in ranking.pages.all()}
+        self.assertGreater(len(pages), 1)
+
+        result = UserResultForProblem.objects.order_by("score").first()
+        result.score = IntegerScore(1000)
+        result.save()
+        rc.invalidate_user_result(result.user, result.problem_instance)
+        self.assertEqual(RankingChange.objects.filter(ranking=ranking).count(), 1)
+
+        self.assertFalse(recalculate_ranking())
+        self.assertFalse(RankingChange.objects.exists())
+        self.assertEqual(ranking_rows(ranking.serialized), ranking_rows(rc.serialize_ranking(key)))
+        self.assertEqual(ranking.serialized["rows"][0]["user"], result.user)
+        # Only the pages whose rows changed are rendered again.
+        self.assertNotEqual({page.nr: page.id for page in ranking.pages.all()}, pages)
+        self.assertEqual(ranking.pages.count(), len(pages))
+
+        compact = ranking.compact
+        self.assertEqual(compact.user_ids, [row[0] for row in ranking_rows(ranking.serialized)])
+        self.assertEqual(compact.position(result.user_id), 0)
+
+        Ranking.invalidate_contest(contest)
+        self.assertTrue(recalculate_ranking())
+
+    @override_settings(RANKING_MIN_COOLDOWN=0)
+    def test_incremental_recalculation_with_ties(self):
+        contest = Contest.objects.get()
+        rc = contest.controller.ranking_controller()
+        key = "admin#" + CONTEST_RANKING_KEY
+        ranking = Ranking.objects.create(contest=contest, key=key)
+        # Names which the database may order differently than Python.
+        for user, last_name in zip(User.objects.order_by("id"), ["b", "C", "a", "B", "c"], strict=False):
+            user.last_name = last_name
+            user.save()
+
+        def recalculate_ranking():
+            Ranking.objects.update(cooldown_date=datetime(2000, 1, 1, tzinfo=UTC))
+            recalc = choose_for_recalculation()
+            full = recalc.full_recalculation
+            recalculate(recalc)
+            ranking.refresh_from_db()
+            return full
+
+        self.assertTrue(recalculate_ranking())
+        # Everyone gets the same sum.
+        seen_users = set()
+        for result in UserResultForProblem.objects.order_by("id"):
+            result.score = IntegerScore(0 if result.user_id in seen_users else 10)
+            result.save()
+            seen_users.add(result.user_id)
+            rc.invalidate_user_result(result.user, result.problem_instance)
+        self.assertFalse(recalculate_ranking())
+
+        rows = [(row["user"].id, row["place"], row["sum"]) for row in ranking.serialized["rows"]]
+        self.assertEqual({row[1] for row in rows}, {1})
+        self.assertEqual(rows, [(row["user"].id, row["place"], row["sum"]) for row in rc.serialize_ranking(key)["rows"]])
+
+    def test_bulk_update_user_results(self):
+        contest = Contest.objects.get()
+        pi = ProblemInstance.objects.get(pk=1)
+        users = list(User.objects.filter(username__in=["test_user", "test_user2"]))
+        ranking = Ranking.objects.create(contest=contest, key="admin#" + CONTEST_RANKING_KEY, needs_recalculation=False)
+
+        def user_results():
+            return [
+                sorted((r.user_id, r.problem_instance_id, r.score, r.status) for r in UserResultForProblem.objects.all()),
+                sorted((r.user_id, r.round_id, r.score) for r in UserResultForRound.objects.all()),
+                sorted((r.user_id, r.contest_id, r.score) for r in UserResultForContest.objects.all()),
+            ]
+
+        contest.controller.bulk_update_user_results([(user, pi) for user in users])
+        ranking.refresh_from_db()
+        self.assertTrue(ranking.needs_recalculation)
+        self.assertEqual(
+            sorted(RankingChange.objects.filter(ranking=ranking).values_list("user_id", flat=True)),
+            sorted(user.id for user in users),
+        )
+
+        results = user_results()
+        for user in users:
+            contest.controller.update_user_results(user, pi)
+        self.assertEqual(user_results(), results)
+
     def test_null_checking(self):
         contest = Contest.objects.get()
         ranking, _ = Ranking.objects.get_or_create(contest=contest, key="key")
@@ -557,6 +701,177 @@ class TestRankingsdFrontend(TestCase):
         self.assertContains(response, "You have requested a non-existent ranking page")
 
 
+class TestCompactRanking(TestCase):
+    def test_encode_decode(self):
+        user_ids = [17, 3, 1025, 9, 1]
+        rows = [(user_id, place, IntegerScore(100 - place), [IntegerScore(place), None]) for place, user_id in enumerate(user_ids, 1)]
+        compact = CompactRanking(encode_ranking([4, 2], rows))
+
+        self.assertEqual(compact.pi_ids, [4, 2])
+        self.assertEqual(compact.user_ids, user_ids)
+        self.assertEqual(compact.places, [1, 2, 3, 4, 5])
+        self.assertEqual(compact.sums, [row[2] for row in rows])
+        self.assertEqual(compact.scores(1), [None] * len(rows))
+        self.assertEqual(compact.row(2), rows[2])
+        for position, user_id in enumerate(user_ids):
+            self.assertEqual(compact.position(user_id), position)
+        self.assertIsNone(compact.position(2))
+        self.assertIsNone(compact.position(1024))
+
+    def test_empty(self):
+        compact = CompactRanking(encode_ranking([], []))
+        self.assertEqual(compact.user_ids, [])
+        self.assertIsNone(compact.position(1))
+
+    def test_unknown_version(self):
+        data = bytearray(encode_ranking([], []))
+        data[4] += 1
+        with self.assertRaises(ValueError):
+            CompactRanking(bytes(data))
+
+
+class TestWakeupChannels(TestCase):
+    fixtures = ["test_contest"]
+
+    def assertWakesUp(self, channel, timeout=10):
+        start = time.monotonic()
+        self.assertTrue(channel.wait(timeout))
+        self.assertLess(time.monotonic() - start, timeout / 2)
+
+    @override_settings(RANKINGSD_WAKEUP_CHANNEL="oioioi.rankings.wakeup.InProcessWakeupChannel")
+    def test_invalidation_wakes_up_rankingsd(self):
+        contest = Contest.objects.get()
+        channel = InProcessWakeupChannel()
+        channel.listen(0)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Ranking.invalidate_contest(contest)
+        self.assertEqual(len(callbacks), 1)
+        self.assertWakesUp(channel)
+
+    def test_local_socket_channel(self):
+        socket_dir = tempfile.mkdtemp()
+        try:
+            with override_settings(RANKINGSD_WAKEUP_SOCKET_DIR=socket_dir):
+                channels = [LocalSocketWakeupChannel() for _ in range(2)]
+                for worker_id, channel in enumerate(channels):
+                    channel.listen(worker_id)
+                LocalSocketWakeupChannel().notify()
+                for channel in channels:
+                    self.assertWakesUp(channel)
+                    channel.socket.close()
+        finally:
+            shutil.rmtree(socket_dir)
+
+    def test_cooldown_end_cached(self):
+        class StopWorker(Exception):
+            pass
+
+        class FakeChannel(InProcessWakeupChannel):
+            def __init__(self, notifications):
+                self.notifications = notifications
+                self.timeouts = []
+
+            def wait(self, timeout):
+                self.timeouts.append(timeout)
+                if not self.notifications:
+                    raise StopWorker
+                return self.notifications.pop(0)
+
+        channel = FakeChannel([False, False, True, False])
+        with (
+            mock.patch.object(rankingsd, "get_wakeup_channel", return_value=channel),
+            mock.patch.object(rankingsd, "choose_for_recalculation", return_value=None),
+            mock.patch.object(rankingsd, "_seconds_to_cooldown_end", return_value=3600) as seconds_to_cooldown_end,
+            override_settings(RANKINGSD_FALLBACK_POLLING_INTERVAL=60),
+            self.assertRaises(StopWorker),
+        ):
+            rankingsd.run_worker(0)
+        # Queried at the start and after the notification only.
+        self.assertEqual(seconds_to_cooldown_end.call_count, 2)
+        self.assertEqual(channel.timeouts, [60] * 5)
+
+
+class TestLazyRankingRendering(TestCase):
+    fixtures = [
+        "test_users",
+        "test_contest",
+        "test_full_package",
+        "test_problem_instance",
+        "test_submission",
+    ]
+
+    @override_settings(MOCK_RANKINGSD=False, RANKING_LAZY_RENDERING=True)
+    def test_render_on_first_access(self):
+        contest = Contest.objects.get()
+        self.assertTrue(self.client.login(username="test_admin"))
+        ranking_url = reverse("ranking", kwargs={"contest_id": contest.id, "key": CONTEST_RANKING_KEY})
+        self.client.get(ranking_url)
+
+        ranking = Ranking.objects.get()
+        Ranking.objects.update(cooldown_date=datetime(2000, 1, 1, tzinfo=UTC))
+        recalculate(choose_for_recalculation())
+        page = ranking.pages.get()
+        self.assertEqual(page.data, "")
+        self.assertTrue(page.content_hash)
+
+        user = User.objects.get(username="test_user")
+        response = self.client.get(ranking_url)
+        self.assertContains(response, f"ranking_row_{user.id}")
+        # The second time the page is taken from the cache, so the serialized
+        # ranking isn't needed.
+        Ranking.objects.update(serialized_data=None)
+        response = self.client.get(ranking_url)
+        self.assertContains(response, f"ranking_row_{user.id}")
+
+    def test_page_content_hash(self):
+        contest = Contest.objects.get()
+        rc = contest.controller.ranking_controller()
+        key = "admin#" + CONTEST_RANKING_KEY
+        data = rc.serialize_ranking(key)
+        content_hash = rc._page_content_hash(key, data, 1)
+        # Doesn't depend on how the objects were created.
+        self.assertEqual(rc._page_content_hash(key, pickle.loads(pickle.dumps(data)), 1), content_hash)
+        self.assertEqual(rc._page_content_hash(key, rc.serialize_ranking(key), 1), content_hash)
+
+        data["rows"][0]["user"].first_name = "Changed"
+        self.assertNotEqual(rc._page_content_hash(key, data, 1), content_hash)
+
+
+class TestRankingCsvExport(TestCase):
+    fixtures = [
+        "test_users",
+        "test_contest",
+        "test_full_package",
+        "test_problem_instance",
+        "test_submission",
+    ]
+
+    @override_settings(MOCK_RANKINGSD=False, RANKING_PRECOMPUTE_CSV=True)
+    def test_csv_from_rankingsd(self):
+        contest = Contest.objects.get()
+        self.assertTrue(self.client.login(username="test_admin"))
+        csv_url = reverse("ranking_csv", kwargs={"contest_id": contest.id, "key": CONTEST_RANKING_KEY})
+        self.client.get(reverse("ranking", kwargs={"contest_id": contest.id, "key": CONTEST_RANKING_KEY}))
+
+        Ranking.objects.update(cooldown_date=datetime(2000, 1, 1, tzinfo=UTC))
+        recalculate(choose_for_recalculation())
+        ranking = Ranking.objects.get()
+        self.assertIn(b"test_user,", ranking.csv_data)
+
+        response = self.client.get(csv_url)
+        self.assertEqual(b"".join(response.streaming_content), bytes(ranking.csv_data))
+
+        # Without the precomputed CSV, the serialized ranking is used.
+        Ranking.objects.update(csv_data=None)
+        response = self.client.get(csv_url)
+        self.assertEqual(b"".join(response.streaming_content), bytes(ranking.csv_data))
+
+        # An outdated ranking is serialized again.
+        Ranking.objects.update(serialized_data=None, needs_recalculation=True)
+        response = self.client.get(csv_url)
+        self.assertEqual(b"".join(response.streaming_content), bytes(ranking.csv_data))
+
+
 class TestResultColorClassFilter(TestCase):
     def test_integer_scores(self):
         self._test_scores(10, IntegerScore)
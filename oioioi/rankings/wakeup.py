@@ -0,0 +1,181 @@
+"""Channels through which invalidated rankings wake up rankingsd.
+
+Without a wakeup channel rankingsd has to poll the database every
+``RANKINGSD_POLLING_INTERVAL``. With one, it blocks on the channel and
+polls only every ``RANKINGSD_FALLBACK_POLLING_INTERVAL`` (or when
+the cooldown of some invalidated ranking ends).
+
+The channel is chosen by the ``RANKINGSD_WAKEUP_CHANNEL`` setting.
+"""
+
+import glob
+import os
+import select
+import socket
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+
+class WakeupChannel:
+    """Base class of wakeup channels.
+
+    :meth:`notify` is called by the processes invalidating rankings,
+    :meth:`listen` and :meth:`wait` by the rankingsd workers.
+    """
+
+    def fallback_interval(self):
+        """How often rankingsd should poll the database even when not
+        woken up, in seconds.
+        """
+        return settings.RANKINGSD_FALLBACK_POLLING_INTERVAL
+
+    def notify(self):
+        """Wakes up the workers waiting in :meth:`wait`."""
+        raise NotImplementedError
+
+    def listen(self, worker_id):
+        """Prepares the worker to receive notifications.
+
+        Notifications sent after this call must not be missed by
+        the subsequent :meth:`wait` calls.
+        """
+        pass
+
+    def wait(self, timeout):
+        """Blocks until notified or ``timeout`` seconds pass.
+
+        :return: Whether the worker was notified.
+        """
+        raise NotImplementedError
+
+
+class PollingWakeupChannel(WakeupChannel):
+    """No wakeups at all, rankingsd polls every
+    ``RANKINGSD_POLLING_INTERVAL``.
+    """
+
+    def fallback_interval(self):
+        return settings.RANKINGSD_POLLING_INTERVAL
+
+    def notify(self):
+        pass
+
+    def wait(self, timeout):
+        select.select([], [], [], timeout)
+        return False
+
+
+class PostgresWakeupChannel(WakeupChannel):
+    """Uses PostgreSQL ``LISTEN``/``NOTIFY`` on the default database.
+
+    Listening requires a dedicated connection, so each worker opens one
+    (using psycopg2).
+    """
+
+    CHANNEL = "oioioi_rankings"
+
+    def __init__(self):
+        self.listen_connection = None
+
+    def notify(self):
+        with connection.cursor() as cursor:
+            cursor.execute("NOTIFY " + self.CHANNEL)
+
+    def listen(self, worker_id):
+        self.listen_connection = connection.get_new_connection(connection.get_connection_params())
+        self.listen_connection.autocommit = True
+        with self.listen_connection.cursor() as cursor:
+            cursor.execute("LISTEN " + self.CHANNEL)
+
+    def wait(self, timeout):
+        if not select.select([self.listen_connection], [], [], timeout)[0]:
+            return False
+        self.listen_connection.poll()
+        self.listen_connection.notifies.clear()
+        return True
+
+
+class LocalSocketWakeupChannel(WakeupChannel):
+    """Uses Unix datagram sockets in ``RANKINGSD_WAKEUP_SOCKET_DIR``,
+    one for each worker, so it works only if rankingsd runs on the same
+    machine as the web and judging processes.
+    """
+
+    def __init__(self):
+        self.socket = None
+
+    def _socket_path(self, worker_id):
+        return os.path.join(settings.RANKINGSD_WAKEUP_SOCKET_DIR, f"rankingsd-{os.getpid()}-{worker_id}.sock")
+
+    def notify(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            for path in glob.glob(os.path.join(settings.RANKINGSD_WAKEUP_SOCKET_DIR, "rankingsd-*.sock")):
+                try:
+                    sock.sendto(b"\0", path)
+                except ConnectionRefusedError:
+                    # Stale socket of a dead worker.
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                except OSError:
+                    # Queue of the worker is full, so it will wake up anyway.
+                    pass
+
+    def listen(self, worker_id):
+        os.makedirs(settings.RANKINGSD_WAKEUP_SOCKET_DIR, exist_ok=True)
+        path = self._socket_path(worker_id)
+        if os.path.exists(path):
+            os.unlink(path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(path)
+        self.socket.setblocking(False)
+
+    def wait(self, timeout):
+        if not select.select([self.socket], [], [], timeout)[0]:
+            return False
+        try:
+            while self.socket.recv(64):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+
+class InProcessWakeupChannel(WakeupChannel):
+    """Wakes up workers running as threads of the notifying process.
+    Meant for tests.
+    """
+
+    _condition = threading.Condition()
+    _notifications = 0
+
+    def __init__(self):
+        self.seen = None
+
+    def notify(self):
+        with self._condition:
+            InProcessWakeupChannel._notifications += 1
+            self._condition.notify_all()
+
+    def listen(self, worker_id):
+        self.seen = InProcessWakeupChannel._notifications
+
+    def wait(self, timeout):
+        with self._condition:
+            notified = self._condition.wait_for(lambda: InProcessWakeupChannel._notifications != self.seen, timeout)
+            self.seen = InProcessWakeupChannel._notifications
+        return notified
+
+
+def get_wakeup_channel():
+    return import_string(settings.RANKINGSD_WAKEUP_CHANNEL)()
+
+
+def wake_up_rankingsd():
+    """Wakes up rankingsd once the current transaction commits."""
+    transaction.on_commit(get_wakeup_channel().notify)
@@ -1,12 +1,16 @@
 import functools
 import glob
+import hashlib
 import logging
 import os
 import re
 import shutil
 import sys
 import tempfile
+import time
 import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from enum import Enum
 
 import chardet
@@ -41,6 +45,7 @@ from oioioi.problems.package import (
     ProblemPackageBackend,
     ProblemPackageError,
 )
+from oioioi.programs import compilation_cache
 from oioioi.programs.models import (
     LanguageOverrideForTest,
     LibraryProblemData,
@@ -59,6 +64,8 @@ DEFAULT_MEMORY_LIMIT = 66000
 TASK_PRIORITY = 500
 C_EXTRA_ARGS = ["-Wall", "-Wno-unused-result", "-Werror"]
 PAS_EXTRA_ARGS = ["-Ci", "-Cr", "-Co", "-gl"]
+# Fields of Test with the digests of its files.
+_DIGEST_FIELDS = {"input_file": "input_digest", "output_file": "output_digest"}
 
 
 class TaskType(Enum):
@@ -137,6 +144,7 @@ class SinolPackage:
         self.memory_limits = None
         self.statement_memory_limit = None
         self.prog_archive = None
+        self.prog_archive_digest = None
         self.extra_compilation_args = {
             "c": C_EXTRA_ARGS,
             "cpp": C_EXTRA_ARGS,
@@ -146,6 +154,8 @@ class SinolPackage:
         self.use_sandboxes = not settings.USE_UNSAFE_EXEC
         self.restrict_html = settings.SINOLPACK_RESTRICT_HTML and not settings.USE_SINOLPACK_MAKEFILES
         self.task_type = TaskType.STANDARD
+        self.stage_timings = {}
+        self.archived_tests = {}
 
     def identify(self):
         return self._find_main_dir() is not None
@@ -182,6 +192,24 @@ class SinolPackage:
         field.save(os.path.basename(filename), File(open(filename, "rb")))
         get_client().delete_file(file)
 
+    @contextmanager
+    def _stage(self, name):
+        """Adds the time spent inside the ``with`` statement to the timing
+        of the stage ``name`` of the import.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stage_timings[name] = self.stage_timings.get(name, 0) + time.monotonic() - start
+
+    def _save_stage_timings(self):
+        timings = {name: round(seconds, 3) for name, seconds in self.stage_timings.items()}
+        logger.info("%s: stage timings %r", self.filename, timings)
+        if self.package is not None and self.package.pk is not None:
+            self.package.stage_timings = timings
+            self.package.save(update_fields=["stage_timings"])
+
     def _find_and_compile(self, suffix, command=None, cwd=None, log_on_failure=True, out_name=None):
         if not command:
             command = suffix
@@ -226,15 +254,27 @@ class SinolPackage:
         if not out_name:
             out_name = _make_filename_in_job_dir(self.env, f"{prog_name}.e")
 
-        new_env = self._run_compilation_job(ext, ft_source_name, out_name)
+        with open(filename, "rb") as f:
+            source_digest = hashlib.file_digest(f, "sha256").hexdigest()
+        new_env = self._run_compilation_job(ext, ft_source_name, out_name, source_digest)
         client.delete_file(ft_source_name)
 
         self._ensure_compilation_success(filename, new_env)
 
         # TODO Remeber about 'exec_info' when Java support is introduced.
         new_env["compiled_file"] = new_env["out_file"]
+        new_env["program_digest"] = self._program_digest(source_digest, new_env)
         return new_env
 
+    def _program_digest(self, source_digest, compilation_env):
+        """Returns a digest of the source of a compiled program and of the
+        files from ``prog/`` it was compiled with.
+        """
+        digest = hashlib.sha256(source_digest.encode("ascii"))
+        if compilation_env.get("additional_archive"):
+            digest.update(self.prog_archive_digest.encode("ascii"))
+        return digest.hexdigest()
+
     # This is a hack for szkopul backwards compatibility.
     # See settings.OVERRIDE_COMPILER_LANGS for more info.
     # Should be removed when szkopul removes older compilers.
@@ -247,7 +287,7 @@ class SinolPackage:
         if lang in name_map and lang in settings.OVERRIDE_COMPILER_LANGS:
             compilation_job["compiler"] = settings.DEFAULT_COMPILERS[name_map[lang]]
 
-    def _run_compilation_job(self, ext, ft_source_name, out_name):
+    def _run_compilation_job(self, ext, ft_source_name, out_name, source_digest=None):
         compilation_job = self.env.copy()
         compilation_job["job_type"] = "compile"
         compilation_job["task_priority"] = TASK_PRIORITY
@@ -264,8 +304,22 @@ class SinolPackage:
 
         if not self.use_make and self.prog_archive:
             compilation_job["additional_archive"] = self.prog_archive
+            compilation_job["additional_archive_digest"] = self.prog_archive_digest
         add_extra_files(compilation_job, self.problem, additional_args=self.extra_compilation_args)
+
+        # Checkers, inwers and outgens rarely change between package
+        # versions, so their compiled programs are reused.
+        cache_key = None
+        if compilation_cache.is_enabled():
+            compilation_job["source_file_digest"] = source_digest
+            cache_key = compilation_cache.compilation_key(compilation_job)
+            result = compilation_cache.get_compilation(cache_key, out_name)
+            if result is not None:
+                logger.info("%s: using cached compilation of %s", self.filename, ft_source_name)
+                return dict(compilation_job, **result)
         new_env = run_sioworkers_job(compilation_job)
+        if cache_key is not None:
+            compilation_cache.store_compilation(cache_key, new_env)
         return new_env
 
     def _ensure_compilation_success(self, filename, new_env):
@@ -367,9 +421,12 @@ class SinolPackage:
         tmpdir = tempfile.mkdtemp()
         logger.info("%s: tmpdir is %s", self.filename, tmpdir)
         try:
-            self.archive.extract(to_path=tmpdir)
+            with self._stage("extract"):
+                self._extract(tmpdir)
             self.rootdir = os.path.join(tmpdir, self.short_name)
-            self._process_package()
+            with self._stage("process"):
+                self._process_package()
+            self._save_stage_timings()
 
             return self.problem
         finally:
@@ -377,6 +434,48 @@ class SinolPackage:
             if self.prog_archive:
                 get_client().delete_file(self.prog_archive)
 
+    def _extract(self, tmpdir):
+        """Extracts the package to ``tmpdir``.
+
+        Unless makefiles are used, which may generate tests in place,
+        test files of a :attr:`~oioioi.base.utils.archive.Archive.seekable`
+        archive are not extracted. They are read from the archive when
+        uploaded, see :meth:`_open_package_file`.
+        """
+        self.archived_tests = {}
+        if self.use_make or not self.archive.seekable:
+            self.archive.extract(to_path=tmpdir)
+            return
+        members = []
+        for name in self.archive.filenames():
+            path = os.path.normpath(name)
+            parts = path.split(os.sep)
+            if len(parts) == 3 and parts[0] == self.short_name and parts[1] in ("in", "out"):
+                self.archived_tests[os.path.join(tmpdir, path)] = name
+            else:
+                members.append(name)
+        self.archive.extract(to_path=tmpdir, members=members + self.archive.dirnames())
+        os.makedirs(os.path.join(tmpdir, self.short_name), exist_ok=True)
+
+    def _listdir(self, path):
+        """Like :func:`os.listdir`, but includes the tests left in the
+        archive and returns an empty list for nonexistent directories.
+        """
+        names = set(os.listdir(path)) if os.path.isdir(path) else set()
+        names.update(os.path.basename(test) for test in self.archived_tests if os.path.dirname(test) == path)
+        return list(names)
+
+    def _isfile(self, path):
+        return path in self.archived_tests or os.path.isfile(path)
+
+    def _open_package_file(self, path):
+        """Opens a file of the extracted package, or a test left in the
+        archive, for reading in binary mode.
+        """
+        if path in self.archived_tests:
+            return self.archive.open(self.archived_tests[path])
+        return open(path, "rb")
+
     def _describe_processing_error(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
@@ -466,12 +565,11 @@ class SinolPackage:
                     detected_prefixes.add(m.group(1))
 
         in_dir = os.path.join(self.rootdir, "in")
-        if os.path.isdir(in_dir):
-            for f in os.listdir(in_dir):
-                if f.endswith(".in"):
-                    m = re.match(r"^([a-zA-Z_]+)\d+[a-z]*\.in$", f)
-                    if m:
-                        detected_prefixes.add(m.group(1))
+        for f in self._listdir(in_dir):
+            if f.endswith(".in"):
+                m = re.match(r"^([a-zA-Z_]+)\d+[a-z]*\.in$", f)
+                if m:
+                    detected_prefixes.add(m.group(1))
 
         if expected_prefix and expected_prefix != self.short_name:
             raise ProblemPackageError(
@@ -594,6 +692,17 @@ class SinolPackage:
         archive_name = "compilation-dir-archive"
         archive = shutil.make_archive(os.path.join(self.rootdir, archive_name), format="zip", root_dir=prog_dir)
         self.prog_archive = get_client().put_file(_make_filename_in_job_dir(self.env, archive), archive)
+        # The archive itself differs between uploads (e.g. by timestamps),
+        # so the compilation cache is given a digest of its contents.
+        digest = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(prog_dir):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                digest.update(os.path.relpath(path, prog_dir).encode("utf-8") + b"\0")
+                with open(path, "rb") as f:
+                    digest.update(hashlib.file_digest(f, "sha256").digest())
+        self.prog_archive_digest = digest.hexdigest()
 
     @_describe_processing_error
     def _process_statements(self):
@@ -699,34 +808,36 @@ class SinolPackage:
         all tests does not exceed the maximum defined by the OIOIOI
         installation's owner.
 
-        If an input verifier is provided, it will then assert that all
-        ``*.in`` files generated are valid, and abort the upload in case of failure.
-
-        Here the ``*.out`` files will be generated if `USE_SINOLPACK_MAKEFILES`
+        Then the test files are uploaded to Filetracker. If an input
+        verifier is provided, it will assert that all ``*.in`` files
+        are valid, and abort the upload in case of failure. Here the
+        ``*.out`` files will be generated if `USE_SINOLPACK_MAKEFILES`
         is set to False, based on the model solution's output (on condition
-        that its source code is included within the package).
+        that its source code is included within the package). Both are
+        run on the first tests while the remaining ones are still being
+        uploaded.
 
         In the end, it is asserted that all tests have been correctly
-        constructed, non-created tests are removed from the database
-        and test scores are assigned to tests and testgroups based on
-        the configuration from ``config.yml`` or set to default value
-        if not specified.
+        constructed, tests are saved, non-created tests are removed from
+        the database and test scores are assigned to tests and testgroups
+        based on the configuration from ``config.yml`` or set to default
+        value if not specified.
         """
         self.time_limits = _stringify_keys(self.config.get("time_limits", {}))
         self.memory_limits = _stringify_keys(self.config.get("memory_limits", {}))
         self.statement_memory_limit = self._detect_statement_memory_limit()
 
-        created_tests, outs_to_make, scored_groups = self._create_instances_for_tests()
+        created_tests, uploads, outs_to_make, scored_groups = self._create_instances_for_tests()
         sum_of_time_limits = 0
         for test in created_tests:
             sum_of_time_limits += test.time_limit
         self._verify_time_limits(sum_of_time_limits)
 
-        self._verify_inputs(created_tests)
-        if self.task_type == TaskType.STANDARD:
-            self._generate_test_outputs(created_tests, outs_to_make)
+        self._upload_tests(uploads, outs_to_make)
         self._validate_tests(created_tests)
-        self._delete_non_existing_tests(created_tests)
+        with self._stage("save_tests"):
+            self._save_tests(created_tests)
+            self._delete_non_existing_tests(created_tests)
 
         self._assign_scores(scored_groups, total_score_if_auto)
         self._validate_subtask_dependencies(scored_groups)
@@ -753,9 +864,10 @@ class SinolPackage:
 
     def _create_instances_for_tests(self):
         """Iterate through available test inputs.
-        :return: Triple (created tests instances,
-                         outs that have to be generated,
-                         score groups (determined by test names))
+        :return: Quadruple (created (unsaved) tests instances,
+                            test files to be uploaded,
+                            outs that have to be generated,
+                            score groups (determined by test names))
         """
         indir = os.path.join(self.rootdir, "in")
         outdir = os.path.join(self.rootdir, "out")
@@ -764,11 +876,14 @@ class SinolPackage:
         names_re = re.compile(re_string)
 
         collected_ins = self._make_ins(re_string)
-        all_items = list(set(os.listdir(indir)) | set(collected_ins.keys()))
+        all_items = list(set(self._listdir(indir)) | set(collected_ins.keys()))
 
         created_tests = []
+        uploads = []
         outs_to_make = []
         scored_groups = set()
+        existing_tests = Test.objects.filter(problem_instance=self.main_problem_instance).select_related("problem_instance__problem")
+        existing_tests = {test.name: test for test in existing_tests}
 
         if self.task_type != TaskType.INTERACTIVE and self.use_make and not self.config.get("no_outgen", False):
             self._find_and_compile("", command="outgen")
@@ -783,11 +898,13 @@ class SinolPackage:
                 collected_ins,
                 scored_groups,
                 outs_to_make,
+                existing_tests,
+                uploads,
             )
             if instance:
                 created_tests.append(instance)
 
-        return created_tests, outs_to_make, scored_groups
+        return created_tests, uploads, outs_to_make, scored_groups
 
     @_describe_processing_error
     def _verify_time_limits(self, time_limit_sum):
@@ -807,45 +924,188 @@ class SinolPackage:
                 % {"sum": time_limit_sum_rounded, "limit": limit_seconds}
             )
 
+    def _upload_test_file(self, field, name, filename=None, file=None, old_name=None, old_digest=""):
+        """Saves a test file, a local ``filename`` or a Filetracker ``file``
+        (which is deleted afterwards), in the storage of ``field``.
+
+        If the file has the same digest as the already stored ``old_name``,
+        the stored file is kept instead.
+
+        Called in the upload threads, so it must not use the database.
+        :return: Pair (name of the file, its digest).
+        """
+        if file is not None:
+            filename = os.path.join(self.rootdir, os.path.basename(filetracker_to_django_file(file).name))
+            get_client().get_file(file, filename)
+        with self._open_package_file(filename) as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+            if not old_name or digest != old_digest:
+                name = self._save_test_file(field, name, filename)
+            else:
+                name = old_name
+        if file is not None:
+            get_client().delete_file(file)
+        return name, digest
+
+    def _save_test_file(self, field, name, filename):
+        if filename not in self.archived_tests:
+            with open(filename, "rb") as f:
+                return field.storage.save(name, File(f), max_length=field.max_length)
+        # Filetracker uploads files from disk, so the test is copied to
+        # a temporary file, which is removed right after the upload.
+        with self._open_package_file(filename) as src, tempfile.NamedTemporaryFile() as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+            dst.flush()
+            dst.seek(0)
+            return field.storage.save(name, File(dst), max_length=field.max_length)
+
+    def _upload_test_files(self, executor, uploads):
+        """Submits uploads of test files to the ``executor``.
+
+        :param uploads: List of (test instance, field name, local file name,
+               Filetracker file name) tuples, with one of the file names set.
+        :return: Dictionary mapping futures to (test instance, field) pairs.
+        """
+        futures = {}
+        for instance, field_name, filename, file in uploads:
+            field = instance._meta.get_field(field_name)
+            basename = os.path.basename(filename or filetracker_to_django_file(file).name)
+            name = field.generate_filename(instance, basename)
+            old_name = field.value_from_object(instance).name
+            old_digest = getattr(instance, _DIGEST_FIELDS[field_name])
+            future = executor.submit(self._upload_test_file, field, name, filename, file, old_name, old_digest)
+            futures[future] = (instance, field)
+        return futures
+
+    def _set_test_file(self, instance, field, future):
+        """Sets the ``field`` of a test to the file saved by
+        :meth:`_upload_test_file`.
+
+        :return: Whether the file changed.
+        """
+        name, digest = future.result()
+        changed = name != field.value_from_object(instance).name
+        setattr(instance, field.attname, name)
+        setattr(instance, _DIGEST_FIELDS[field.name], digest)
+        if not changed:
+            self.unchanged_test_files += 1
+        return changed
+
+    @_describe_processing_error
+    def _upload_tests(self, uploads, outs_to_make):
+        """Uploads test files to Filetracker, verifies inputs and generates
+        missing outputs.
+
+        Files are uploaded by ``SINOLPACK_UPLOAD_THREADS`` threads. As soon
+        as inputs of ``SINOLPACK_JOBS_BATCH_SIZE`` tests are uploaded,
+        ``inwer`` and the model solution are run on them, while the
+        remaining files are still being uploaded.
+
+        Files identical to the ones the tests already have (compared by
+        their digests) are not uploaded again and ``inwer`` is run only
+        on the changed inputs, unless ``inwer`` itself changed.
+
+        :raises: :class:`~oioioi.problems.package.ProblemPackageError`
+        if ``inwer`` fails on any test.
+        """
+        inwer_env = self._find_and_compile("inwer")
+        if self.use_make:
+            inwer_env = None
+        outgen_env = None
+        if self.task_type == TaskType.STANDARD and not self.use_make:
+            outgen_env = self._find_and_compile("", command="outgen")
+        outs_to_make = {test.name: outname for outname, test in outs_to_make}
+        self.unchanged_test_files = 0
+
+        upload_executor = ThreadPoolExecutor(max_workers=settings.SINOLPACK_UPLOAD_THREADS)
+        # Sioworkers jobs of a batch are run in parallel anyway, so the
+        # batches are sent one at a time.
+        jobs_executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            with self._stage("upload"):
+                uploading = self._upload_test_files(upload_executor, uploads)
+                jobs = []
+                batch = []
+                while uploading:
+                    for future in wait(uploading, return_when=FIRST_COMPLETED).done:
+                        instance, field = uploading.pop(future)
+                        changed = self._set_test_file(instance, field, future)
+                        if field.name == "input_file":
+                            batch.append((instance, changed))
+                    while batch and (len(batch) >= settings.SINOLPACK_JOBS_BATCH_SIZE or not uploading):
+                        size = settings.SINOLPACK_JOBS_BATCH_SIZE
+                        jobs.append(jobs_executor.submit(self._run_test_jobs, batch[:size], inwer_env, outgen_env, outs_to_make))
+                        batch = batch[size:]
+                    # Fails early if a batch has already failed.
+                    for future in jobs:
+                        if future.done():
+                            future.result()
+
+            generated_outs = []
+            for future in jobs:
+                generated_outs.extend(future.result())
+            if inwer_env:
+                logger.info("%s: inwer success", self.filename)
+
+            with self._stage("upload"):
+                uploading = self._upload_test_files(upload_executor, generated_outs)
+                for future, (instance, field) in uploading.items():
+                    self._set_test_file(instance, field, future)
+            logger.info("%s: %d test files unchanged", self.filename, self.unchanged_test_files)
+        finally:
+            upload_executor.shutdown(cancel_futures=True)
+            jobs_executor.shutdown(cancel_futures=True)
+            for env in (inwer_env, outgen_env):
+                if env:
+                    get_client().delete_file(env["compiled_file"])
+
+    def _run_test_jobs(self, batch, inwer_env, outgen_env, outs_to_make):
+        """Runs ``inwer`` and the model solution on a batch of tests with
+        uploaded inputs, given as (test instance, whether the input changed)
+        pairs.
+
+        :return: List of generated outputs to be uploaded, in the format
+                 of :meth:`_upload_test_files`.
+        """
+        inwer_digest = inwer_env.get("program_digest") if inwer_env else None
+        # Inputs are verified again if they or the inwer changed.
+        changed_tests = [test for test, changed in batch if changed or test.inwer_digest != inwer_digest]
+        if inwer_env and changed_tests:
+            with self._stage("inwer"):
+                self._verify_inputs(changed_tests, inwer_env)
+        for test, _changed in batch:
+            test.inwer_digest = inwer_digest or ""
+        tests = [test for test, _changed in batch if test.name in outs_to_make]
+        if not outgen_env or not tests:
+            return []
+        with self._stage("outgen"):
+            outs = self._make_outs([(outs_to_make[test.name], test) for test in tests], outgen_env)
+        return [(test, "output_file", None, outs[test.name]["out_file"]) for test in tests]
+
     @_describe_processing_error
-    def _verify_inputs(self, tests):
+    def _verify_inputs(self, tests, env):
         """Checks if ``inwer`` exits with code 0 on all tests.
 
         :raises: :class:`~oioioi.problems.package.ProblemPackageError`
         otherwise.
         """
-        env = self._find_and_compile("inwer")
-        if env and not self.use_make:
-            jobs = {}
-
-            for test in tests:
-                job = env.copy()
-                job["job_type"] = "inwer"
-                job["task_priority"] = TASK_PRIORITY
-                job["exe_file"] = env["compiled_file"]
-                job["in_file"] = django_to_filetracker_path(test.input_file)
-                job["in_file_name"] = self.short_name + test.name + ".in"
-                job["use_sandboxes"] = self.use_sandboxes
-                jobs[test.name] = job
-
-            jobs = run_sioworkers_jobs(jobs)
-            get_client().delete_file(env["compiled_file"])
+        jobs = {}
 
-            for test_name, job in jobs.items():
-                if job["result_code"] != "OK":
-                    raise ProblemPackageError(
-                        _("Inwer failed on test %(test)s. Inwer output %(output)s") % {"test": test_name, "output": "\n".join(job["stdout"])}
-                    )
+        for test in tests:
+            job = env.copy()
+            job["job_type"] = "inwer"
+            job["task_priority"] = TASK_PRIORITY
+            job["exe_file"] = env["compiled_file"]
+            job["in_file"] = django_to_filetracker_path(test.input_file)
+            job["in_file_name"] = self.short_name + test.name + ".in"
+            job["use_sandboxes"] = self.use_sandboxes
+            jobs[test.name] = job
 
-            logger.info("%s: inwer success", self.filename)
+        jobs = run_sioworkers_jobs(jobs)
 
-    def _generate_test_outputs(self, tests, outs_to_make):
-        if not self.use_make:
-            outs = self._make_outs(outs_to_make)
-            for instance in tests:
-                if instance.name in outs:
-                    generated_out = outs[instance.name]
-                    self._save_to_field(instance.output_file, generated_out["out_file"])
+        for test_name, job in jobs.items():
+            if job["result_code"] != "OK":
+                raise ProblemPackageError(_("Inwer failed on test %(test)s. Inwer output %(output)s") % {"test": test_name, "output": "\n".join(job["stdout"])})
 
     @_describe_processing_error
     def _validate_tests(self, created_tests):
@@ -858,12 +1118,21 @@ class SinolPackage:
             if self.task_type == TaskType.STANDARD and not instance.output_file:
                 raise ProblemPackageError(_("Missing out file for test %s") % instance.name)
             try:
-                instance.full_clean()
+                # Tests are unique by construction and belong to the main
+                # problem instance, checking it would cost queries per test.
+                instance.full_clean(exclude=["problem_instance"], validate_unique=False)
             except ValidationError as e:
                 raise ProblemPackageError(e.messages[0])
 
+    def _save_tests(self, tests):
+        Test.objects.bulk_create([test for test in tests if test.pk is None])
+        Test.objects.bulk_update(
+            [test for test in tests if test.pk is not None],
+            ["input_file", "output_file", "input_digest", "output_digest", "inwer_digest", "kind", "group", "time_limit", "memory_limit", "order"],
+        )
+
     def _delete_non_existing_tests(self, created_tests):
-        for test in Test.objects.filter(problem_instance=self.main_problem_instance).exclude(id__in=[instance.id for instance in created_tests]):
+        for test in Test.objects.filter(problem_instance=self.main_problem_instance).exclude(name__in=[instance.name for instance in created_tests]):
             logger.info("%s: deleting test %s", self.filename, test.name)
             test.delete()
 
@@ -878,8 +1147,10 @@ class SinolPackage:
         collected_ins,
         scored_groups,
         outs_to_make,
+        existing_tests,
+        uploads,
     ):
-        """Responsible for saving test in and out files,
+        """Responsible for preparing test in and out files for upload,
         setting test limits, assigning test kinds and groups.
 
         :param test: Test name.
@@ -894,7 +1165,10 @@ class SinolPackage:
         :param scored_groups: Accumulator for score groups.
         :param outs_to_make: Accumulator for name of output files to
                be generated by model solution.
-        :return: Test instance or None if name couldn't be matched.
+        :param existing_tests: Dictionary of already existing tests of
+               the problem, by name.
+        :param uploads: Accumulator for test files to be uploaded.
+        :return: Unsaved test instance or None if name couldn't be matched.
         """
         match = names_re.match(test)
         if not match:
@@ -908,7 +1182,10 @@ class SinolPackage:
         group = match.group(3)  # 0
         suffix = match.group(4)  # ocen
 
-        instance, created = Test.objects.get_or_create(problem_instance=self.main_problem_instance, name=name)
+        instance = existing_tests.get(name)
+        created = instance is None
+        if created:
+            instance = Test(problem_instance=self.main_problem_instance, name=name)
 
         inname_base = basename + ".in"
         inname = os.path.join(indir, inname_base)
@@ -916,12 +1193,12 @@ class SinolPackage:
         outname = os.path.join(outdir, outname_base)
 
         if test in collected_ins:
-            self._save_to_field(instance.input_file, collected_ins[test])
+            uploads.append((instance, "input_file", None, collected_ins[test]))
         else:
-            instance.input_file.save(inname_base, File(open(inname, "rb")))
+            uploads.append((instance, "input_file", inname, None))
 
-        if os.path.isfile(outname):
-            instance.output_file.save(outname_base, File(open(outname), "rb"))
+        if self._isfile(outname):
+            uploads.append((instance, "output_file", outname, None))
         else:
             outs_to_make.append(
                 (
@@ -948,7 +1225,6 @@ class SinolPackage:
             instance.memory_limit = memory_limit
 
         instance.order = order
-        instance.save()
         return instance
 
     @_describe_processing_error
@@ -1003,16 +1279,12 @@ class SinolPackage:
         return None
 
     @_describe_processing_error
-    def _make_outs(self, outs_to_make):
-        """Compiles the model solution and executes it in order to generate
+    def _make_outs(self, outs_to_make, env):
+        """Executes the compiled model solution in order to generate
         test outputs.
 
         :return: Result from workers.
         """
-        env = self._find_and_compile("", command="outgen")
-        if not env:
-            return {}
-
         jobs = {}
         for outname, test in outs_to_make:
             job = env.copy()
@@ -1026,9 +1298,7 @@ class SinolPackage:
                 job["exec_mem_limit"] = test.memory_limit
             jobs[test.name] = job
 
-        jobs = run_sioworkers_jobs(jobs)
-        get_client().delete_file(env["compiled_file"])
-        return jobs
+        return run_sioworkers_jobs(jobs)
 
     @_describe_processing_error
     def _check_scores_from_config(self, scored_groups, config_scores):
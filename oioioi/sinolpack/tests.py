@@ -1,7 +1,11 @@
 import os.path
+import shutil
+import tempfile
+import threading
 import urllib.parse
 import zipfile
 from io import BytesIO
+from unittest import mock
 
 import pytest
 from django.conf import settings
@@ -23,6 +27,7 @@ from oioioi.contests.models import (
     UserResultForContest,
 )
 from oioioi.contests.scores import IntegerScore
+from oioioi.filetracker.client import get_client
 from oioioi.filetracker.tests import TestStreamingMixin
 from oioioi.interactive.models import Interactor
 from oioioi.problems.models import (
@@ -990,6 +995,153 @@ class TestLimits(TestCase):
         )
 
 
+class TestPipelinedTestsUpload(TestCase):
+    fixtures = ["test_contest", "test_full_package", "test_problem_instance"]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        for subdir in ("in", "out"):
+            os.makedirs(os.path.join(self.tmpdir, "sum", subdir))
+        for name in ("0", "1a", "1b", "2", "3"):
+            with open(os.path.join(self.tmpdir, "sum", "in", f"sum{name}.in"), "w") as f:
+                f.write(f"input {name}\n")
+        with open(os.path.join(self.tmpdir, "sum", "out", "sum0.out"), "w") as f:
+            f.write("output 0\n")
+
+    def _make_package(self, filename=None):
+        problem = Problem.objects.get()
+        pkg = SinolPackage(filename or get_test_filename("test_simple_package.zip"))
+        pkg.short_name = "sum"
+        pkg.rootdir = os.path.join(self.tmpdir, "sum")
+        pkg.env = {"package_id": 1}
+        pkg.config = {}
+        pkg.use_make = False
+        pkg.problem = problem
+        pkg.main_problem_instance = problem.main_problem_instance
+        return pkg
+
+    def _find_and_compile(self, suffix, command=None, **kwargs):
+        command = command or suffix
+        if command not in ("inwer", "outgen"):
+            return None
+        compiled_file = f"/unpack/1/{command}.e"
+        get_client().put_file(compiled_file, get_test_filename("test_simple_package.zip"))
+        return {"compiled_file": compiled_file, "program_digest": getattr(self, "program_digest", command)}
+
+    def _run_jobs(self, jobs):
+        with self.lock:
+            self.batches.append(sorted(jobs))
+        results = {}
+        for name, job in jobs.items():
+            if job["job_type"] == "inwer":
+                results[name] = dict(job, result_code="OK", stdout=[])
+            else:
+                reader, _version = get_client().get_stream(job["in_file"])
+                with reader:
+                    data = reader.read()
+                with tempfile.NamedTemporaryFile() as f:
+                    f.write(data.replace(b"input", b"output"))
+                    f.flush()
+                    get_client().put_file(job["out_file"], f.name)
+                results[name] = dict(job, result_code="OK")
+        return results
+
+    @override_settings(SINOLPACK_UPLOAD_THREADS=3, SINOLPACK_JOBS_BATCH_SIZE=2, USE_SINOLPACK_MAKEFILES=False)
+    def test_generate_tests(self):
+        self.lock = threading.Lock()
+        self.batches = []
+        old_test_ids = dict(Test.objects.values_list("name", "id"))
+        pkg = self._make_package()
+        with (
+            mock.patch.object(pkg, "_find_and_compile", self._find_and_compile),
+            mock.patch("oioioi.sinolpack.package.run_sioworkers_jobs", self._run_jobs),
+            self.assertNumQueriesLessThan(20),
+        ):
+            pkg._generate_tests()
+
+        tests = {test.name: test for test in Test.objects.filter(problem_instance=pkg.main_problem_instance)}
+        self.assertEqual(sorted(tests), ["0", "1a", "1b", "2", "3"])
+        for name, test in tests.items():
+            self.assertEqual(test.id, old_test_ids[name])
+            self.assertEqual(test.input_file.read(), f"input {name}\n".encode())
+            self.assertEqual(test.output_file.read(), f"output {name}\n".encode())
+        self.assertEqual(tests["0"].kind, "EXAMPLE")
+        self.assertEqual(tests["3"].max_score, 34)
+
+        # Inwer ran on all the tests and outgen on the ones without
+        # outputs, at most two tests at a time.
+        self.assertTrue(all(len(batch) <= 2 for batch in self.batches))
+        self.assertEqual(sorted(name for batch in self.batches for name in batch), ["0", "1a", "1a", "1b", "1b", "2", "2", "3", "3"])
+        self.assertEqual(set(pkg.stage_timings), {"upload", "inwer", "outgen", "save_tests"})
+
+    @override_settings(SINOLPACK_UPLOAD_THREADS=3, SINOLPACK_JOBS_BATCH_SIZE=2, USE_SINOLPACK_MAKEFILES=False)
+    def test_tests_read_from_archive(self):
+        self.lock = threading.Lock()
+        self.batches = []
+        with open(os.path.join(self.tmpdir, "sum", "config.yml"), "w") as f:
+            f.write("title: Sum\n")
+        filename = shutil.make_archive(os.path.join(self.tmpdir, "sum"), "zip", root_dir=self.tmpdir, base_dir="sum")
+        extract_dir = os.path.join(self.tmpdir, "extracted")
+        pkg = self._make_package(filename)
+        pkg._extract(extract_dir)
+        self.assertTrue(os.path.isfile(os.path.join(extract_dir, "sum", "config.yml")))
+        self.assertEqual(os.listdir(os.path.join(extract_dir, "sum", "in")), [])
+
+        pkg.rootdir = os.path.join(extract_dir, "sum")
+        with (
+            mock.patch.object(pkg, "_find_and_compile", self._find_and_compile),
+            mock.patch("oioioi.sinolpack.package.run_sioworkers_jobs", self._run_jobs),
+        ):
+            pkg._generate_tests()
+        tests = Test.objects.filter(problem_instance=pkg.main_problem_instance)
+        self.assertEqual(tests.count(), 5)
+        for test in tests:
+            self.assertEqual(test.input_file.read(), f"input {test.name}\n".encode())
+            self.assertEqual(test.output_file.read(), f"output {test.name}\n".encode())
+
+    @override_settings(SINOLPACK_UPLOAD_THREADS=3, SINOLPACK_JOBS_BATCH_SIZE=2, USE_SINOLPACK_MAKEFILES=False)
+    def test_unchanged_files_reused(self):
+        self.lock = threading.Lock()
+        self.batches = []
+
+        def generate_tests():
+            pkg = self._make_package()
+            with (
+                mock.patch.object(pkg, "_find_and_compile", self._find_and_compile),
+                mock.patch("oioioi.sinolpack.package.run_sioworkers_jobs", self._run_jobs),
+            ):
+                pkg._generate_tests()
+            tests = Test.objects.filter(problem_instance=pkg.main_problem_instance)
+            return {test.name: (test.input_file.name, test.output_file.name, test.input_digest) for test in tests}
+
+        files = generate_tests()
+        self.assertTrue(all(input_digest for _input, _output, input_digest in files.values()))
+
+        with open(os.path.join(self.tmpdir, "sum", "in", "sum2.in"), "w") as f:
+            f.write("changed input 2\n")
+        self.batches = []
+        new_files = generate_tests()
+        # Only the changed input is uploaded and verified. The output is
+        # generated again, but turns out to be different too.
+        self.assertEqual(
+            [name for name in sorted(files) if files[name] != new_files[name]],
+            ["2"],
+        )
+        self.assertNotEqual(files["2"][0], new_files["2"][0])
+        self.assertNotEqual(files["2"][1], new_files["2"][1])
+        inwer_batches = [batch for batch in self.batches if len(batch) == 1]
+        self.assertIn(["2"], inwer_batches)
+        self.assertEqual(sorted(name for batch in self.batches for name in batch), ["1a", "1b", "2", "2", "3"])
+
+        # A changed inwer verifies all the inputs again.
+        self.program_digest = "changed inwer"
+        self.batches = []
+        self.assertEqual(generate_tests(), new_files)
+        self.assertEqual(sorted(name for batch in self.batches for name in batch), ["0", "1a", "1a", "1b", "1b", "2", "2", "3", "3"])
+        self.assertEqual(set(Test.objects.filter(problem_instance__problem__short_name="sum").values_list("inwer_digest", flat=True)), {"changed inwer"})
+
+
 class TestValidateSubtaskDependencies(TestCase):
     """Tests for SinolPackage._validate_subtask_dependencies()."""
 
@@ -1,38 +1,57 @@
-import json
-
-# This is a workaround for SIO-915. We assume that other parts of OIOIOI code
-# do not rely on particular directory being the current directory. Without
-# this assumption, even a single call to LocalClient.build would break that
-# code.
+from concurrent.futures.process import BrokenProcessPool
 from threading import Lock
-from xmlrpc.client import Server
 
 import sio.workers.runner
 from django.conf import settings
 from django.db import transaction
 
+from oioioi.base.utils import reset_memoized
 from oioioi.evalmgr.tasks import delay_environ
+from oioioi.sioworkers.client import get_sioworkersd_client
+from oioioi.sioworkers.local_pool import get_process_pool, run_job
 
+# This is a workaround for SIO-915. We assume that other parts of OIOIOI code
+# do not rely on particular directory being the current directory. Without
+# this assumption, even a single call to LocalClient.build would break that
+# code.
 _local_backend_lock = Lock()
 
 
 class LocalBackend:
-    """A simple sioworkers backend which executes the work in the calling
-    process.
+    """A simple sioworkers backend which executes the work on the local
+    machine.
+
+    With ``LOCAL_BACKEND_CONCURRENCY`` set to 1, jobs are run one at
+    a time, in the calling process. Otherwise they are run in a pool of
+    that many processes, jobs with higher ``task_priority`` first.
 
     Perfect for tests or a single-machine OIOIOI setup.
     """
 
     def run_job(self, job, **kwargs):
+        if settings.LOCAL_BACKEND_CONCURRENCY > 1:
+            return self.run_jobs({"job": job}, **kwargs)["job"]
         with _local_backend_lock:
             return sio.workers.runner.run(job)
 
     def run_jobs(self, dict_of_jobs, **kwargs):
+        if settings.LOCAL_BACKEND_CONCURRENCY > 1:
+            return self._run_jobs_in_pool(dict_of_jobs)
         results = {}
         for key, value in dict_of_jobs.items():
             results[key] = self.run_job(value, **kwargs)
         return results
 
+    def _run_jobs_in_pool(self, dict_of_jobs):
+        pool = get_process_pool(settings.LOCAL_BACKEND_CONCURRENCY)
+        keys = sorted(dict_of_jobs, key=lambda key: -dict_of_jobs[key].get("task_priority", 0))
+        try:
+            futures = {key: pool.submit(run_job, dict_of_jobs[key]) for key in keys}
+            return {key: futures[key].result() for key in dict_of_jobs}
+        except BrokenProcessPool:
+            reset_memoized(get_process_pool)
+            raise
+
     def send_async_jobs(self, env, **kwargs):
         res = self.run_jobs(env["workers_jobs"], **(env.get("workers_jobs.extra_args", {})))
         env["workers_jobs.results"] = res
@@ -46,15 +65,13 @@ class LocalBackend:
 class SioworkersdBackend:
     """A backend which collaborates with sioworkersd"""
 
-    server = Server(settings.SIOWORKERSD_URL, allow_none=True)
-
     def run_job(self, job, **kwargs):
         env = {"workers_jobs": {"dummy_name": job}}
         env["workers_jobs.extra_args"] = kwargs
         env["oioioi_instance"] = settings.SITE_NAME
         env["contest_priority"] = settings.OIOIOI_INSTANCE_PRIORITY_BONUS + settings.NON_CONTEST_PRIORITY
         env["contest_weight"] = settings.OIOIOI_INSTANCE_WEIGHT_BONUS + settings.NON_CONTEST_WEIGHT
-        ans = SioworkersdBackend.server.sync_run_group(json.dumps(env))
+        ans = get_sioworkersd_client().sync_run_group(env)
         if "error" in ans:
             raise RuntimeError("Error from workers:\n{}\nTB:\n{}".format(ans["error"]["message"], ans["error"]["traceback"]))
         return ans["workers_jobs.results"]["dummy_name"]
@@ -64,7 +81,7 @@ class SioworkersdBackend:
         env["oioioi_instance"] = settings.SITE_NAME
         env["contest_priority"] = settings.OIOIOI_INSTANCE_PRIORITY_BONUS + settings.NON_CONTEST_PRIORITY
         env["contest_weight"] = settings.OIOIOI_INSTANCE_WEIGHT_BONUS + settings.NON_CONTEST_WEIGHT
-        ans = SioworkersdBackend.server.sync_run_group(json.dumps(env))
+        ans = get_sioworkersd_client().sync_run_group(env)
         if "error" in ans:
             raise RuntimeError("Error from workers:\n{}\nTB:\n{}".format(ans["error"]["message"], ans["error"]["traceback"]))
         return ans["workers_jobs.results"]
@@ -74,4 +91,4 @@ class SioworkersdBackend:
         if url is None:
             url = "http://" + settings.SIOWORKERS_LISTEN_ADDR + ":" + str(settings.SIOWORKERS_LISTEN_PORT)
         env["return_url"] = url
-        SioworkersdBackend.server.run_group(json.dumps(env))
+        get_sioworkersd_client().run_group(env)
@@ -0,0 +1,135 @@
+"""A thread-safe client of the sioworkersd XML-RPC interface.
+
+Every call borrows a :class:`xmlrpc.client.ServerProxy` from a pool, so
+that threads never share a connection, and connections are kept alive
+between calls instead of being opened for each of them.
+"""
+
+import http.client
+import json
+import logging
+import queue
+import time
+import xmlrpc.client
+
+from django.conf import settings
+
+from oioioi.base.utils import memoized
+
+logger = logging.getLogger(__name__)
+
+
+class _TimeoutTransportMixin:
+    def __init__(self, timeout, encode_threshold, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+        # Request bodies larger than this are sent gzip-compressed.
+        self.encode_threshold = encode_threshold
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+
+class _Transport(_TimeoutTransportMixin, xmlrpc.client.Transport):
+    pass
+
+
+class _SafeTransport(_TimeoutTransportMixin, xmlrpc.client.SafeTransport):
+    pass
+
+
+def _not_sent(error):
+    """Whether the call failed before sioworkersd could receive it."""
+    return isinstance(error, ConnectionRefusedError)
+
+
+class SioworkersdClient:
+    """Calls sioworkersd methods, retrying failed ones ``retries`` times,
+    with exponential backoff. Calls which are not idempotent (e.g.
+    ``run_group``) are only retried if the connection could not be made,
+    as otherwise their jobs could be queued twice. A kept-alive connection
+    closed by the server is reopened by :mod:`xmlrpc.client` itself.
+
+    At most ``pool_size`` idle connections are kept, but more may be
+    opened when there are more concurrent calls.
+    """
+
+    def __init__(self, url, pool_size=8, timeout=None, sync_timeout=None, retries=3, backoff=0.5, compress_threshold=None):
+        self.url = url
+        self.retries = retries
+        self.backoff = backoff
+        self.compress_threshold = compress_threshold
+        self.pools = {
+            timeout: queue.LifoQueue(maxsize=pool_size),
+            sync_timeout: queue.LifoQueue(maxsize=pool_size),
+        }
+        self.timeout = timeout
+        self.sync_timeout = sync_timeout
+
+    def _new_proxy(self, timeout):
+        transport_class = _SafeTransport if self.url.startswith("https:") else _Transport
+        transport = transport_class(timeout, self.compress_threshold)
+        return xmlrpc.client.ServerProxy(self.url, transport=transport, allow_none=True)
+
+    def _call(self, method, *args, timeout, idempotent=False):
+        pool = self.pools[timeout]
+        for attempt in range(self.retries + 1):
+            try:
+                proxy = pool.get_nowait()
+            except queue.Empty:
+                proxy = self._new_proxy(timeout)
+            try:
+                result = getattr(proxy, method)(*args)
+            except (OSError, http.client.HTTPException) as e:
+                proxy("close")()
+                if attempt == self.retries or not (idempotent or _not_sent(e)):
+                    raise
+                delay = self.backoff * 2**attempt
+                logger.warning("Sioworkersd call %s failed (%s), retrying in %.1fs", method, e, delay)
+                time.sleep(delay)
+                continue
+            except BaseException:
+                proxy("close")()
+                raise
+            try:
+                pool.put_nowait(proxy)
+            except queue.Full:
+                proxy("close")()
+            return result
+
+    def run_group(self, env):
+        """Queues a group of jobs, results of which are sent to
+        ``env['return_url']``.
+        """
+        return self._call("run_group", json.dumps(env), timeout=self.timeout)
+
+    def sync_run_group(self, env):
+        """Runs a group of jobs and returns the resulting environ."""
+        return self._call("sync_run_group", json.dumps(env), timeout=self.sync_timeout)
+
+    def get_workers(self):
+        return self._call("get_workers", timeout=self.timeout, idempotent=True)
+
+    def get_queue(self):
+        return self._call("get_queue", timeout=self.timeout, idempotent=True)
+
+    def forget_worker(self, name):
+        return self._call("forget_worker", name, timeout=self.timeout)
+
+
+@memoized
+def get_sioworkersd_client():
+    """Returns the client of ``settings.SIOWORKERSD_URL`` shared by the
+    whole process.
+    """
+    return SioworkersdClient(
+        settings.SIOWORKERSD_URL,
+        pool_size=settings.SIOWORKERSD_POOL_SIZE,
+        timeout=settings.SIOWORKERSD_TIMEOUT,
+        sync_timeout=settings.SIOWORKERSD_SYNC_TIMEOUT,
+        retries=settings.SIOWORKERSD_RETRIES,
+        backoff=settings.SIOWORKERSD_RETRY_BACKOFF,
+        compress_threshold=settings.SIOWORKERSD_COMPRESS_THRESHOLD,
+    )
@@ -0,0 +1,49 @@
+"""A pool of processes running sioworkers jobs for
+:class:`~oioioi.sioworkers.backends.LocalBackend`.
+
+This module is imported by the processes of the pool before Django is
+set up, so it mustn't import any models.
+"""
+
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from oioioi.base.utils import memoized
+
+
+def _init_process():
+    import django
+
+    django.setup()
+
+    from oioioi.filetracker.client import get_client
+
+    # Makes sioworkers use the Filetracker client configured for OIOIOI.
+    get_client()
+
+
+def run_job(job):
+    """Runs the job in a fresh temporary directory."""
+    import sio.workers.runner
+
+    # Every process of the pool runs one job at a time, so changing the
+    # current directory doesn't affect other jobs.
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="oioioi-local-job-") as workdir:
+        os.chdir(workdir)
+        try:
+            return sio.workers.runner.run(job)
+        finally:
+            os.chdir(cwd)
+
+
+@memoized
+def get_process_pool(concurrency):
+    # Forked processes would share database connections with the parent.
+    return ProcessPoolExecutor(
+        max_workers=concurrency,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_process,
+    )
@@ -1,16 +1,16 @@
 import json
-from xmlrpc.client import Server
 
-from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
+from oioioi.sioworkers.client import get_sioworkersd_client
+
 
 class Command(BaseCommand):
     help = "TODO"
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.server = Server(settings.SIOWORKERSD_URL)
+        self.server = get_sioworkersd_client()
 
     def add_arguments(self, parser):
         parser.add_argument("command", type=str, nargs="?", default=None, help="Command to be run")
@@ -29,13 +29,11 @@ class Command(BaseCommand):
             return
         self.stdout.write(
             self.server.run_group(
-                json.dumps(
-                    {
-                        "workers_jobs": {
-                            "worker.py-task": json.loads(args[0]),
-                        }
+                {
+                    "workers_jobs": {
+                        "worker.py-task": json.loads(args[0]),
                     }
-                )
+                }
             )
         )
 
@@ -46,13 +44,11 @@ class Command(BaseCommand):
         self.stdout.write(
             repr(
                 self.server.sync_run_group(
-                    json.dumps(
-                        {
-                            "workers_jobs": {
-                                "worker.py-task": json.loads(args[0]),
-                            }
+                    {
+                        "workers_jobs": {
+                            "worker.py-task": json.loads(args[0]),
                         }
-                    )
+                    }
                 )
             )
         )
@@ -61,13 +57,13 @@ class Command(BaseCommand):
         if len(args) != 1:
             self.stdout.write("Required exactly one argument - job env.\n")
             return
-        self.stdout.write(self.server.run_group(args[0]))
+        self.stdout.write(self.server.run_group(json.loads(args[0])))
 
     def cmd_sync_run_group(self, *args, **kwargs):
         if len(args) != 1:
             self.stdout.write("Required exactly one argument - job env.\n")
             return
-        self.stdout.write(repr(self.server.sync_run_group(args[0])))
+        self.stdout.write(repr(self.server.sync_run_group(json.loads(args[0]))))
 
     def cmd_queue(self, *args, **kwargs):
         q = self.server.get_queue()
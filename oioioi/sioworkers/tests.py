@@ -1,5 +1,14 @@
+import http.client
+import json
+import socketserver
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
 from django.test import TestCase
+from django.test.utils import override_settings
 
+from oioioi.sioworkers.client import SioworkersdClient
 from oioioi.sioworkers.jobs import run_sioworkers_job, run_sioworkers_jobs
 
 
@@ -16,3 +25,62 @@ class TestSioworkersBindings(TestCase):
         self.assertEqual(envs["key1"].get("pong"), "e1")
         self.assertEqual(envs["key2"].get("pong"), "e2")
         self.assertEqual(len(envs), 2)
+
+    @override_settings(LOCAL_BACKEND_CONCURRENCY=2)
+    def test_local_backend_process_pool(self):
+        jobs = {f"key{i}": {"job_type": "ping", "ping": f"e{i}", "task_priority": i} for i in range(4)}
+        envs = run_sioworkers_jobs(jobs)
+        self.assertEqual({key: env.get("pong") for key, env in envs.items()}, {f"key{i}": f"e{i}" for i in range(4)})
+        self.assertEqual(run_sioworkers_job({"job_type": "ping", "ping": "e1"}).get("pong"), "e1")
+
+
+class KeepAliveRequestHandler(SimpleXMLRPCRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests_to_drop = 0
+
+    def do_POST(self):
+        if KeepAliveRequestHandler.requests_to_drop:
+            KeepAliveRequestHandler.requests_to_drop -= 1
+            self.close_connection = True
+            return
+        super().do_POST()
+
+
+class ThreadingXMLRPCServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+    block_on_close = False
+
+
+class TestSioworkersdClient(TestCase):
+    def setUp(self):
+        self.server = ThreadingXMLRPCServer(("127.0.0.1", 0), KeepAliveRequestHandler, logRequests=False, allow_none=True)
+        self.server.register_function(lambda env: {"workers_jobs.results": json.loads(env)["workers_jobs"]}, "sync_run_group")
+        self.server.register_function(lambda: [{"name": "worker"}], "get_workers")
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.client = SioworkersdClient("http://{}:{}/".format(*self.server.server_address), pool_size=2, timeout=10, backoff=0, compress_threshold=0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_concurrent_calls(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda i: self.client.sync_run_group({"workers_jobs": {"job": i}}), range(20)))
+        self.assertEqual(results, [{"workers_jobs.results": {"job": i}} for i in range(20)])
+        self.assertLessEqual(self.client.pools[10].qsize(), 2)
+
+    def test_retry(self):
+        # xmlrpc.client itself retries once when the connection is closed.
+        KeepAliveRequestHandler.requests_to_drop = 3
+        self.assertEqual(self.client.get_workers(), [{"name": "worker"}])
+        self.assertEqual(KeepAliveRequestHandler.requests_to_drop, 0)
+
+    def test_no_retry_of_run_group(self):
+        # The request might have been received, so it must not be resent.
+        KeepAliveRequestHandler.requests_to_drop = 3
+        self.addCleanup(setattr, KeepAliveRequestHandler, "requests_to_drop", 0)
+        with self.assertRaises(http.client.RemoteDisconnected):
+            self.client.sync_run_group({"workers_jobs": {}})
+        self.assertEqual(KeepAliveRequestHandler.requests_to_drop, 1)
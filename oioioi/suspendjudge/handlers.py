@@ -41,6 +41,10 @@ def check_problem_instance_state(env, suspend_init_tests=None, **kwargs):
             and not _is_admin_submission(env)
             and not _is_model_solution(env)
         ):
+            # Results of final tests run together with the initial ones
+            # may be stale once the problem is resumed (e.g. after its
+            # tests were replaced), so they must be rerun.
+            env.pop("pipelined_test_results", None)
             mark_job_state(env, "SUSPENDED")
             suspend = True
     if suspend:
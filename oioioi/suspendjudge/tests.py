@@ -107,3 +107,28 @@ class TestSuspending(TestSuspendjudgeSuper):
         env["is_rejudge"] = True
         env["report_kinds"] = ["HIDDEN"]
         check_problem_instance_state(env)
+
+    def test_pipelined_results_dropped_on_suspend(self):
+        problem_instance = ProblemInstance.objects.get()
+
+        self.client.get("/c/c/")  # 'c' becomes the current contest
+
+        self._empty_post("test_admin", "suspend_all_but_init", problem_instance)
+        env = {
+            "problem_instance_id": problem_instance.id,
+            "job_id": "dummy",
+            "celery_task_id": "dummy",
+            "submission_id": 1,
+            "is_rejudge": False,
+            "report_kinds": ["INITIAL", "NORMAL"],
+            "pipelined_test_results": {"NORMAL": {"1a": {"result_code": "OK"}}},
+        }
+        env = check_problem_instance_state(env, suspend_init_tests=True)
+        self.assertIn("pipelined_test_results", env)
+        with self.assertRaises(Ignore):
+            check_problem_instance_state(env)
+        self.assertNotIn("pipelined_test_results", env)
+
+        self._empty_post("test_admin", "resume_and_clear", problem_instance)
+        env = check_problem_instance_state(env)
+        self.assertNotIn("pipelined_test_results", env)
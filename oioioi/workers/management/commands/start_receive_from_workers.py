@@ -1,57 +1,272 @@
+import email.parser
+import email.policy
 import http.server
 import json
 import logging
+import queue
 import socketserver
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import parse_qs
 
-import cgi
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.db import close_old_connections, transaction
 
 from oioioi.evalmgr.tasks import delay_environ
 
+logger = logging.getLogger(__name__)
+
+
+def _multipart_field(body, content_type, name):
+    """Returns the value of the field ``name`` of a multipart/form-data
+    ``body``, or None if there's no such field.
+    """
+    header = b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n"
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + body)
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == name:
+            return part.get_payload(decode=True)
+    return None
+
+
+class ReceiverMetrics:
+    """Throughput and latency of the receiver, reported to the log every
+    ``SIOWORKERS_RECEIVER_METRICS_INTERVAL`` seconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.received = 0
+        self.failed = 0
+        self.batches = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_report = time.monotonic()
+
+    def environ_received(self, latency):
+        with self.lock:
+            self.received += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def environ_failed(self):
+        with self.lock:
+            self.failed += 1
+
+    def batch_committed(self):
+        with self.lock:
+            self.batches += 1
+
+    def stats(self):
+        """Returns the statistics gathered since the last report."""
+        with self.lock:
+            elapsed = time.monotonic() - self.last_report
+            return {
+                "received": self.received,
+                "failed": self.failed,
+                "batches": self.batches,
+                "per_second": self.received / elapsed if elapsed else 0.0,
+                "avg_latency": self.total_latency / self.received if self.received else 0.0,
+                "max_latency": self.max_latency,
+            }
+
+    def report_if_needed(self):
+        if time.monotonic() - self.last_report < settings.SIOWORKERS_RECEIVER_METRICS_INTERVAL:
+            return
+        stats = self.stats()
+        logger.info(
+            "Sioworkersd receiver: %d results (%.2f/s) in %d transactions, %d failed, latency avg %.3fs, max %.3fs",
+            stats["received"],
+            stats["per_second"],
+            stats["batches"],
+            stats["failed"],
+            stats["avg_latency"],
+            stats["max_latency"],
+        )
+        with self.lock:
+            self.reset()
+
+
+class DelayEnvironBatcher:
+    """Queues received environs in evalmgr from a single thread.
+
+    Environs received while a transaction is being committed are queued
+    together, in the next one, so under load the number of transactions
+    is much smaller than the number of environs.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="delay-environ-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, env):
+        """Returns a future, which is done when ``env`` is durably queued."""
+        future = Future()
+        self.queue.put((env, future))
+        return future
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _next_batch(self):
+        """Returns the items to handle in the next transaction (empty if
+        none came before the metrics need to be reported).
+        """
+        try:
+            batch = [self.queue.get(timeout=settings.SIOWORKERS_RECEIVER_METRICS_INTERVAL)]
+        except queue.Empty:
+            return []
+        while len(batch) < settings.SIOWORKERS_RECEIVER_BATCH_SIZE:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            environs = [item for item in batch if item is not None]
+            if environs:
+                close_old_connections()
+                self.process_batch(environs)
+            if None in batch:
+                return
+            self.metrics.report_if_needed()
+
+    def process_batch(self, batch):
+        results = []
+        try:
+            with transaction.atomic():
+                for env, future in batch:
+                    # A savepoint, so that a broken environ doesn't affect
+                    # the others.
+                    try:
+                        with transaction.atomic():
+                            delay_environ(env)
+                    except Exception as e:
+                        results.append((future, e))
+                    else:
+                        results.append((future, None))
+        except Exception as e:
+            for _env, future in batch:
+                future.set_exception(e)
+            return
+        self.metrics.batch_committed()
+        for future, exception in results:
+            if exception is None:
+                future.set_result(None)
+            else:
+                future.set_exception(exception)
+
 
 class ServerHandler(http.server.BaseHTTPRequestHandler):
     def do_GET(self):
         # security through obscurity
         self.send_error(404)
 
+    def _read_environ(self):
+        """Returns the environ sent by sioworkersd, either as the ``data``
+        field of a form (urlencoded or multipart) or as a JSON body, or None
+        if there's none.
+        """
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content_type = self.headers.get_content_type()
+        if content_type == "application/json":
+            data = body
+        elif content_type == "multipart/form-data":
+            data = _multipart_field(body, self.headers["Content-Type"], "data")
+        else:
+            data = parse_qs(body.decode("utf-8")).get("data", [None])[0]
+        if data is None:
+            return None
+        return json.loads(data)
+
     def do_POST(self):
-        form = cgi.FieldStorage(
-            fp=self.rfile,
-            headers=self.headers,
-            environ={
-                "REQUEST_METHOD": "POST",
-                "CONTENT_TYPE": self.headers["Content-Type"],
-            },
-        )
-        if "data" not in form:
+        start = time.monotonic()
+        try:
+            env = self._read_environ()
+        except ValueError:
+            self.send_error(400)
+            return
+        if env is None:
             self.send_error(404)
-        else:
-            logging.debug("Sioworkersd receiver got: " + form.getvalue("data"))
-            env = json.loads(form.getvalue("data"))
-            del env["workers_jobs"]
-            if "workers_jobs.extra_args" in env:
-                del env["workers_jobs.extra_args"]
-            assert "workers_jobs.results" in env or "error" in env
+            return
+        logger.debug("Sioworkersd receiver got: %s", env.get("job_id"))
+        del env["workers_jobs"]
+        if "workers_jobs.extra_args" in env:
+            del env["workers_jobs.extra_args"]
+        assert "workers_jobs.results" in env or "error" in env
 
-            with transaction.atomic():
-                delay_environ(env)
+        try:
+            self.server.batcher.submit(env).result()
+        except Exception:
+            logger.error("Failed to queue environ %s", env.get("job_id"), exc_info=True)
+            self.server.metrics.environ_failed()
+            self.send_error(500)
+            return
+        self.server.metrics.environ_received(time.monotonic() - start)
 
-            self.send_response(200, "OK")
-            self.send_header("Content-type", "text/plain")
-            self.end_headers()
-            self.wfile.write(b"OK")
+        self.send_response(200, "OK")
+        self.send_header("Content-type", "text/plain")
+        self.end_headers()
+        self.wfile.write(b"OK")
 
 
 class Server(socketserver.TCPServer):
+    """Handles requests in a pool of threads, which only parse them and
+    wait for a :class:`DelayEnvironBatcher` to queue the environs.
+    """
+
     # See SIO-1741 and
     # https://docs.python.org/2/library/socketserver.html#SocketServer.BaseServer.allow_reuse_address
     allow_reuse_address = True
 
+    def __init__(self, server_address, handler_class, threads):
+        super().__init__(server_address, handler_class)
+        self.metrics = ReceiverMetrics()
+        self.batcher = DelayEnvironBatcher(self.metrics)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="receiver")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown()
+        self.batcher.stop()
+
 
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=settings.SIOWORKERS_RECEIVER_THREADS,
+            help="Number of threads handling requests from sioworkersd",
+        )
+
     def handle(self, *args, **options):
         Handler = ServerHandler
-        httpd = Server((settings.SIOWORKERS_LISTEN_ADDR, settings.SIOWORKERS_LISTEN_PORT), Handler)
+        httpd = Server(
+            (settings.SIOWORKERS_LISTEN_ADDR, settings.SIOWORKERS_LISTEN_PORT),
+            Handler,
+            options["threads"],
+        )
         httpd.serve_forever()
@@ -1,7 +1,13 @@
+import http.client
+import json
+import threading
+from unittest.mock import patch
+from urllib.parse import urlencode
+
 from django.urls import reverse
 
 from oioioi.base.tests import TestCase
-from oioioi.workers import views
+from oioioi.workers.management.commands.start_receive_from_workers import Server, ServerHandler
 
 
 class TestServer:
@@ -21,7 +27,9 @@ class TestWorkersInfo(TestCase):
 
     def setUp(self):
         # monkeypatch test server instead of XMLRPC
-        views.server = TestServer()
+        patcher = patch("oioioi.workers.views.get_sioworkersd_client", TestServer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_admin_can_see(self):
         self.assertTrue(self.client.login(username="test_admin"))
@@ -34,3 +42,46 @@ class TestWorkersInfo(TestCase):
         url = reverse("show_workers")
         response = self.client.get(url)
         self.assertNotContains(response, "Komp4", status_code=403)
+
+
+class TestReceiveFromWorkers(TestCase):
+    def setUp(self):
+        self.server = Server(("127.0.0.1", 0), ServerHandler, 4)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def _post(self, body, content_type):
+        connection = http.client.HTTPConnection(*self.server.server_address)
+        try:
+            connection.request("POST", "/", body, {"Content-Type": content_type})
+            return connection.getresponse().status
+        finally:
+            connection.close()
+
+    def _multipart(self, name, value):
+        boundary = "boundary"
+        body = f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n--{boundary}--\r\n'
+        return body.encode("utf-8"), f"multipart/form-data; boundary={boundary}"
+
+    def test_receive(self):
+        # Already resumed jobs are ignored by delay_environ.
+        env = {"workers_jobs": {}, "workers_jobs.results": {}, "saved_environ_id": 12345}
+        self.assertEqual(self._post(urlencode({"data": json.dumps(env)}), "application/x-www-form-urlencoded"), 200)
+        self.assertEqual(self._post(json.dumps(env), "application/json"), 200)
+        self.assertEqual(self._post(*self._multipart("data", json.dumps(env))), 200)
+        self.assertEqual(self._post(urlencode({"foo": "bar"}), "application/x-www-form-urlencoded"), 404)
+        self.assertEqual(self._post(*self._multipart("foo", "bar")), 404)
+        self.assertEqual(self._post("{", "application/json"), 400)
+
+        # Neither saved_environ_id nor job_id, so delay_environ fails.
+        env = {"workers_jobs": {}, "error": {}}
+        self.assertEqual(self._post(json.dumps(env), "application/json"), 500)
+
+        stats = self.server.metrics.stats()
+        self.assertEqual(stats["received"], 3)
+        self.assertEqual(stats["failed"], 1)
@@ -1,4 +1,3 @@
-import xmlrpc.client
 from operator import itemgetter  # pylint: disable=E0611
 
 from django.conf import settings
@@ -9,12 +8,11 @@ from django.utils.translation import gettext_lazy as _
 
 from oioioi.base.admin import system_admin_menu_registry
 from oioioi.base.permissions import enforce_condition, is_superuser
-
-server = xmlrpc.client.ServerProxy(settings.SIOWORKERSD_URL, allow_none=True)
+from oioioi.sioworkers.client import get_sioworkersd_client
 
 
 def get_info_about_workers():
-    return server.get_workers()
+    return get_sioworkersd_client().get_workers()
 
 
 def get_all_names():
@@ -23,7 +21,7 @@ def get_all_names():
 
 def del_worker(value):
     for i in value:
-        server.forget_worker(i)
+        get_sioworkersd_client().forget_worker(i)
 
 
 @enforce_condition(is_superuser)